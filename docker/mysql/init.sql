@@ -30,6 +30,7 @@ create table favorite_folder
     folder_name varchar(100)                         not null comment '收藏夹名称',
     member_id   int                                  not null comment '所属用户ID（关联family_member.id）',
     is_default  tinyint(1) default 0                 not null comment '是否默认收藏夹（0-否，1-是）',
+    photo_count int        default 0                 not null comment '收藏照片数量（加入/移出/照片删除时维护）',
     create_time datetime   default CURRENT_TIMESTAMP null,
     constraint fk_favorite_folder_member
         foreign key (member_id) references family_member (id)
@@ -51,9 +52,13 @@ create table album
     cover_path          varchar(255) default 'default_cover.jpg' null comment '封面路径',
     creator_id          int                                      null comment '创建者ID（关联family_member.id）',
     last_upload_time    datetime                                 null comment '最后上传时间',
-    last_upload_user_id int                                      null comment '最后上传人ID'
+    last_upload_user_id int                                      null comment '最后上传人ID',
+    photo_count         int          default 0                   not null comment '照片数量（上传/删除时维护，避免分页时 COUNT(*)）'
 );
 
+create index idx_album_creator_time
+    on album (creator_id, create_time);
+
 -- ═══ 照片表 ═══
 create table photo
 (
@@ -66,7 +71,8 @@ create table photo
     member_id   int                                null,
     operator_id int                                null comment '上传者ID（关联family_member.id）',
     remarks     text                               null,
-    upload_time datetime default CURRENT_TIMESTAMP null,
+    upload_time datetime default CURRENT_TIMESTAMP not null,
+    content_hash char(64)                          null comment '文件内容 SHA-256（后台任务计算）',
     constraint fk_photo_operator
         foreign key (operator_id) references family_member (id)
             on delete set null,
@@ -78,12 +84,76 @@ create table photo
             on delete set null
 );
 
-create index album_id
-    on photo (album_id);
+-- 相册照片分页（album_id + upload_time 倒序 + id 游标）
+create index idx_photo_album_upload
+    on photo (album_id, upload_time, id);
+
+create index idx_photo_album_shoot
+    on photo (album_id, shoot_time);
+
+create index idx_photo_album_operator
+    on photo (album_id, operator_id);
+
+-- 照片名称 + 备注全文检索（ngram 分词，支持中文）
+create fulltext index ft_photo_text
+    on photo (photo_name, remarks) with parser ngram;
 
 create index member_id
     on photo (member_id);
 
+-- ═══ 照片后台处理任务表 ═══
+create table photo_job
+(
+    id          bigint auto_increment
+        primary key,
+    photo_id    int                                   not null comment '照片ID（关联photo.id）',
+    job_type    varchar(30)                           not null comment '任务类型：rendition / exif / hash',
+    status      varchar(20) default 'pending'         not null comment '状态：pending / running / done / failed',
+    attempts    int         default 0                 not null comment '已尝试次数',
+    last_error  varchar(500)                          null comment '最近一次失败原因',
+    worker      varchar(64)                           null comment '领取任务的 worker 标识',
+    create_time datetime    default CURRENT_TIMESTAMP not null,
+    update_time datetime    default CURRENT_TIMESTAMP not null on update CURRENT_TIMESTAMP,
+    constraint fk_photo_job_photo
+        foreign key (photo_id) references photo (id)
+            on delete cascade
+)
+    comment '照片后台处理任务';
+
+create index idx_photo_job_status
+    on photo_job (status, id);
+
+create index idx_photo_job_photo
+    on photo_job (photo_id);
+
+-- ═══ 分片上传会话表 ═══
+create table photo_upload
+(
+    id          char(32)                              not null
+        primary key comment '上传会话ID（同时作为临时文件名）',
+    operator_id int                                   not null comment '发起上传的成员（关联family_member.id）',
+    album_id    int                                   not null comment '目标相册（关联album.id）',
+    file_name   varchar(255)                          not null comment '原始文件名',
+    file_size   bigint                                not null comment '文件总字节数',
+    received    bigint      default 0                 not null comment '已写入的连续字节数（续传偏移量）',
+    photo_name  varchar(100)                          null,
+    shoot_time  datetime                              null,
+    member_id   int                                   null comment '归属人（完成后写入 photo.member_id）',
+    remarks     text                                  null,
+    create_time datetime    default CURRENT_TIMESTAMP not null,
+    update_time datetime    default CURRENT_TIMESTAMP not null on update CURRENT_TIMESTAMP,
+    constraint fk_photo_upload_operator
+        foreign key (operator_id) references family_member (id)
+            on delete cascade,
+    constraint fk_photo_upload_album
+        foreign key (album_id) references album (id)
+            on delete cascade
+)
+    comment '分片上传会话（断点续传）';
+
+create index idx_photo_upload_update
+    on photo_upload (update_time);
+
 -- ═══ 收藏照片表 ═══
 create table favorite_photo
 (
@@ -92,7 +162,7 @@ create table favorite_photo
     folder_id   int                                not null comment '收藏夹ID（关联favorite_folder.id）',
     photo_id    int                                not null comment '照片ID',
     member_id   int                                not null comment '操作用户ID（防越权）',
-    create_time datetime default CURRENT_TIMESTAMP null,
+    create_time datetime default CURRENT_TIMESTAMP not null,
     constraint uk_folder_photo
         unique (folder_id, photo_id),
     constraint fk_favorite_photo_folder
@@ -115,6 +185,9 @@ create index idx_favorite_photo_member
 create index idx_favorite_photo_photo
     on favorite_photo (photo_id);
 
+create index idx_favorite_photo_folder_member_time
+    on favorite_photo (folder_id, member_id, create_time);
+
 -- ═══ AI 聊天记录表 ═══
 create table ai_chat_message
 (
@@ -137,11 +210,44 @@ create index idx_create_time
 create index idx_member_time
     on ai_chat_message (member_id, create_time);
 
--- ═══ 存储过程：清理3个月前的聊天记录 ═══
+-- auto-generated definition
+create table ai_chat_summary
+(
+    member_id       int                                   not null comment '家庭成员ID（关联 family_member.id）',
+    conversation_id varchar(64)                           not null comment '会话ID',
+    summary         text                                  not null comment '早期对话的滚动摘要',
+    last_message_id bigint      default 0                 not null comment '已并入摘要的最后一条消息ID',
+    update_time     datetime    default CURRENT_TIMESTAMP not null on update CURRENT_TIMESTAMP,
+    primary key (member_id, conversation_id)
+)
+    comment 'AI 聊天上下文摘要（超出 token 预算的早期对话）' collate = utf8mb4_unicode_ci;
+
+-- auto-generated definition
+create table ai_conversation
+(
+    member_id         int                                   not null comment '家庭成员ID（关联 family_member.id）',
+    conversation_id   varchar(64)                           not null comment '会话ID（对应 ai_chat_message.conversation_id）',
+    title             varchar(100)                          not null comment '会话标题',
+    create_time       datetime    default CURRENT_TIMESTAMP not null,
+    last_message_time datetime    default CURRENT_TIMESTAMP not null comment '最后一条消息时间（会话列表排序）',
+    primary key (member_id, conversation_id)
+)
+    comment 'AI 会话' collate = utf8mb4_unicode_ci;
+
+create index idx_ai_conversation_member_last
+    on ai_conversation (member_id, last_message_time);
+
+-- ═══ 存储过程：分批清理3个月前的聊天记录 ═══
 DELIMITER //
 CREATE PROCEDURE IF NOT EXISTS `cleanup_old_chat_messages`()
 BEGIN
-    DELETE FROM `ai_chat_message`
-    WHERE `create_time` < DATE_SUB(NOW(), INTERVAL 3 MONTH);
+    -- 分批删除，每批一个短事务，避免长时间锁表；日常清理建议使用 python -m src.retention
+    DECLARE cutoff DATETIME DEFAULT DATE_SUB(NOW(), INTERVAL 3 MONTH);
+    REPEAT
+        DELETE FROM `ai_chat_message`
+        WHERE `create_time` < cutoff
+        ORDER BY `create_time`
+        LIMIT 1000;
+    UNTIL ROW_COUNT() = 0 END REPEAT;
 END //
 DELIMITER ;
@@ -17,19 +17,99 @@ DB_CONFIG = {
     'database': os.environ.get('DB_NAME', 'family_photo'),
     'charset': 'utf8mb4'
 }
+
+# ── 数据库连接池配置（每个 gunicorn worker 进程独立一个池）──
+DB_POOL_CONFIG = {
+    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '1')),         # 最少保持的连接数
+    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),        # 最多同时存在的连接数
+    'max_age': int(os.environ.get('DB_POOL_MAX_AGE', '3600')),        # 连接最长存活秒数，超过后重建
+    'ping_interval': int(os.environ.get('DB_POOL_PING_INTERVAL', '30')),  # 空闲超过该秒数，借出前 ping 检查
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),        # 池满时等待空闲连接的秒数
+}
+# 启动时自动执行数据库结构迁移（Docker 部署由 docker-entrypoint.sh 执行 python -m src.migrate，无需开启）
+DB_AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', '0') == '1'
+
 parent_dir = os.path.dirname(os.path.dirname(__file__))
 
+UPLOAD_ROOT_FOLDER = os.path.join(parent_dir, 'uploads')
 UPLOAD_PHOTO_FOLDER = os.path.join(parent_dir, 'uploads/photos')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+# 普通 / 批量上传单张照片的大小上限（批量上传的请求体可达 500MB，需逐个文件校验；更大的文件走分片上传）
+PHOTO_MAX_FILE_SIZE = int(os.environ.get('PHOTO_MAX_FILE_SIZE', str(MAX_CONTENT_LENGTH)))
+# 批量上传接口单次最多文件数
+PHOTO_BATCH_MAX_FILES = int(os.environ.get('PHOTO_BATCH_MAX_FILES', '50'))
 
 if not os.path.exists(UPLOAD_PHOTO_FOLDER):
     os.makedirs(UPLOAD_PHOTO_FOLDER)
 
+# 分片上传（断点续传）的临时文件目录：与原图同一文件系统，完成时直接重命名到相册目录，不再复制
+UPLOAD_PARTIAL_FOLDER = os.path.join(UPLOAD_PHOTO_FOLDER, '.partial')
+if not os.path.exists(UPLOAD_PARTIAL_FOLDER):
+    os.makedirs(UPLOAD_PARTIAL_FOLDER)
+# 普通上传解析请求体时文件直接写入的临时目录（同一文件系统，保存时重命名到相册目录）
+UPLOAD_INCOMING_FOLDER = os.path.join(UPLOAD_PHOTO_FOLDER, '.incoming')
+if not os.path.exists(UPLOAD_INCOMING_FOLDER):
+    os.makedirs(UPLOAD_INCOMING_FOLDER)
+# 单个分片最大字节数（需小于前置 nginx 的 client_max_body_size）
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+# 分片上传单个文件上限（普通 / 批量上传受 PHOTO_MAX_FILE_SIZE 限制）
+UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', str(500 * 1024 * 1024)))
+# 上传会话超过该小时数没有新分片即视为放弃，清理记录和临时文件
+UPLOAD_SESSION_EXPIRE_HOURS = int(os.environ.get('UPLOAD_SESSION_EXPIRE_HOURS', '24'))
+
 UPLOAD_COVER_FOLDER = os.path.join(parent_dir, 'uploads/covers')
 if not os.path.exists(UPLOAD_COVER_FOLDER):
     os.makedirs(UPLOAD_COVER_FOLDER)
 
+# 缩略图/预览图目录：uploads/renditions/<规格>/<album_id>/<文件名>，与原图目录结构一一对应
+UPLOAD_RENDITION_FOLDER = os.path.join(parent_dir, 'uploads/renditions')
+if not os.path.exists(UPLOAD_RENDITION_FOLDER):
+    os.makedirs(UPLOAD_RENDITION_FOLDER)
+
+# 规格名 → 长边像素（original 表示原图，不在此列）
+RENDITION_SIZES = {
+    'thumb': int(os.environ.get('RENDITION_THUMB_SIZE', '256')),      # 网格缩略图
+    'preview': int(os.environ.get('RENDITION_PREVIEW_SIZE', '1024')), # 大图预览
+}
+RENDITION_QUALITY = int(os.environ.get('RENDITION_QUALITY', '85'))
+
+# 上传文件（原图/缩略图/封面）的浏览器缓存秒数：文件名唯一、内容不变，默认缓存一年
+UPLOAD_CACHE_MAX_AGE = int(os.environ.get('UPLOAD_CACHE_MAX_AGE', '31536000'))
+
+# 上传文件发送方式：
+#   direct      Flask 直接读取文件发送（默认，本地开发无需前置代理）
+#   x-accel     nginx 发送：返回 X-Accel-Redirect，nginx 需配置 internal location 指向 uploads 目录
+#   x-sendfile  Apache mod_xsendfile / lighttpd 发送：返回 X-Sendfile
+FILE_SERVE_MODE = os.environ.get('FILE_SERVE_MODE', 'direct')
+if FILE_SERVE_MODE not in ('direct', 'x-accel', 'x-sendfile'):
+    raise RuntimeError('❌ 环境变量 FILE_SERVE_MODE 仅支持 direct / x-accel / x-sendfile')
+# x-accel 模式下 nginx internal location 的前缀（对应 uploads 根目录）
+X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/_protected_uploads')
+
+# 相册访问权限缓存秒数（每个成员可访问的相册 ID 集合，见 src/access.py）
+ALBUM_ACCESS_CACHE_TTL = float(os.environ.get('ALBUM_ACCESS_CACHE_TTL', '30'))
+
+# 照片搜索单条 SQL 的最长执行时间（毫秒，MAX_EXECUTION_TIME 提示），超时直接返回，保证延迟上限
+SEARCH_TIMEOUT_MS = int(os.environ.get('SEARCH_TIMEOUT_MS', '2000'))
+
+# ── 照片后台处理队列（缩略图 / EXIF / 哈希 / 封面刷新）──
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))                  # 每个进程的处理线程数，0 表示不在 Web 进程处理
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '2'))    # 队列为空时的轮询间隔（秒）
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))        # 单个任务最多尝试次数
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', '300'))    # running 超过该秒数视为中断，重新入队
+
+# ── AI 聊天记录保留策略（见 src/retention.py）──
+CHAT_RETENTION_DAYS = int(os.environ.get('CHAT_RETENTION_DAYS', '0'))             # 保留天数，0 表示不清理
+CHAT_RETENTION_MODE = os.environ.get('CHAT_RETENTION_MODE', 'delete')             # delete 直接删除 / archive 先导出再删除
+if CHAT_RETENTION_MODE not in ('delete', 'archive'):
+    raise RuntimeError('❌ 环境变量 CHAT_RETENTION_MODE 仅支持 delete / archive')
+CHAT_RETENTION_BATCH = int(os.environ.get('CHAT_RETENTION_BATCH', '500'))         # 每批删除条数（每批一个短事务）
+CHAT_RETENTION_SLEEP = float(os.environ.get('CHAT_RETENTION_SLEEP', '0.2'))       # 两批之间的间隔秒数
+CHAT_RETENTION_INTERVAL = float(os.environ.get('CHAT_RETENTION_INTERVAL', '6'))   # 自动清理间隔（小时），0 表示只手动执行
+# 归档文件目录：<目录>/ai_chat_message_<时间>.jsonl.gz
+CHAT_ARCHIVE_FOLDER = os.environ.get('CHAT_ARCHIVE_FOLDER', os.path.join(parent_dir, 'archive'))
+
 logger = logging.getLogger('photo_manager')
 
 # JWT配置（敏感信息从环境变量读取）
@@ -37,6 +117,20 @@ JWT_CONFIG = {
     'secret': os.environ.get('JWT_SECRET', ''),
     'expire_hours': int(os.environ.get('JWT_EXPIRE_HOURS', '24'))
 }
+# 已验证 Token 的缓存条数（每个进程独立，LRU 淘汰），0 表示每次请求都重新验证
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '1024'))
+
+# ── 登录密码校验（bcrypt 每次约数百毫秒 CPU，放到独立线程池中执行）──
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))                    # 强度，修改后用户下次登录时自动重新哈希
+LOGIN_VERIFY_WORKERS = int(os.environ.get('LOGIN_VERIFY_WORKERS', '2'))       # 每个进程同时校验密码的线程数
+LOGIN_VERIFY_QUEUE = int(os.environ.get('LOGIN_VERIFY_QUEUE', '8'))           # 最多排队的登录请求数，超出返回 429
+LOGIN_THROTTLE_WINDOW = int(os.environ.get('LOGIN_THROTTLE_WINDOW', '300'))   # 登录限流统计窗口（秒）
+LOGIN_IP_MAX_ATTEMPTS = int(os.environ.get('LOGIN_IP_MAX_ATTEMPTS', '20'))    # 窗口内同一 IP 最多登录尝试次数
+LOGIN_USER_MAX_FAILURES = int(os.environ.get('LOGIN_USER_MAX_FAILURES', '5')) # 窗口内同一用户名最多密码错误次数
+# 以上限流计数每个 gunicorn 进程独立统计，实际上限约为 次数 × GUNICORN_WORKERS
+# 前置反向代理层数（Docker 部署为 1：nginx），>0 时按 X-Forwarded-For 识别客户端 IP
+# 开启后后端端口只能由该代理访问（docker-compose 中绑定 127.0.0.1），否则客户端可伪造 X-Forwarded-For 绕过 IP 限流
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', '0'))
 
 # 启动时校验：敏感配置不能为空
 if not DB_CONFIG['password']:
@@ -57,14 +151,19 @@ def encrypt_password(plain_password: str) -> str:
         if len(sha256_hash.encode('utf-8')) > 72:
             sha256_hash = hashlib.sha256(sha256_hash.encode('utf-8')).hexdigest()
 
-        salt = bcrypt.gensalt(12)  # 加盐，强度12（生产环境推荐10-14）
-        bcrypt_hash = bcrypt.hashpw(sha256_hash.encode('utf-8'), salt)
-
-        return bcrypt_hash.decode('utf-8')
+        return hash_frontend_password(sha256_hash)
     except Exception as e:
         logger.error(f"密码加密失败：{str(e)}")
         raise e  # 抛异常，避免存储错误的哈希
 
+def hash_frontend_password(frontend_sha256: str) -> str:
+    """
+    对前端 SHA256 后的密码串做 bcrypt 哈希（登录时按新强度重新哈希使用）
+    """
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)  # 加盐，默认强度12（生产环境推荐10-14）
+    bcrypt_hash = bcrypt.hashpw(frontend_sha256.encode('utf-8'), salt)
+    return bcrypt_hash.decode('utf-8')
+
 def verify_password(frontend_sha256: str, db_bcrypt_hash: str) -> bool:
     """
     登录验证：前端传的SHA256串 → 验证数据库的bcrypt哈希
@@ -82,6 +181,13 @@ def verify_password(frontend_sha256: str, db_bcrypt_hash: str) -> bool:
         logger.error(f"密码验证失败：{str(e)}")
         return False
 
+def password_needs_rehash(db_bcrypt_hash: str) -> bool:
+    """数据库中的哈希强度与当前 BCRYPT_ROUNDS 不一致时返回 True（哈希格式：$2b$<强度>$<盐+哈希>）"""
+    try:
+        return int(db_bcrypt_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
 # 生成JWT Token（携带member_id等信息）
 def generate_token(member_info):
     payload = {
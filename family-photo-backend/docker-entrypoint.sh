@@ -45,9 +45,16 @@ if [ $RETRY_COUNT -ge $MAX_RETRIES ]; then
     exit 1
 fi
 
+# ── 数据库结构迁移 ──────────────────────
+echo "[init] 执行数据库结构迁移..."
+python -m src.migrate
+
 # ── 启动 Gunicorn ──────────────────────
+# gthread：每个进程 GUNICORN_THREADS 个线程，AI 对话等待上游时只占一个线程，
+# 且最多占用 AI_MAX_CONCURRENCY 个（见 src/ai_service.py），其余线程继续处理相册/照片请求
+# 线程数不要超过 DB_POOL_MAX_SIZE - JOB_WORKERS，避免请求排队等待数据库连接
 echo "[init] 启动 Gunicorn 生产服务器..."
-exec gunicorn -w 4 -b 0.0.0.0:5000 \
+exec gunicorn -w ${GUNICORN_WORKERS:-4} -k gthread --threads ${GUNICORN_THREADS:-8} -b 0.0.0.0:5000 \
     --access-logfile - \
     --error-logfile - \
     --timeout 120 \
@@ -1,7 +1,13 @@
 DELIMITER //
 CREATE PROCEDURE IF NOT EXISTS `cleanup_old_chat_messages`()
 BEGIN
-    DELETE FROM `ai_chat_message`
-    WHERE `create_time` < DATE_SUB(NOW(), INTERVAL 3 MONTH);
+    -- 分批删除，每批一个短事务，避免长时间锁表；日常清理建议使用 python -m src.retention
+    DECLARE cutoff DATETIME DEFAULT DATE_SUB(NOW(), INTERVAL 3 MONTH);
+    REPEAT
+        DELETE FROM `ai_chat_message`
+        WHERE `create_time` < cutoff
+        ORDER BY `create_time`
+        LIMIT 1000;
+    UNTIL ROW_COUNT() = 0 END REPEAT;
 END //
 DELIMITER ;
@@ -0,0 +1,77 @@
+"""
+相册访问权限
+──────────
+非管理员只能访问自己创建的相册，管理员可以访问全部相册。各接口不再各自执行
+`SELECT id FROM album WHERE id = %s AND creator_id = %s`，而是按成员缓存可访问的相册 ID 集合，
+权限校验变为内存中的集合查找：
+
+  - 缓存按成员（管理员共用一份全部相册）保存，ALBUM_ACCESS_CACHE_TTL 秒后过期
+  - 本进程创建 / 删除相册时立即失效（invalidate_album_access）
+  - 集合中找不到时重新加载一次再判断：其他 worker 进程刚创建的相册不会被误判为无权访问；
+    距上次加载不足 _RELOAD_MIN_INTERVAL 秒时不再重新加载，反复请求无权访问 / 不存在的相册不会每次都查库
+  - 其他进程刚删除的相册在过期前仍可能判为可访问，后续读写按相册不存在处理（外键 / 影响行数为 0）
+"""
+
+import time
+import threading
+
+import pymysql
+from flask import g
+
+from config.config import ALBUM_ACCESS_CACHE_TTL
+from .utils import get_db_connection
+
+_ALL_ALBUMS = 'all'
+# 未命中时重新加载的最短间隔（秒）：其他进程创建的相册最多延迟这么久才能访问
+_RELOAD_MIN_INTERVAL = 2
+
+_album_ids = {}     # member_id / 'all' → (过期时间, 加载时间, frozenset(album_id))
+_album_ids_lock = threading.Lock()
+
+
+def can_access_album(album_id) -> bool:
+    """
+    当前登录成员（g.member_id / g.is_admin）能否访问该相册；相册不存在同样返回 False
+    缓存未命中时会借用一个数据库连接，请在接口取得自己的连接之前调用
+    """
+    try:
+        album_id = int(album_id)
+    except (TypeError, ValueError):
+        return False
+    key = _ALL_ALBUMS if g.is_admin else g.member_id
+    if album_id in _cached_album_ids(key):
+        return True
+    return album_id in _cached_album_ids(key, reload=True)
+
+
+def invalidate_album_access(member_id=None):
+    """相册创建 / 删除后调用：清除该成员和管理员的缓存（不传 member_id 则全部清除）"""
+    with _album_ids_lock:
+        if member_id is None:
+            _album_ids.clear()
+        else:
+            _album_ids.pop(member_id, None)
+            _album_ids.pop(_ALL_ALBUMS, None)
+
+
+def _cached_album_ids(key, reload=False):
+    """reload=True 时强制重新加载，但距上次加载不足 _RELOAD_MIN_INTERVAL 秒的缓存直接返回"""
+    now = time.monotonic()
+    with _album_ids_lock:
+        entry = _album_ids.get(key)
+    if entry and entry[0] > now and (not reload or now - entry[1] < _RELOAD_MIN_INTERVAL):
+        return entry[2]
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor(pymysql.cursors.Cursor)
+        if key == _ALL_ALBUMS:
+            cursor.execute('SELECT id FROM album')
+        else:
+            # 走 idx_album_creator_time (creator_id, create_time)，二级索引自带主键，无需回表
+            cursor.execute('SELECT id FROM album WHERE creator_id = %s', (key,))
+        album_ids = frozenset(row[0] for row in cursor.fetchall())
+        cursor.close()
+
+    with _album_ids_lock:
+        _album_ids[key] = (now + ALBUM_ACCESS_CACHE_TTL, now, album_ids)
+    return album_ids
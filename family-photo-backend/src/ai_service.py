@@ -15,7 +15,20 @@ AI 对话服务
     AI_MODEL         可选  模型名称（默认 llama3，可通过 /api/chat/models 查询已安装模型）
 
   【通用】
-    AI_TIMEOUT       可选  请求超时秒数（默认 60）
+    AI_TIMEOUT           可选  请求超时秒数（默认 60）
+    AI_MAX_CONCURRENCY   可选  每个进程同时进行的 AI 调用数上限（默认 4），避免对话占满 worker 线程
+    AI_QUEUE_TIMEOUT     可选  达到上限时排队等待的秒数（默认 5），超时返回 429
+    AI_CONNECT_TIMEOUT   可选  建立连接超时秒数（默认 5）
+    AI_HTTP_POOL_SIZE    可选  每个进程到 AI 服务的 keep-alive 连接数上限（默认 10）
+    AI_HTTP_KEEPALIVE    可选  空闲连接保持秒数（默认 60）
+    AI_MODELS_CACHE_TTL  可选  /chat/models 提供商状态缓存秒数（默认 60）
+    AI_MODELS_ERROR_TTL  可选  提供商不可用时的缓存秒数（默认 15）
+
+  【回复缓存】（常见问题直接返回，不占用推理时间）
+    AI_RESPONSE_CACHE_PROVIDERS  可选  启用缓存的提供商，逗号分隔（默认 openai,ollama；可加 mock，留空则关闭）
+    AI_RESPONSE_CACHE_SIZE       可选  每个进程最多缓存的回复条数（默认 256，LRU 淘汰）
+    AI_RESPONSE_CACHE_TTL        可选  缓存有效秒数（默认 3600）
+    AI_RESPONSE_CACHE_MAX_CHARS  可选  只缓存不超过该字数的提问（默认 50，长问题通常依赖上下文）
 
 示例：
   # OpenAI / DeepSeek / 通义千问
@@ -36,8 +49,17 @@ AI 对话服务
 """
 
 import os
+import re
+import json
+import hashlib
 import logging
+import time
 import random
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
 
 logger = logging.getLogger('photo_manager')
 
@@ -76,34 +98,124 @@ else:
     AI_MODEL     = os.environ.get('AI_MODEL', 'gpt-3.5-turbo')
 
 AI_TIMEOUT = int(os.environ.get('AI_TIMEOUT', '60'))
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', '4'))
+AI_QUEUE_TIMEOUT = float(os.environ.get('AI_QUEUE_TIMEOUT', '5'))
+AI_CONNECT_TIMEOUT = float(os.environ.get('AI_CONNECT_TIMEOUT', '5'))
+AI_HTTP_POOL_SIZE = int(os.environ.get('AI_HTTP_POOL_SIZE', '10'))
+AI_HTTP_KEEPALIVE = float(os.environ.get('AI_HTTP_KEEPALIVE', '60'))
+AI_MODELS_CACHE_TTL = float(os.environ.get('AI_MODELS_CACHE_TTL', '60'))
+AI_MODELS_ERROR_TTL = float(os.environ.get('AI_MODELS_ERROR_TTL', '15'))
+AI_RESPONSE_CACHE_PROVIDERS = {
+    p.strip().lower() for p in os.environ.get('AI_RESPONSE_CACHE_PROVIDERS', 'openai,ollama').split(',') if p.strip()
+}
+AI_RESPONSE_CACHE_SIZE = int(os.environ.get('AI_RESPONSE_CACHE_SIZE', '256'))
+AI_RESPONSE_CACHE_TTL = float(os.environ.get('AI_RESPONSE_CACHE_TTL', '3600'))
+AI_RESPONSE_CACHE_MAX_CHARS = int(os.environ.get('AI_RESPONSE_CACHE_MAX_CHARS', '50'))
+
+# ─────────────────────────────────────────
+# 并发限制：gunicorn gthread worker 中，AI 调用最多占用 AI_MAX_CONCURRENCY 个线程，
+# 其余线程始终留给相册/照片接口
+# ─────────────────────────────────────────
+_ai_slots = threading.BoundedSemaphore(AI_MAX_CONCURRENCY)
+
+
+def acquire_ai_slot(timeout: float = None) -> bool:
+    """占用一个 AI 调用名额（默认最多等待 AI_QUEUE_TIMEOUT 秒），成功返回 True；需配对调用 release_ai_slot"""
+    return _ai_slots.acquire(timeout=AI_QUEUE_TIMEOUT if timeout is None else timeout)
+
+
+def release_ai_slot():
+    _ai_slots.release()
+
+
+# ─────────────────────────────────────────
+# 客户端复用：每个进程一个 OpenAI 客户端 / requests.Session，
+# 复用 keep-alive 连接，避免每次对话重新建连和 TLS 握手
+# gunicorn fork 后子进程不能复用父进程的 socket，按 pid 检测后重建
+# ─────────────────────────────────────────
+_clients = {}
+_clients_lock = threading.Lock()
+_clients_pid = os.getpid()
+
+
+def _shared_client(name, factory):
+    global _clients_pid
+    with _clients_lock:
+        if os.getpid() != _clients_pid:
+            # 父进程的客户端直接丢弃（不关闭，避免影响父进程仍在使用的连接）
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = factory()
+        return client
+
+
+def _openai_client():
+    def create():
+        import httpx
+        return OpenAI(
+            api_key=AI_API_KEY,
+            base_url=AI_API_BASE,
+            timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=AI_HTTP_POOL_SIZE,
+                    max_keepalive_connections=AI_HTTP_POOL_SIZE,
+                    keepalive_expiry=AI_HTTP_KEEPALIVE,
+                ),
+            ),
+        )
+    return _shared_client('openai', create)
 
 
-def get_ai_response(messages: list, member_name: str = None) -> str:
+def _http_session():
+    def create():
+        from requests.adapters import HTTPAdapter
+        session = _requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=AI_HTTP_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    return _shared_client('requests', create)
+
+
+def get_ai_response(messages: list, member_name: str = None, cache: bool = True, member_id=None) -> str:
     """
     调用 AI 获取回复
     :param messages:     对话历史 [{'role': 'user'|'assistant'|'system', 'content': '...'}]
     :param member_name:  当前用户昵称（用于个性化问候）
+    :param cache:        成功的回复是否写入回复缓存（查询缓存见 get_cached_ai_response）
+    :param member_id:    当前用户ID（有对话上下文时缓存按成员隔离，不传则不缓存）
     :return:             AI 回复文本
     """
+    reply, ok = _chat_completion(messages, member_name)
+    if ok and cache:
+        _store_cached_response(messages, member_id, member_name, reply)
+    return reply
+
+
+def _chat_completion(messages: list, member_name: str = None):
+    """返回 (回复文本, 是否为模型正常生成的回复)；出错时的提示语 / 降级回复不写入缓存"""
     # ── Ollama 原生接口 ─────────────────────────────────
     logger.info(f'AI_PROVIDER={AI_PROVIDER}')
     logger.info(f'AI_API_KEY={AI_API_KEY}')
     if AI_PROVIDER == 'ollama':
         if not _REQUESTS_AVAILABLE:
-            return '🤖 Ollama 服务需要 requests 库，请联系管理员安装（pip install requests）～'
+            return '🤖 Ollama 服务需要 requests 库，请联系管理员安装（pip install requests）～', False
         return _ollama_chat(messages, member_name)
 
     # ── OpenAI 兼容接口（默认） ─────────────────────────
     # 未配置 API Key → 使用模拟回复
     if not AI_API_KEY:
-        return _mock_reply(messages, member_name)
+        return _mock_reply(messages, member_name), True
 
     # openai 库未安装 → 提示并回退
     if not _OPENAI_AVAILABLE:
-        return '🤖 AI 服务尚未安装，请联系管理员安装 openai 库（pip install openai）～'
+        return '🤖 AI 服务尚未安装，请联系管理员安装 openai 库（pip install openai）～', False
 
     try:
-        client = OpenAI(api_key=AI_API_KEY, base_url=AI_API_BASE)
+        client = _openai_client()
 
         # 构建请求消息列表（加入系统提示词）
         request_messages = [
@@ -113,23 +225,22 @@ def get_ai_response(messages: list, member_name: str = None) -> str:
         response = client.chat.completions.create(
             model=AI_MODEL,
             messages=request_messages,
-            timeout=AI_TIMEOUT,
             temperature=0.7,
             max_tokens=1000,
         )
 
         content = response.choices[0].message.content
         logger.info(f'[AI服务][{AI_PROVIDER}] 成功获取回复，长度={len(content)}')
-        return content
+        return content, True
 
     except Exception as e:
         logger.error(f'[AI服务][{AI_PROVIDER}] API 调用失败：{str(e)}')
-        return _mock_reply(messages, member_name)
+        return _mock_reply(messages, member_name), False
 
 
-def _ollama_chat(messages: list, member_name: str = None) -> str:
+def _ollama_chat(messages: list, member_name: str = None):
     """
-    调用 Ollama 原生接口（/api/chat）
+    调用 Ollama 原生接口（/api/chat），返回值同 _chat_completion
     文档：https://github.com/ollama/ollama/blob/main/docs/api.md
     """
     url = f'{AI_API_BASE.rstrip("/")}/api/chat'
@@ -138,7 +249,7 @@ def _ollama_chat(messages: list, member_name: str = None) -> str:
     ] + messages
 
     try:
-        resp = _requests.post(
+        resp = _http_session().post(
             url,
             json={
                 'model': AI_MODEL,
@@ -149,7 +260,7 @@ def _ollama_chat(messages: list, member_name: str = None) -> str:
                     'num_predict': 1000,
                 },
             },
-            timeout=AI_TIMEOUT,
+            timeout=(AI_CONNECT_TIMEOUT, AI_TIMEOUT),
         )
         resp.raise_for_status()
         data = resp.json()
@@ -157,49 +268,202 @@ def _ollama_chat(messages: list, member_name: str = None) -> str:
 
         if not content:
             logger.warning(f'[AI服务][ollama] 返回内容为空，原始响应：{data}')
-            return _mock_reply(messages, member_name)
+            return _mock_reply(messages, member_name), False
 
         logger.info(f'[AI服务][ollama] 成功获取回复，长度={len(content)}')
-        return content
+        return content, True
 
     except _requests.exceptions.ConnectionError:
         logger.error(f'[AI服务][ollama] 无法连接到 Ollama 服务（{AI_API_BASE}），请确认 Ollama 已启动')
-        return f'🤖 无法连接到本地 Ollama 服务（{AI_API_BASE}），请确认 Ollama 已启动（`ollama serve`）～'
+        return f'🤖 无法连接到本地 Ollama 服务（{AI_API_BASE}），请确认 Ollama 已启动（`ollama serve`）～', False
     except _requests.exceptions.Timeout:
         logger.error(f'[AI服务][ollama] 请求超时（{AI_TIMEOUT}秒）')
-        return '🤖 Ollama 响应超时，可能是模型推理较慢，请稍后再试～'
+        return '🤖 Ollama 响应超时，可能是模型推理较慢，请稍后再试～', False
     except Exception as e:
         logger.error(f'[AI服务][ollama] 调用失败：{str(e)}')
-        return _mock_reply(messages, member_name)
+        return _mock_reply(messages, member_name), False
 
 
-def list_ollama_models() -> list:
+def stream_ai_response(messages: list, member_name: str = None, cache: bool = True, member_id=None):
     """
-    列出 Ollama 本地已安装的模型
-    :return: 模型名称列表，例如 ['llama3:latest', 'qwen2:7b', ...]
+    流式调用 AI，逐段产出回复文本（生成器），参数同 get_ai_response
+    出错时与 get_ai_response 一样产出友好提示或模拟回复，调用方无需单独处理异常；
+    已经产出部分内容后才出错则直接结束，保留已产出的部分
+    完整生成的回复写入回复缓存（客户端中途断开的不写入）
     """
-    if AI_PROVIDER != 'ollama' or not _REQUESTS_AVAILABLE:
-        return []
-    url = f'{AI_API_BASE.rstrip("/")}/api/tags'
+    stream = _stream_completion(messages, member_name)
+    parts = []
+    while True:
+        try:
+            delta = next(stream)
+        except StopIteration as e:
+            ok = e.value
+            break
+        parts.append(delta)
+        yield delta
+    if ok and cache:
+        _store_cached_response(messages, member_id, member_name, ''.join(parts))
+
+
+def stream_text(text: str, size: int = 4):
+    """把完整文本按几个字一段产出（缓存命中 / 模拟回复时模拟流式效果）"""
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def _stream_completion(messages: list, member_name: str = None):
+    """stream_ai_response 的实现：逐段产出回复，返回值同 _chat_completion 的第二项"""
+    if AI_PROVIDER == 'ollama':
+        if not _REQUESTS_AVAILABLE:
+            yield '🤖 Ollama 服务需要 requests 库，请联系管理员安装（pip install requests）～'
+            return False
+        return (yield from _ollama_chat_stream(messages, member_name))
+
+    if not AI_API_KEY:
+        yield from _mock_stream(messages, member_name)
+        return True
+
+    if not _OPENAI_AVAILABLE:
+        yield '🤖 AI 服务尚未安装，请联系管理员安装 openai 库（pip install openai）～'
+        return False
+
+    length = 0
     try:
-        resp = _requests.get(url, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        return [m['name'] for m in data.get('models', [])]
+        client = _openai_client()
+        request_messages = [
+            {'role': 'system', 'content': _build_system_prompt(member_name)}
+        ] + messages
+
+        stream = client.chat.completions.create(
+            model=AI_MODEL,
+            messages=request_messages,
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                length += len(delta)
+                yield delta
+        logger.info(f'[AI服务][{AI_PROVIDER}] 流式回复完成，长度={length}')
+        return length > 0
+
+    except Exception as e:
+        logger.error(f'[AI服务][{AI_PROVIDER}] 流式调用失败：{str(e)}')
+        if not length:
+            yield from _mock_stream(messages, member_name)
+        return False
+
+
+def _ollama_chat_stream(messages: list, member_name: str = None):
+    """
+    调用 Ollama 原生接口（/api/chat，stream=true），响应为逐行 JSON：
+      {"message": {"content": "..."}, "done": false} ... {"done": true}
+    """
+    url = f'{AI_API_BASE.rstrip("/")}/api/chat'
+    ollama_messages = [
+        {'role': 'system', 'content': _build_system_prompt(member_name)}
+    ] + messages
+
+    length = 0
+    try:
+        with _http_session().post(
+            url,
+            json={
+                'model': AI_MODEL,
+                'messages': ollama_messages,
+                'stream': True,
+                'options': {
+                    'temperature': 0.7,
+                    'num_predict': 1000,
+                },
+            },
+            timeout=(AI_CONNECT_TIMEOUT, AI_TIMEOUT),
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('error'):
+                    raise RuntimeError(data['error'])
+                delta = data.get('message', {}).get('content', '')
+                if delta:
+                    length += len(delta)
+                    yield delta
+                if data.get('done'):
+                    break
+
+        if not length:
+            logger.warning('[AI服务][ollama] 流式返回内容为空')
+            yield from _mock_stream(messages, member_name)
+            return False
+        logger.info(f'[AI服务][ollama] 流式回复完成，长度={length}')
+        return True
+
+    except _requests.exceptions.ConnectionError:
+        logger.error(f'[AI服务][ollama] 无法连接到 Ollama 服务（{AI_API_BASE}），请确认 Ollama 已启动')
+        if not length:
+            yield f'🤖 无法连接到本地 Ollama 服务（{AI_API_BASE}），请确认 Ollama 已启动（`ollama serve`）～'
+    except _requests.exceptions.Timeout:
+        logger.error(f'[AI服务][ollama] 请求超时（{AI_TIMEOUT}秒）')
+        if not length:
+            yield '🤖 Ollama 响应超时，可能是模型推理较慢，请稍后再试～'
     except Exception as e:
-        logger.error(f'[AI服务][ollama] 获取模型列表失败：{str(e)}')
-        return []
+        logger.error(f'[AI服务][ollama] 流式调用失败：{str(e)}')
+        if not length:
+            yield from _mock_stream(messages, member_name)
+    return False
+
+
+# ─────────────────────────────────────────
+# 提供商状态缓存：/chat/models 直接返回缓存，过期后先返回旧值并在后台刷新，
+# 不可用的结果只缓存 AI_MODELS_ERROR_TTL 秒，恢复后能较快感知
+# ─────────────────────────────────────────
+_provider_cache = {'info': None, 'expires_at': 0.0, 'refreshing': False}
+_provider_lock = threading.Lock()
 
 
-def get_ai_provider_info() -> dict:
+def get_ai_provider_info(refresh: bool = False) -> dict:
     """
     返回当前 AI 提供商信息（供前端展示）
+    :param refresh: True 忽略缓存，立即重新探测
     """
+    with _provider_lock:
+        info = _provider_cache['info']
+        if info is not None and not refresh:
+            if time.monotonic() >= _provider_cache['expires_at'] and not _provider_cache['refreshing']:
+                _provider_cache['refreshing'] = True
+                threading.Thread(target=_refresh_provider_info, name='ai-provider-refresh', daemon=True).start()
+            return dict(info)
+    # 首次请求或强制刷新：同步探测
+    return dict(_refresh_provider_info())
+
+
+def _refresh_provider_info() -> dict:
+    try:
+        info = _probe_provider_info()
+    except Exception as e:
+        info = {'provider': AI_PROVIDER, 'model': AI_MODEL, 'available': False, 'models': [],
+                'checked_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'error': str(e)}
+    ttl = AI_MODELS_CACHE_TTL if info['available'] else AI_MODELS_ERROR_TTL
+    with _provider_lock:
+        _provider_cache['info'] = info
+        _provider_cache['expires_at'] = time.monotonic() + ttl
+        _provider_cache['refreshing'] = False
+    return info
+
+
+def _probe_provider_info() -> dict:
+    """实时探测 AI 提供商状态（Ollama 会请求 /api/tags）"""
     info = {
         'provider': AI_PROVIDER,
         'model': AI_MODEL,
         'available': False,
         'models': [],
+        'checked_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
     }
     if AI_PROVIDER == 'ollama':
         if not _REQUESTS_AVAILABLE:
@@ -207,7 +471,7 @@ def get_ai_provider_info() -> dict:
             return info
         # 检查 Ollama 服务是否可达
         try:
-            resp = _requests.get(f'{AI_API_BASE.rstrip("/")}/api/tags', timeout=3)
+            resp = _http_session().get(f'{AI_API_BASE.rstrip("/")}/api/tags', timeout=3)
             resp.raise_for_status()
             info['available'] = True
             info['models'] = [m['name'] for m in resp.json().get('models', [])]
@@ -218,8 +482,138 @@ def get_ai_provider_info() -> dict:
     return info
 
 
+# ─────────────────────────────────────────
+# 回复缓存：常见问题（"怎么上传照片"、"摄影技巧"）按 提供商 + 模型 + 系统提示词版本 + 上下文 + 规范化后的提问 精确匹配，
+# 命中时直接返回，不占用推理时间；LRU + TTL，每个进程独立
+#   - 会话第一轮（上下文只有这一条提问）：不含任何对话内容，不同成员共用同一条缓存，
+#     回复中的用户昵称以占位符保存，命中时换成当前用户的昵称
+#   - 有历史消息或摘要时："继续"、"为什么"这类追问的回复依赖上下文，缓存键加上成员ID 和实际发送的上下文摘要，
+#     只有同一成员、完全相同的上下文才会命中，不会把别人对话里的内容返回给当前成员
+# ─────────────────────────────────────────
+_MEMBER_PLACEHOLDER = '\x00member\x00'
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!。.,，~～…]+$')
+
+_response_cache = OrderedDict()     # key → (过期时间, 回复)
+_response_cache_lock = threading.Lock()
+_response_cache_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+
+def get_cached_ai_response(messages: list, member_id=None, member_name: str = None):
+    """
+    查询回复缓存
+    :param messages:     本轮实际发送的上下文（最后一条为用户本轮提问）
+    :param member_id:    当前用户ID
+    :return:             命中返回回复文本，未命中 / 该提供商未启用缓存返回 None
+    """
+    key = _response_cache_key(messages, member_id, member_name)
+    if key is None:
+        return None
+    now = time.monotonic()
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry and entry[0] > now:
+            _response_cache.move_to_end(key)
+            _response_cache_stats['hits'] += 1
+            reply = entry[1]
+        else:
+            if entry:
+                del _response_cache[key]
+                _response_cache_stats['expired'] += 1
+            _response_cache_stats['misses'] += 1
+            return None
+    logger.info(f'[AI服务][{_cache_provider()}] 命中回复缓存，长度={len(reply)}')
+    return reply.replace(_MEMBER_PLACEHOLDER, member_name or '')
+
+
+def get_response_cache_stats() -> dict:
+    """回复缓存统计（当前进程）"""
+    with _response_cache_lock:
+        stats = dict(_response_cache_stats, size=len(_response_cache))
+    lookups = stats['hits'] + stats['misses']
+    stats.update(
+        hit_rate=round(stats['hits'] / lookups, 3) if lookups else 0.0,
+        capacity=AI_RESPONSE_CACHE_SIZE,
+        ttl=AI_RESPONSE_CACHE_TTL,
+        providers=sorted(AI_RESPONSE_CACHE_PROVIDERS),
+        enabled=response_cache_enabled(),
+    )
+    return stats
+
+
+def response_cache_enabled() -> bool:
+    return _cache_provider() in AI_RESPONSE_CACHE_PROVIDERS and AI_RESPONSE_CACHE_SIZE > 0
+
+
+def _store_cached_response(messages: list, member_id, member_name: str, reply: str):
+    key = _response_cache_key(messages, member_id, member_name)
+    if key is None or not reply:
+        return
+    if member_name:
+        # 昵称过短时替换容易误伤正文，包含昵称的回复直接不缓存
+        if len(member_name) < 2 and member_name in reply:
+            return
+        reply = reply.replace(member_name, _MEMBER_PLACEHOLDER)
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic() + AI_RESPONSE_CACHE_TTL, reply)
+        _response_cache.move_to_end(key)
+        _response_cache_stats['stores'] += 1
+        while len(_response_cache) > AI_RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+            _response_cache_stats['evictions'] += 1
+
+
+def _cache_provider() -> str:
+    """缓存按实际产生回复的提供商区分：未配置 API Key 时为 mock（模拟回复）"""
+    if AI_PROVIDER == 'ollama':
+        return 'ollama'
+    return AI_PROVIDER if AI_API_KEY else 'mock'
+
+
+def _response_cache_key(messages: list, member_id=None, member_name: str = None):
+    """
+    缓存键；未启用缓存、提问为空或过长（通常依赖上下文）、
+    有上下文但未提供成员ID 时返回 None
+    """
+    if not response_cache_enabled() or not messages or messages[-1]['role'] != 'user':
+        return None
+    # 全角转半角、统一大小写和空白、去掉结尾的标点与语气符号
+    normalized = unicodedata.normalize('NFKC', messages[-1]['content'] or '').lower()
+    normalized = _TRAILING_PUNCTUATION.sub('', ' '.join(normalized.split()))
+    if not normalized or len(normalized) > AI_RESPONSE_CACHE_MAX_CHARS:
+        return None
+
+    earlier = messages[:-1]
+    if not earlier:
+        scope = '*'
+    elif member_id is None:
+        return None
+    else:
+        # 摘要 + 最近对话窗口，与发送给模型的内容一致
+        context = json.dumps(earlier, ensure_ascii=False, sort_keys=True)
+        scope = f'{member_id}:{hashlib.sha1(context.encode("utf-8")).hexdigest()[:16]}'
+    return f'{_cache_provider()}|{AI_MODEL}|{_system_prompt_version(bool(member_name))}|{scope}|{normalized}'
+
+
+@lru_cache(maxsize=2)
+def _system_prompt_version(with_member_name: bool) -> str:
+    """系统提示词版本（模板内容的摘要）：修改提示词后旧缓存自然失效"""
+    prompt = _build_system_prompt(_MEMBER_PLACEHOLDER if with_member_name else None)
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]
+
+
+def _last_user_message(messages: list) -> str:
+    for msg in reversed(messages):
+        if msg['role'] == 'user':
+            return msg['content']
+    return ''
+
+
+@lru_cache(maxsize=256)
 def _build_system_prompt(member_name: str = None) -> str:
-    """构建系统提示词（AI 的角色设定）"""
+    """
+    构建系统提示词（AI 的角色设定）
+    结果按用户缓存，同一用户每轮对话的前缀完全一致，便于 Ollama / OpenAI 命中提示词前缀缓存
+    """
     greeting = f'当前用户名叫「{member_name}」，请用温馨亲切的语气回复。' if member_name else ''
     return (
         '你是一个温馨友好的家庭相册 AI 助手 📷💖。\n'
@@ -233,16 +627,75 @@ def _build_system_prompt(member_name: str = None) -> str:
     )
 
 
+_SUMMARY_PROMPT = (
+    '你负责为家庭相册 AI 助手整理对话摘要。\n'
+    '请把「已有摘要」和「新增对话」合并成一段新的摘要，保留用户的需求、偏好、提到的人物/相册/事件和尚未解决的问题，'
+    '省略寒暄和重复内容。只输出摘要正文，使用中文，不超过 {max_chars} 字。'
+)
+
+
+def summary_available() -> bool:
+    """当前配置能否调用 AI 生成摘要（未配置 API Key / 缺少依赖时为 False）"""
+    if AI_PROVIDER == 'ollama':
+        return _REQUESTS_AVAILABLE
+    return bool(AI_API_KEY) and _OPENAI_AVAILABLE
+
+
+def summarize_chat(previous_summary: str, messages: list, max_chars: int = 500):
+    """
+    把早期对话合并进滚动摘要（供 chat_context 后台调用）
+    :return: 新摘要；AI 不可用或调用失败时返回 None，由调用方降级处理
+    """
+    transcript = '\n'.join(
+        f'{"用户" if m["role"] == "user" else "助手"}：{m["content"]}' for m in messages
+    )
+    request_messages = [
+        {'role': 'system', 'content': _SUMMARY_PROMPT.format(max_chars=max_chars)},
+        {'role': 'user', 'content': f'已有摘要：{previous_summary or "（无）"}\n\n新增对话：\n{transcript}'},
+    ]
+    try:
+        if AI_PROVIDER == 'ollama':
+            if not _REQUESTS_AVAILABLE:
+                return None
+            resp = _http_session().post(
+                f'{AI_API_BASE.rstrip("/")}/api/chat',
+                json={
+                    'model': AI_MODEL,
+                    'messages': request_messages,
+                    'stream': False,
+                    'options': {'temperature': 0.3, 'num_predict': max_chars},
+                },
+                timeout=(AI_CONNECT_TIMEOUT, AI_TIMEOUT),
+            )
+            resp.raise_for_status()
+            content = resp.json().get('message', {}).get('content', '')
+        else:
+            if not AI_API_KEY or not _OPENAI_AVAILABLE:
+                return None
+            response = _openai_client().chat.completions.create(
+                model=AI_MODEL,
+                messages=request_messages,
+                temperature=0.3,
+                max_tokens=max_chars,
+            )
+            content = response.choices[0].message.content
+    except Exception as e:
+        logger.error(f'[AI服务][{AI_PROVIDER}] 生成对话摘要失败：{str(e)}')
+        return None
+    return content.strip()[:max_chars] if content else None
+
+
+def _mock_stream(messages: list, member_name: str = None):
+    """模拟回复的流式版本：按几个字一段产出，便于在没有 API Key 时体验流式效果"""
+    yield from stream_text(_mock_reply(messages, member_name))
+
+
 def _mock_reply(messages: list, member_name: str = None) -> str:
     """
     模拟 AI 回复（未配置真实 API 时使用）
     可根据用户问题给出预设回复，让功能在没有 API Key 时仍可体验
     """
-    last_msg = ''
-    for msg in reversed(messages):
-        if msg['role'] == 'user':
-            last_msg = msg['content']
-            break
+    last_msg = _last_user_message(messages)
 
     name_prefix = f'{member_name}，' if member_name else ''
 
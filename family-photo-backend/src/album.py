@@ -10,51 +10,67 @@ album_bp = Blueprint('album', __name__)
 from config.config import (
     UPLOAD_PHOTO_FOLDER, ALLOWED_EXTENSIONS, UPLOAD_COVER_FOLDER
 )
-from .utils import get_db_connection
+from .utils import get_db_connection, keyset_condition, encode_cursor
 from .auth import login_required
+from .rendition import delete_renditions
+from .access import can_access_album, invalidate_album_access
 
 @album_bp.route('/photos/album/<int:album_id>', methods=['GET'])
 @login_required
 def get_album_photos(album_id):
+    """
+    分页方式（二选一）：
+      page / page_size    传统页码分页（默认）
+      cursor / page_size  游标分页：首次传空 cursor，之后传上一页返回的 next_cursor，
+                          按 (upload_time, id) 直接定位，翻到很深也不会变慢
+    """
     # 获取分页参数
     page = int(request.args.get('page', 1))  # 默认第1页
     page_size = int(request.args.get('page_size', 12))  # 每页12条
     offset = (page - 1) * page_size  # 计算偏移量
+    cursor_mode = 'cursor' in request.args
+    try:
+        keyset_sql, keyset_params = keyset_condition('p.upload_time', 'p.id', request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
 
     try:
+        # 权限校验：非管理员只能查看自己创建的相册
+        if not g.is_admin and not can_access_album(album_id):
+            return jsonify({'code': 403, 'msg': '无权查看该相册'}), 403
+
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
 
-        # 权限校验：非管理员只能查看自己创建的相册
-        if not g.is_admin:
-            cursor.execute('SELECT id FROM album WHERE id = %s AND creator_id = %s', (album_id, g.member_id))
-            if not cursor.fetchone():
-                cursor.close()
-                conn.close()
-                return jsonify({'code': 403, 'msg': '无权查看该相册'}), 403
+        # 总条数（album.photo_count 由上传/删除维护，无需 COUNT(*)）
+        cursor.execute('SELECT photo_count FROM album WHERE id = %s', (album_id,))
+        album = cursor.fetchone()
+        total = album['photo_count'] if album else 0
 
-        # 1. 查询当前页数据
-        sql = '''SELECT p.*, m.name as member_name, o.name as operator_name, f.folder_id as favorite_folder_id
+        # 1. 查询当前页数据（多取 1 条，用于判断是否还有下一页）
+        sql = f'''SELECT p.*, m.name as member_name, o.name as operator_name, f.folder_id as favorite_folder_id
                  FROM photo p 
                  LEFT JOIN family_member m ON p.member_id = m.id 
                  LEFT JOIN family_member o ON p.operator_id = o.id 
                  LEFT JOIN favorite_photo f ON f.photo_id = p.id and f.member_id = p.operator_id
-                 WHERE p.album_id = %s 
-                 ORDER BY p.upload_time DESC 
+                 WHERE p.album_id = %s{keyset_sql}
+                 ORDER BY p.upload_time DESC, p.id DESC 
                  LIMIT %s OFFSET %s'''
-        cursor.execute(sql, (album_id, page_size, offset))
+        if cursor_mode:
+            cursor.execute(sql, [album_id, *keyset_params, page_size + 1, 0])
+        else:
+            cursor.execute(sql, (album_id, page_size + 1, offset))
         photos = cursor.fetchall()
 
+        has_more = len(photos) > page_size
+        photos = photos[:page_size]
         for photo in photos:
             if photo.get('shoot_time'):
                 photo['shoot_time'] = photo['shoot_time'].strftime('%Y-%m-%d %H:%M:%S')
 
             if photo.get('upload_time'):
                 photo['upload_time'] = photo['upload_time'].strftime('%Y-%m-%d %H:%M:%S')
-
-        # 2. 查询总条数（判断是否有更多数据）
-        cursor.execute('SELECT COUNT(*) as total FROM photo WHERE album_id = %s', (album_id,))
-        total = cursor.fetchone()['total']
+        next_cursor = encode_cursor(photos[-1]['upload_time'], photos[-1]['id']) if photos else None
 
         cursor.close()
         conn.close()
@@ -63,7 +79,8 @@ def get_album_photos(album_id):
             'code': 200,
             'data': photos,
             'total': total,  # 总条数
-            'has_more': page * page_size < total  # 是否有下一页
+            'has_more': has_more,  # 是否有下一页
+            'next_cursor': next_cursor,  # 游标分页时，下一页请求带上该值
         })
     except Exception as e:
         return jsonify({'code': 500, 'msg': f'获取照片失败：{str(e)}'}), 500
@@ -170,6 +187,7 @@ def create_album():
         )
         conn.commit()
         new_album_id = cursor.lastrowid
+        invalidate_album_access(g.member_id)
 
         # 5. 关闭连接并返回结果
         cursor.close()
@@ -197,18 +215,12 @@ def rename_album():
     if not album_id or not new_name:
         return jsonify({'code': 400, 'msg': '相册ID和新名称不能为空'}), 400
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
         # 校验相册是否存在 + 权限校验（非管理员只能操作自己创建的相册）
-        if g.is_admin:
-            cursor.execute('SELECT id FROM album WHERE id = %s', (album_id,))
-        else:
-            cursor.execute('SELECT id FROM album WHERE id = %s AND creator_id = %s', (album_id, g.member_id))
-        if not cursor.fetchone():
-            cursor.close()
-            conn.close()
+        if not can_access_album(album_id):
             return jsonify({'code': 404 if g.is_admin else 403,
                            'msg': '相册不存在' if g.is_admin else '无权操作该相册'}), 404 if g.is_admin else 403
+        conn = get_db_connection()
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
         cursor.execute(
             'UPDATE album SET album_name = %s WHERE id = %s',
             (new_name, album_id)
@@ -229,14 +241,14 @@ def delete_album():
     if not album_id:
         return jsonify({'code': 400, 'msg': '相册ID不能为空'}), 400
     try:
+        # 先校验相册是否存在 + 权限校验（非管理员只能操作自己创建的相册）
+        if not can_access_album(album_id):
+            return jsonify({'code': 404 if g.is_admin else 403,
+                           'msg': '相册不存在' if g.is_admin else '无权操作该相册'}), 404 if g.is_admin else 403
+
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
-
-        # 先校验相册是否存在 + 权限校验（非管理员只能操作自己创建的相册）
-        if g.is_admin:
-            cursor.execute('SELECT id, cover_path FROM album WHERE id = %s', (album_id,))
-        else:
-            cursor.execute('SELECT id, cover_path FROM album WHERE id = %s AND creator_id = %s', (album_id, g.member_id))
+        cursor.execute('SELECT id, cover_path, creator_id FROM album WHERE id = %s', (album_id,))
         album = cursor.fetchone()
         if not album:
             cursor.close()
@@ -252,6 +264,20 @@ def delete_album():
             file_path = os.path.join(UPLOAD_PHOTO_FOLDER, photo['file_path'])
             if os.path.exists(file_path):
                 os.remove(file_path)
+            delete_renditions(photo['file_path'])
+        # 收藏了这些照片的收藏夹，先扣减收藏数量（favorite_photo 记录随照片级联删除）
+        cursor.execute(
+            '''UPDATE favorite_folder ff
+               JOIN (
+                   SELECT fp.folder_id, COUNT(*) AS cnt
+                   FROM favorite_photo fp
+                   JOIN photo p ON fp.photo_id = p.id
+                   WHERE p.album_id = %s
+                   GROUP BY fp.folder_id
+               ) t ON t.folder_id = ff.id
+               SET ff.photo_count = GREATEST(ff.photo_count - t.cnt, 0)''',
+            (album_id,)
+        )
         # 删除照片记录
         cursor.execute('DELETE FROM photo WHERE album_id = %s', (album_id,))
         # 删除相册封面（如果不是默认封面）
@@ -264,6 +290,7 @@ def delete_album():
         conn.commit()
         cursor.close()
         conn.close()
+        invalidate_album_access(album['creator_id'])
         return jsonify({'code': 200, 'msg': '删除相册成功'})
     except Exception as e:
         print(e)
@@ -286,6 +313,13 @@ def upload_album_cover():
             raise ValueError()
     except (ValueError, TypeError):
         return jsonify({'code': 400, 'msg': '相册ID必须为正整数'}), 400
+    # 校验相册是否存在 + 权限校验（非管理员只能操作自己创建的相册），无权限时不保存文件
+    try:
+        if not can_access_album(album_id):
+            return jsonify({'code': 404 if g.is_admin else 403,
+                           'msg': '相册不存在' if g.is_admin else '无权操作该相册'}), 404 if g.is_admin else 403
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'权限校验失败：{str(e)}'}), 500
     # 验证文件类型
     if file and '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS:
         filename = secure_filename(f'album_{album_id}_{datetime.now().strftime("%Y%m%d%H%M%S")}.jpg')
@@ -293,11 +327,7 @@ def upload_album_cover():
         try:
             conn = get_db_connection()
             cursor = conn.cursor(pymysql.cursors.DictCursor)
-            # 校验相册是否存在 + 权限校验（非管理员只能操作自己创建的相册）
-            if g.is_admin:
-                cursor.execute('SELECT id, cover_path FROM album WHERE id = %s', (album_id,))
-            else:
-                cursor.execute('SELECT id, cover_path FROM album WHERE id = %s AND creator_id = %s', (album_id, g.member_id))
+            cursor.execute('SELECT id, cover_path FROM album WHERE id = %s', (album_id,))
             old_cover = cursor.fetchone()
             if not old_cover:
                 cursor.close()
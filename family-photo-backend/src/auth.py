@@ -1,10 +1,19 @@
 from flask import Blueprint, request, jsonify, send_from_directory, g, make_response
 import pymysql
 import logging
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 auth_bp = Blueprint('auth', __name__)
 
-from config.config import (verify_token, verify_password, generate_token)
+from config.config import (
+    verify_token, verify_password, generate_token, password_needs_rehash, hash_frontend_password,
+    TOKEN_CACHE_SIZE, LOGIN_VERIFY_WORKERS, LOGIN_VERIFY_QUEUE, LOGIN_THROTTLE_WINDOW,
+    LOGIN_IP_MAX_ATTEMPTS, LOGIN_USER_MAX_FAILURES
+)
 from .utils import get_db_connection
 
 logger = logging.getLogger('photo_manager')
@@ -14,18 +23,74 @@ logger = logging.getLogger('photo_manager')
 COOKIE_SAMESITE = 'Lax'
 COOKIE_SECURE = False   # 生产环境改为 True（需 HTTPS）
 
+# ── 已验证 Token 缓存 ────────────────────────────────────
+# 相册网格一屏几十张图片，每张都带同一个 Token 请求 /uploads，验证通过的结果按 Token 摘要缓存，
+# 到 exp 过期时间后自动失效；退出登录时移除（invalidate_token）
+_token_cache = OrderedDict()    # sha256(token) → (exp 时间戳, payload)
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidated': 0}
+
+
+def _token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+def verify_token_cached(token):
+    """同 verify_token，命中缓存时跳过签名校验和解析；验证失败的 Token 不缓存"""
+    key = _token_key(token)
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry:
+            if entry[0] > time.time():
+                _token_cache.move_to_end(key)
+                _token_cache_stats['hits'] += 1
+                return entry[1]
+            del _token_cache[key]
+            _token_cache_stats['expired'] += 1
+        _token_cache_stats['misses'] += 1
+
+    payload = verify_token(token)
+    if payload and payload.get('exp') and TOKEN_CACHE_SIZE > 0:
+        with _token_cache_lock:
+            _token_cache[key] = (payload['exp'], payload)
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+                _token_cache_stats['evictions'] += 1
+    return payload
+
+
+def invalidate_token(token):
+    """从缓存中移除 Token（退出登录时调用；之后的请求会重新完整验证）"""
+    with _token_cache_lock:
+        if _token_cache.pop(_token_key(token), None) is not None:
+            _token_cache_stats['invalidated'] += 1
+
+
+def get_token_cache_stats():
+    """Token 缓存统计（当前进程）"""
+    with _token_cache_lock:
+        stats = dict(_token_cache_stats, size=len(_token_cache), capacity=TOKEN_CACHE_SIZE)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+    return stats
+
+
+def _request_token():
+    # Token 获取优先级：请求头 → Cookie → URL参数（兼容旧版图片请求）
+    return (
+        request.headers.get('Authorization')
+        or request.cookies.get('token')
+        or request.args.get('token')
+    )
+
+
 def login_required(f):
     def wrapper(*args, **kwargs):
-        # Token 获取优先级：请求头 → Cookie → URL参数（兼容旧版图片请求）
-        token = (
-            request.headers.get('Authorization')
-            or request.cookies.get('token')
-            or request.args.get('token')
-        )
+        token = _request_token()
         if not token:
             return jsonify({'code': 401, 'msg': '未登录，请先登录'}), 401
 
-        payload = verify_token(token)
+        payload = verify_token_cached(token)
         if not payload:
             return jsonify({'code': 401, 'msg': '登录已过期，请重新登录'}), 401
 
@@ -39,6 +104,79 @@ def login_required(f):
     wrapper.__name__ = f.__name__
     return wrapper
 
+# ── 登录限流 & 密码校验线程池 ────────────────────────────
+# bcrypt 校验放到独立线程池执行（计算期间释放 GIL），每个进程最多占用 LOGIN_VERIFY_WORKERS 个 CPU 核，
+# 集中登录 / 暴力破解时其余线程照常处理相册和图片请求；排队超过 LOGIN_VERIFY_QUEUE 直接返回 429
+# 同一 IP 的登录尝试次数、同一用户名的密码错误次数按 LOGIN_THROTTLE_WINDOW 时间窗口限流（每个进程独立统计）
+_verify_executor = ThreadPoolExecutor(max_workers=LOGIN_VERIFY_WORKERS, thread_name_prefix='login-verify')
+_verify_slots = threading.BoundedSemaphore(LOGIN_VERIFY_WORKERS + LOGIN_VERIFY_QUEUE)
+_login_attempts = {}    # ('ip', 地址) / ('user', 用户名) → deque[尝试时间]
+_login_attempts_lock = threading.Lock()
+# 记录的 key 超过该数量时清理窗口外的记录，防止大量不同 IP / 用户名撑大内存
+_LOGIN_ATTEMPTS_PRUNE_SIZE = 10000
+
+
+def _throttle_wait(key, limit):
+    """窗口内次数已达上限时返回还需等待的秒数，否则返回 0（limit <= 0 表示不限制）"""
+    if limit <= 0:
+        return 0
+    now = time.monotonic()
+    with _login_attempts_lock:
+        attempts = _login_attempts.get(key)
+        if not attempts:
+            return 0
+        while attempts and attempts[0] <= now - LOGIN_THROTTLE_WINDOW:
+            attempts.popleft()
+        if not attempts:
+            del _login_attempts[key]
+            return 0
+        if len(attempts) < limit:
+            return 0
+        return int(attempts[0] + LOGIN_THROTTLE_WINDOW - now) + 1
+
+
+def _record_attempt(key):
+    now = time.monotonic()
+    with _login_attempts_lock:
+        if len(_login_attempts) >= _LOGIN_ATTEMPTS_PRUNE_SIZE:
+            for k in [k for k, v in _login_attempts.items() if v[-1] <= now - LOGIN_THROTTLE_WINDOW]:
+                del _login_attempts[k]
+        _login_attempts.setdefault(key, deque()).append(now)
+
+
+def _clear_attempts(key):
+    with _login_attempts_lock:
+        _login_attempts.pop(key, None)
+
+
+def _check_password(frontend_sha256, db_bcrypt_hash):
+    """在线程池中执行：校验密码，强度与 BCRYPT_ROUNDS 不一致时顺便生成新哈希，返回 (是否通过, 新哈希或 None)"""
+    if not verify_password(frontend_sha256, db_bcrypt_hash):
+        return False, None
+    if password_needs_rehash(db_bcrypt_hash):
+        return True, hash_frontend_password(frontend_sha256)
+    return True, None
+
+
+def _verify_password_bounded(frontend_sha256, db_bcrypt_hash):
+    """提交到密码校验线程池并等待结果，返回值同 _check_password；排队已满时返回 None"""
+    if not _verify_slots.acquire(blocking=False):
+        return None
+    try:
+        future = _verify_executor.submit(_check_password, frontend_sha256, db_bcrypt_hash)
+    except Exception:
+        _verify_slots.release()
+        raise
+    future.add_done_callback(lambda _: _verify_slots.release())
+    return future.result()
+
+
+def _too_many_logins(retry_after, msg):
+    response = jsonify({'code': 429, 'msg': msg})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
 # ------------------- 登录接口（修改：验证family_member表的账号密码） -------------------
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -51,6 +189,14 @@ def login():
     if not username or not password:
         return jsonify({'code': 400, 'msg': '用户名和密码不能为空'}), 400
 
+    ip_key, user_key = ('ip', request.remote_addr or ''), ('user', username)
+    wait = (_throttle_wait(ip_key, LOGIN_IP_MAX_ATTEMPTS)
+            or _throttle_wait(user_key, LOGIN_USER_MAX_FAILURES))
+    if wait:
+        logger.warning(f'登录限流：username={username}，ip={ip_key[1]}，{wait} 秒后可重试')
+        return _too_many_logins(wait, f'登录尝试过于频繁，请 {wait} 秒后再试')
+    _record_attempt(ip_key)
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
@@ -66,8 +212,27 @@ def login():
         if not member:
             return jsonify({'code': 400, 'msg': '用户名不存在'}), 400
 
-        if not verify_password(password, member['password']):
+        result = _verify_password_bounded(password, member['password'])
+        if result is None:
+            return _too_many_logins(1, '登录人数较多，请稍后再试')
+        matched, new_hash = result
+        if not matched:
+            _record_attempt(user_key)
             return jsonify({'code': 400, 'msg': '密码错误'}), 400
+        _clear_attempts(user_key)
+
+        # BCRYPT_ROUNDS 调整后，用户登录成功时按新强度重新哈希（仅在密码未被同时修改时写入）
+        if new_hash:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'UPDATE family_member SET password = %s WHERE id = %s AND password = %s',
+                (new_hash, member['id'], member['password'])
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+            logger.info(f'[{member["username"]}] 密码哈希已按新强度更新')
 
         # 生成Token（携带成员信息及权限标识）
         token = generate_token({
@@ -108,6 +273,9 @@ def login():
 
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
+    token = _request_token()
+    if token:
+        invalidate_token(token)
     resp = make_response(jsonify({'code': 200, 'msg': '退出成功'}))
     resp.delete_cookie('token', path='/')
     return resp
\ No newline at end of file
@@ -1,135 +1,305 @@
 """
 AI 对话接口
 ──────────
-提供两个核心接口：
-  GET  /api/chat/history   获取最近三个月聊天记录（按账号隔离）
-  POST /api/chat/send      发送消息并获取 AI 回复
+提供核心接口：
+  GET  /api/chat/history       获取默认会话聊天记录（最近三个月内，游标分页，按账号隔离）
+  POST /api/chat/send          发送消息并获取 AI 回复（默认会话）
+  POST /api/chat/send/stream   发送消息，AI 回复以 Server-Sent Events 逐段返回（默认会话）
+
+多会话（每个账号可以有多个独立上下文的会话，默认会话 ID 为 default）：
+  GET  /api/chat/conversations                      会话列表（按最后消息时间倒序）
+  POST /api/chat/conversations                      新建会话
+  GET  /api/chat/conversations/<id>/messages        会话消息（游标分页，从新到旧）
+  POST /api/chat/conversations/<id>/send            在会话中发送消息
+  POST /api/chat/conversations/<id>/send/stream     在会话中发送消息（SSE）
+
+消息查询均带 member_id + conversation_id 条件，走 idx_conversation (member_id, conversation_id, create_time)
 """
 
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
+import os
+import json
+import uuid
 import pymysql
 import logging
 from datetime import datetime
 
 from .auth import login_required
-from .utils import get_db_connection
-from .ai_service import get_ai_response, get_ai_provider_info
+from .utils import get_db_connection, detach_db_connection, keyset_condition, encode_cursor
+from .chat_context import build_chat_context, has_chat_context, delete_summaries, DEFAULT_CONVERSATION_ID
+from .ai_service import (
+    get_ai_response, stream_ai_response, stream_text, get_cached_ai_response, response_cache_enabled,
+    get_ai_provider_info, acquire_ai_slot, release_ai_slot, AI_QUEUE_TIMEOUT
+)
 
 chat_bp = Blueprint('chat', __name__)
 
+# 聊天记录查询上限：时间窗口最多月数、每页最多条数
+CHAT_HISTORY_MAX_MONTHS = int(os.environ.get('CHAT_HISTORY_MAX_MONTHS', '12'))
+CHAT_HISTORY_MAX_LIMIT = int(os.environ.get('CHAT_HISTORY_MAX_LIMIT', '200'))
+
 logger = logging.getLogger('photo_manager')
 
 
 # ─────────────────────────────────────────────────────────
-# 获取聊天记录（最近三个月，按账号隔离）
+# 会话管理
 # ─────────────────────────────────────────────────────────
-@chat_bp.route('/chat/history', methods=['GET'])
+@chat_bp.route('/chat/conversations', methods=['GET'])
 @login_required
-def get_chat_history():
-    """
-    查询当前登录用户最近三个月的聊天记录
-    可选参数：
-      months  查询月数，默认 3（如 ?months=6 则查最近半年）
-    """
+def list_conversations():
+    """当前用户的会话列表，按最后消息时间倒序（最多 100 个）"""
     try:
-        months = int(request.args.get('months', 3))
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
+        cursor.execute(
+            '''SELECT conversation_id, title, create_time, last_message_time
+               FROM ai_conversation
+               WHERE member_id = %s
+               ORDER BY last_message_time DESC
+               LIMIT 100''',
+            (g.member_id,)
+        )
+        conversations = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        for c in conversations:
+            c['create_time'] = c['create_time'].strftime('%Y-%m-%d %H:%M:%S')
+            c['last_message_time'] = c['last_message_time'].strftime('%Y-%m-%d %H:%M:%S')
+        return jsonify({'code': 200, 'data': conversations})
 
-        sql = '''
-            SELECT id, role, content, create_time
-            FROM ai_chat_message
-            WHERE member_id = %s
-              AND create_time >= DATE_SUB(NOW(), INTERVAL %s MONTH)
-            ORDER BY create_time ASC
-        '''
-        cursor.execute(sql, (g.member_id, months))
-        messages = cursor.fetchall()
-
-        # datetime 对象 → 字符串，前端可直接使用
-        for msg in messages:
-            if msg.get('create_time'):
-                msg['create_time'] = msg['create_time'].strftime('%Y-%m-%d %H:%M:%S')
+    except Exception as e:
+        logger.error(f'获取会话列表失败：{str(e)}')
+        return jsonify({'code': 500, 'msg': f'获取会话列表失败：{str(e)}'}), 500
+
+
+@chat_bp.route('/chat/conversations', methods=['POST'])
+@login_required
+def create_conversation():
+    """
+    新建会话
+    请求体：{ "title": "会话标题（可选）" }
+    """
+    title = ((request.json or {}).get('title') or '').strip() or '新对话'
+    if len(title) > 100:
+        return jsonify({'code': 400, 'msg': '会话标题不能超过 100 个字符'}), 400
 
+    try:
+        conversation_id = uuid.uuid4().hex
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''INSERT INTO ai_conversation (member_id, conversation_id, title, create_time, last_message_time)
+               VALUES (%s, %s, %s, %s, %s)''',
+            (g.member_id, conversation_id, title, now, now)
+        )
+        conn.commit()
         cursor.close()
         conn.close()
 
-        logger.info(f'[{g.member_name}] 获取聊天记录，共 {len(messages)} 条')
-        return jsonify({'code': 200, 'data': messages})
+        logger.info(f'[{g.member_name}] 新建会话 {conversation_id}')
+        return jsonify({'code': 200, 'msg': '创建成功', 'data': {
+            'conversation_id': conversation_id,
+            'title': title,
+            'create_time': now,
+            'last_message_time': now,
+        }})
+
+    except Exception as e:
+        logger.error(f'新建会话失败：{str(e)}')
+        return jsonify({'code': 500, 'msg': f'新建会话失败：{str(e)}'}), 500
+
+
+# ─────────────────────────────────────────────────────────
+# 聊天记录：按会话从新到旧分页，逐行流式输出
+# ─────────────────────────────────────────────────────────
+@chat_bp.route('/chat/history', methods=['GET'], defaults={'conversation_id': DEFAULT_CONVERSATION_ID})
+@chat_bp.route('/chat/conversations/<conversation_id>/messages', methods=['GET'])
+@login_required
+def get_chat_history(conversation_id):
+    """
+    查询当前登录用户某个会话的聊天记录（/chat/history 为默认会话），从最新往前分页（"加载更早"）
+    可选参数：
+      months  时间窗口月数，默认 3，最大 CHAT_HISTORY_MAX_MONTHS
+      limit   每页条数，默认 50，最大 CHAT_HISTORY_MAX_LIMIT
+      cursor  上一页返回的 next_cursor，不传为最新一页
+    返回的 data 为时间正序，has_more 表示窗口内是否还有更早的消息
+    实现：先用覆盖索引定位本页最早一条（边界），再按时间正序逐行读取并流式输出，不在内存中拼装整页
+    """
+    try:
+        months = min(max(int(request.args.get('months', 3)), 1), CHAT_HISTORY_MAX_MONTHS)
+        limit = min(max(int(request.args.get('limit', 50)), 1), CHAT_HISTORY_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'code': 400, 'msg': 'months / limit 必须为整数'}), 400
+    try:
+        keyset_sql, keyset_params = keyset_condition('create_time', 'id', request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
+
+    where = ''' WHERE member_id = %s AND conversation_id = %s
+                  AND create_time >= DATE_SUB(NOW(), INTERVAL %s MONTH)''' + keyset_sql
+    params = [g.member_id, conversation_id, months, *keyset_params]
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        if not _conversation_exists(cursor, conversation_id):
+            cursor.close()
+            conn.close()
+            return jsonify({'code': 404, 'msg': '会话不存在'}), 404
+
+        # 1. 边界：本页最早一条（第 limit 条）及其后是否还有（第 limit + 1 条），只扫描 idx_conversation
+        cursor.execute(
+            'SELECT create_time, id FROM ai_chat_message' + where +
+            ' ORDER BY create_time DESC, id DESC LIMIT %s, 2',
+            params + [limit - 1]
+        )
+        boundary_rows = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        if conn:
+            conn.close()
+        logger.error(f'获取聊天记录失败：{str(e)}')
+        return jsonify({'code': 500, 'msg': f'获取聊天记录失败：{str(e)}'}), 500
+
+    boundary = boundary_rows[0] if boundary_rows else None
+    has_more = len(boundary_rows) > 1
+    next_cursor = encode_cursor(boundary[0], boundary[1]) if has_more else None
+    if boundary:
+        where += ' AND (create_time > %s OR (create_time = %s AND id >= %s))'
+        params += [boundary[0], boundary[0], boundary[1]]
 
+    member_name = g.member_name
+
+    # 2. 按时间正序逐行读取（无缓冲游标），边读边输出
+    # 查询在返回响应之前执行：超时 / 断连等错误仍按 500 返回，生成器中只逐行读取结果
+    stream_cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        stream_cursor.execute(
+            'SELECT id, role, content, create_time FROM ai_chat_message' + where +
+            ' ORDER BY create_time ASC, id ASC',
+            params
+        )
     except Exception as e:
+        stream_cursor.close()
+        conn.close()
         logger.error(f'获取聊天记录失败：{str(e)}')
         return jsonify({'code': 500, 'msg': f'获取聊天记录失败：{str(e)}'}), 500
 
+    # 游标和连接由本接口自行释放（先关游标再归还连接），不交给请求结束时的自动归还
+    detach_db_connection(conn)
+
+    def close_stream():
+        try:
+            stream_cursor.close()
+        except Exception:
+            pass        # 连接已断开时读取剩余结果会失败，连接归还时由连接池处理
+        finally:
+            conn.close()
+
+    def generate():
+        count = 0
+        yield '{"code":200,"data":['
+        try:
+            for row in stream_cursor:
+                row['create_time'] = row['create_time'].strftime('%Y-%m-%d %H:%M:%S')
+                yield (',' if count else '') + json.dumps(row, ensure_ascii=False)
+                count += 1
+        except Exception as e:
+            # 响应头已发出，无法再改为 500：记录后继续抛出，由服务器中断连接，
+            # 客户端收到不完整的分块响应会按网络错误处理，而不是把截断的数据当作完整结果
+            logger.error(f'[{member_name}] 读取聊天记录中断（已输出 {count} 条）：{str(e)}')
+            raise
+        finally:
+            # 读完 / 出错 / 客户端断开（GeneratorExit）时立即释放
+            close_stream()
+        yield '],' + json.dumps({'has_more': has_more, 'next_cursor': next_cursor})[1:]
+        logger.info(f'[{member_name}] 获取聊天记录，共 {count} 条')
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    # 客户端在生成器开始执行前断开时，finally 不会执行，由响应关闭时兜底（close 可重复调用）
+    response.call_on_close(close_stream)
+    return response
+
 
 # ─────────────────────────────────────────────────────────
 # 发送消息（存储用户消息 → 调用 AI → 存储 AI 回复 → 返回）
 # ─────────────────────────────────────────────────────────
-@chat_bp.route('/chat/send', methods=['POST'])
+@chat_bp.route('/chat/send', methods=['POST'], defaults={'conversation_id': DEFAULT_CONVERSATION_ID})
+@chat_bp.route('/chat/conversations/<conversation_id>/send', methods=['POST'])
 @login_required
-def send_chat_message():
+def send_chat_message(conversation_id):
     """
     发送一条用户消息，自动调用 AI 生成回复
-    请求体：{ "content": "用户输入的消息" }
+    请求体：{ "content": "用户输入的消息", "no_cache": false }
+      no_cache  为 true 时不使用回复缓存，强制重新生成
     返回：{ user_message: {...}, ai_message: {...} }
     """
-    data = request.json
-    content = data.get('content', '').strip()
+    content, error = _read_message_content()
+    if error:
+        return error
+    error = _check_conversation(conversation_id)
+    if error:
+        return error
 
-    if not content:
-        return jsonify({'code': 400, 'msg': '消息内容不能为空哦～'}), 400
+    # 会话第一轮命中回复缓存时无需占用 AI 名额
+    use_cache = not _cache_bypassed()
+    cached_reply = _cached_first_turn_reply(content, conversation_id) if use_cache else None
+    if cached_reply is not None:
+        return _send_chat_message(content, conversation_id, cached_reply=cached_reply)
 
-    if len(content) > 2000:
-        return jsonify({'code': 400, 'msg': '消息太长啦，请控制在 2000 字以内～'}), 400
+    # 先占用 AI 名额再保存消息：繁忙时直接返回 429，不留下没有回复的用户消息
+    if not acquire_ai_slot():
+        return _busy_response()
+    try:
+        return _send_chat_message(content, conversation_id, use_cache=use_cache)
+    finally:
+        release_ai_slot()
 
+
+def _send_chat_message(content, conversation_id, cached_reply=None, use_cache=True):
+    """保存用户消息 → 调用 AI（或使用缓存的回复）→ 保存 AI 回复（调用 AI 时调用方已占用 AI 名额）"""
     try:
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        # ── 1. 保存用户消息 ─────────────────────────────────
-        cursor.execute(
-            '''INSERT INTO ai_chat_message (member_id, role, content, create_time)
-               VALUES (%s, %s, %s, %s)''',
-            (g.member_id, 'user', content, now)
-        )
-        user_msg_id = cursor.lastrowid
-
-        # ── 2. 查询最近对话上下文（最多取 10 轮 / 20 条）───
-        cursor.execute(
-            '''SELECT role, content FROM ai_chat_message
-               WHERE member_id = %s
-               ORDER BY create_time DESC
-               LIMIT 20''',
-            (g.member_id,)
-        )
-        history_rows = cursor.fetchall()
-        # 反转为时间正序
-        history_rows.reverse()
-        chat_messages = [{'role': r['role'], 'content': r['content']} for r in history_rows]
+        # ── 1. 保存用户消息 + 2. 查询最近对话上下文 ───────
+        user_msg_id, chat_messages = _save_user_message(cursor, content, now, conversation_id)
 
-        # ── 3. 调用 AI 服务 ──────────────────────────────────
-        ai_reply = get_ai_response(chat_messages, member_name=g.member_name)
+        # ── 3. 调用 AI 服务（先提交用户消息并归还连接，等待 AI 期间不占用数据库连接）──
+        conn.commit()
+        cursor.close()
+        conn.close()
+        if cached_reply is None and use_cache:
+            # 有上下文时按成员 + 实际上下文查询缓存
+            cached_reply = get_cached_ai_response(chat_messages, g.member_id, g.member_name)
+        if cached_reply is not None:
+            ai_reply = cached_reply
+        else:
+            ai_reply = get_ai_response(chat_messages, member_name=g.member_name, cache=use_cache,
+                                       member_id=g.member_id)
 
         # ── 4. 保存 AI 回复 ──────────────────────────────────
         ai_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        cursor.execute(
-            '''INSERT INTO ai_chat_message (member_id, role, content, create_time)
-               VALUES (%s, %s, %s, %s)''',
-            (g.member_id, 'assistant', ai_reply, ai_time)
-        )
-        ai_msg_id = cursor.lastrowid
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        ai_msg_id = _save_ai_message(cursor, ai_reply, ai_time, g.member_id, conversation_id)
         conn.commit()
 
         cursor.close()
         conn.close()
 
-        logger.info(f'[{g.member_name}] 发送消息，AI 回复长度={len(ai_reply)}')
+        logger.info(f'[{g.member_name}] 发送消息，AI 回复长度={len(ai_reply)}'
+                    f'{"（缓存）" if cached_reply is not None else ""}')
 
         return jsonify({
             'code': 200,
             'msg': '发送成功',
             'data': {
+                'conversation_id': conversation_id,
                 'user_message': {
                     'id': user_msg_id,
                     'role': 'user',
@@ -150,6 +320,229 @@ def send_chat_message():
         return jsonify({'code': 500, 'msg': f'发送消息失败：{str(e)}'}), 500
 
 
+# ─────────────────────────────────────────────────────────
+# 发送消息（流式）：AI 回复以 Server-Sent Events 逐段推送
+# ─────────────────────────────────────────────────────────
+@chat_bp.route('/chat/send/stream', methods=['POST'], defaults={'conversation_id': DEFAULT_CONVERSATION_ID})
+@chat_bp.route('/chat/conversations/<conversation_id>/send/stream', methods=['POST'])
+@login_required
+def send_chat_message_stream(conversation_id):
+    """
+    发送一条用户消息，AI 回复以 SSE（text/event-stream）逐段返回
+    请求体：{ "content": "用户输入的消息", "no_cache": false }
+    事件：
+      start  { user_message }          用户消息已保存
+      delta  { content }               回复片段，前端依次拼接
+      done   { ai_message }            回复结束并已保存
+      error  { msg }                   出错（用户消息已保存）
+    数据库连接在开始推送前归还连接池，回复结束后再取连接保存，流式期间不占用连接
+    """
+    content, error = _read_message_content()
+    if error:
+        return error
+    error = _check_conversation(conversation_id)
+    if error:
+        return error
+
+    # 会话第一轮命中回复缓存时无需占用 AI 名额；否则先占用名额再保存消息，繁忙时直接返回 429，不留下没有回复的用户消息
+    use_cache = not _cache_bypassed()
+    cached_reply = _cached_first_turn_reply(content, conversation_id) if use_cache else None
+    holds_slot = cached_reply is None
+    if holds_slot and not acquire_ai_slot():
+        return _busy_response()
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        user_msg_id, chat_messages = _save_user_message(cursor, content, now, conversation_id)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        if cached_reply is None and use_cache:
+            # 有上下文时按成员 + 实际上下文查询缓存，命中则提前归还名额
+            cached_reply = get_cached_ai_response(chat_messages, g.member_id, g.member_name)
+    except Exception as e:
+        if holds_slot:
+            release_ai_slot()
+        logger.error(f'发送消息失败：{str(e)}')
+        return jsonify({'code': 500, 'msg': f'发送消息失败：{str(e)}'}), 500
+    if cached_reply is not None and holds_slot:
+        release_ai_slot()
+        holds_slot = False
+
+    member_id, member_name = g.member_id, g.member_name
+
+    def generate():
+        yield _sse('start', {'conversation_id': conversation_id, 'user_message': {
+            'id': user_msg_id,
+            'role': 'user',
+            'content': content,
+            'create_time': now,
+        }})
+
+        if cached_reply is not None:
+            deltas = stream_text(cached_reply)
+        else:
+            deltas = stream_ai_response(chat_messages, member_name=member_name, cache=use_cache,
+                                        member_id=member_id)
+        parts = []
+        finished = False
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield _sse('delta', {'content': delta})
+            finished = True
+        finally:
+            # 客户端中途断开时也保存已生成的部分，保证历史记录完整
+            ai_reply = ''.join(parts)
+            ai_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            ai_msg_id = None
+            save_error = None
+            if ai_reply:
+                try:
+                    with get_db_connection() as save_conn:
+                        save_cursor = save_conn.cursor()
+                        ai_msg_id = _save_ai_message(save_cursor, ai_reply, ai_time, member_id, conversation_id)
+                        save_conn.commit()
+                        save_cursor.close()
+                except Exception as e:
+                    save_error = str(e)
+                    logger.error(f'保存 AI 回复失败：{save_error}')
+            logger.info(f'[{member_name}] 流式发送消息，AI 回复长度={len(ai_reply)}'
+                        f'{"" if finished else "（客户端已断开）"}')
+
+        if save_error:
+            yield _sse('error', {'msg': f'保存 AI 回复失败：{save_error}'})
+        else:
+            yield _sse('done', {'ai_message': {
+                'id': ai_msg_id,
+                'role': 'assistant',
+                'content': ai_reply,
+                'create_time': ai_time,
+            }})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # 关闭 nginx 代理缓冲，片段到达即转发
+            'X-Accel-Buffering': 'no',
+        },
+    )
+    # 响应结束（含客户端断开、生成器未启动）时归还 AI 名额
+    if holds_slot:
+        response.call_on_close(release_ai_slot)
+    return response
+
+
+def _busy_response():
+    retry_after = max(int(AI_QUEUE_TIMEOUT), 1)
+    response = jsonify({'code': 429, 'msg': 'AI 小助手正忙，请稍后再试～'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
+def _read_message_content():
+    """读取并校验请求体中的消息内容，返回 (content, 错误响应或 None)"""
+    data = request.json
+    content = data.get('content', '').strip()
+
+    if not content:
+        return None, (jsonify({'code': 400, 'msg': '消息内容不能为空哦～'}), 400)
+
+    if len(content) > 2000:
+        return None, (jsonify({'code': 400, 'msg': '消息太长啦，请控制在 2000 字以内～'}), 400)
+    return content, None
+
+
+def _cached_first_turn_reply(content, conversation_id):
+    """
+    会话还没有任何消息和摘要时，本轮上下文只有这一条提问，占用 AI 名额之前即可查询回复缓存
+    （这类缓存不含任何对话内容，可跨成员共用）；已有上下文时返回 None，保存消息后再按上下文查询
+    """
+    if not response_cache_enabled():
+        return None
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            has_context = has_chat_context(cursor, g.member_id, conversation_id)
+            cursor.close()
+    except Exception as e:
+        logger.error(f'查询会话上下文失败：{str(e)}')
+        return None
+    if has_context:
+        return None
+    return get_cached_ai_response([{'role': 'user', 'content': content}], g.member_id, g.member_name)
+
+
+def _cache_bypassed():
+    """请求体 no_cache 为 true 时跳过回复缓存"""
+    return bool((request.get_json(silent=True) or {}).get('no_cache'))
+
+
+def _conversation_exists(cursor, conversation_id):
+    """默认会话始终存在（首次发消息时自动创建记录）"""
+    if conversation_id == DEFAULT_CONVERSATION_ID:
+        return True
+    cursor.execute(
+        'SELECT 1 FROM ai_conversation WHERE member_id = %s AND conversation_id = %s',
+        (g.member_id, conversation_id)
+    )
+    return cursor.fetchone() is not None
+
+
+def _check_conversation(conversation_id):
+    """会话不存在（或不属于当前用户）时返回 404 响应，否则返回 None"""
+    if conversation_id == DEFAULT_CONVERSATION_ID:
+        return None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        exists = _conversation_exists(cursor, conversation_id)
+        cursor.close()
+    if not exists:
+        return jsonify({'code': 404, 'msg': '会话不存在'}), 404
+    return None
+
+
+def _touch_conversation(cursor, member_id, conversation_id, now):
+    """更新会话的最后消息时间（默认会话不存在时自动创建）"""
+    cursor.execute(
+        '''INSERT INTO ai_conversation (member_id, conversation_id, title, create_time, last_message_time)
+           VALUES (%s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE last_message_time = VALUES(last_message_time)''',
+        (member_id, conversation_id, '默认对话', now, now)
+    )
+
+
+def _save_user_message(cursor, content, now, conversation_id):
+    """保存用户消息并构建对话上下文（token 预算内的最近消息 + 早期对话摘要），返回 (消息ID, 上下文)"""
+    cursor.execute(
+        '''INSERT INTO ai_chat_message (member_id, role, content, conversation_id, create_time)
+           VALUES (%s, %s, %s, %s, %s)''',
+        (g.member_id, 'user', content, conversation_id, now)
+    )
+    user_msg_id = cursor.lastrowid
+    _touch_conversation(cursor, g.member_id, conversation_id, now)
+    return user_msg_id, build_chat_context(cursor, g.member_id, conversation_id)
+
+
+def _save_ai_message(cursor, ai_reply, ai_time, member_id, conversation_id):
+    """保存 AI 回复，返回消息ID"""
+    cursor.execute(
+        '''INSERT INTO ai_chat_message (member_id, role, content, conversation_id, create_time)
+           VALUES (%s, %s, %s, %s, %s)''',
+        (member_id, 'assistant', ai_reply, conversation_id, ai_time)
+    )
+    ai_msg_id = cursor.lastrowid
+    _touch_conversation(cursor, member_id, conversation_id, ai_time)
+    return ai_msg_id
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
 # ─────────────────────────────────────────────────────────
 # 查询当前 AI 提供商及可用模型
 # ─────────────────────────────────────────────────────────
@@ -160,9 +553,11 @@ def list_ai_models():
     返回当前 AI 提供商信息及可用模型列表
     - Ollama：返回本地已安装的模型（通过 ollama pull 安装）
     - OpenAI 等：返回当前配置的模型
+    结果有缓存（checked_at 为探测时间），可选参数：
+      refresh  传 1 时忽略缓存，立即重新探测
     """
     try:
-        info = get_ai_provider_info()
+        info = get_ai_provider_info(refresh=request.args.get('refresh') == '1')
         logger.info(f'[{g.member_name}] 查询 AI 模型，provider={info["provider"]}')
         return jsonify({'code': 200, 'data': info})
     except Exception as e:
@@ -176,12 +571,26 @@ def list_ai_models():
 @chat_bp.route('/chat/clear', methods=['POST'])
 @login_required
 def clear_chat_history():
-    """清空当前用户的聊天记录"""
+    """
+    清空当前用户的聊天记录
+    请求体（可选）：{ "conversation_id": "只清空该会话的消息" }，不传则清空全部会话
+    """
+    conversation_id = (request.get_json(silent=True) or {}).get('conversation_id')
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM ai_chat_message WHERE member_id = %s', (g.member_id,))
-        deleted = cursor.rowcount
+        if conversation_id:
+            cursor.execute(
+                'DELETE FROM ai_chat_message WHERE member_id = %s AND conversation_id = %s',
+                (g.member_id, conversation_id)
+            )
+            deleted = cursor.rowcount
+            delete_summaries(cursor, g.member_id, conversation_id)
+        else:
+            cursor.execute('DELETE FROM ai_chat_message WHERE member_id = %s', (g.member_id,))
+            deleted = cursor.rowcount
+            delete_summaries(cursor, g.member_id)
+            cursor.execute('DELETE FROM ai_conversation WHERE member_id = %s', (g.member_id,))
         conn.commit()
         cursor.close()
         conn.close()
@@ -0,0 +1,217 @@
+"""
+AI 对话上下文构建
+──────────
+每轮发送给模型的内容 = 系统提示词（按用户缓存，前缀固定）+ 早期对话摘要 + 预算内的最近对话，
+提示词长度不随对话变长而增长：
+
+  1. 从最新一条往前取消息，估算 token 数累计不超过 AI_CONTEXT_MAX_TOKENS（至少保留当前这条）
+  2. 超出预算、尚未并入摘要的早期消息，由后台线程调用 AI 增量合并进 ai_chat_summary
+     （AI 名额已满或调用失败时本次不合并，下一轮再试；未配置 AI 时退化为截取原文）；本轮直接使用已有摘要，不等待
+  3. 摘要按 (member_id, conversation_id) 保存，并记录已并入的最后一条消息ID，每次只处理新增部分
+
+配置（环境变量）：
+  AI_CONTEXT_MAX_TOKENS     最近对话的 token 预算（默认 1500，含摘要）
+  AI_CONTEXT_MAX_MESSAGES   最近对话最多取多少条（默认 40）
+  AI_SUMMARY_MAX_CHARS      摘要最长字数（默认 500）
+  AI_SUMMARY_BATCH          每次合并进摘要的消息条数（默认 40）
+"""
+
+import os
+import logging
+import threading
+
+import pymysql
+
+from .utils import get_db_connection
+from .ai_service import summarize_chat, summary_available, acquire_ai_slot, release_ai_slot
+
+logger = logging.getLogger('photo_manager')
+
+AI_CONTEXT_MAX_TOKENS = int(os.environ.get('AI_CONTEXT_MAX_TOKENS', '1500'))
+AI_CONTEXT_MAX_MESSAGES = int(os.environ.get('AI_CONTEXT_MAX_MESSAGES', '40'))
+AI_SUMMARY_MAX_CHARS = int(os.environ.get('AI_SUMMARY_MAX_CHARS', '500'))
+AI_SUMMARY_BATCH = int(os.environ.get('AI_SUMMARY_BATCH', '40'))
+
+DEFAULT_CONVERSATION_ID = 'default'
+
+# 每条消息除正文外的固定开销（角色、分隔符等）
+_MESSAGE_OVERHEAD = 4
+
+_summarizing = set()
+_summarizing_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数（不依赖具体模型的分词器）：
+    中日韩文字约 1 字 1 token，其余字符约 4 个 1 token
+    """
+    cjk = sum(1 for c in text if '\u4e00' <= c <= '\u9fff' or '\u3040' <= c <= '\u30ff' or '\uac00' <= c <= '\ud7af')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def build_chat_context(cursor, member_id, conversation_id=DEFAULT_CONVERSATION_ID) -> list:
+    """
+    构建本轮对话上下文（不含系统提示词，由 ai_service 统一添加）
+    :param cursor: DictCursor，当前用户消息需已写入（同一事务内可见即可）
+    :return:       [{'role': ..., 'content': ...}]，时间正序
+    """
+    cursor.execute(
+        '''SELECT summary, last_message_id FROM ai_chat_summary
+           WHERE member_id = %s AND conversation_id = %s''',
+        (member_id, conversation_id)
+    )
+    row = cursor.fetchone()
+    summary = row['summary'] if row else ''
+    summarized_id = row['last_message_id'] if row else 0
+
+    # 走 idx_conversation (member_id, conversation_id, create_time)，只取尚未并入摘要的最近消息
+    cursor.execute(
+        '''SELECT id, role, content FROM ai_chat_message
+           WHERE member_id = %s AND conversation_id = %s AND id > %s
+           ORDER BY create_time DESC, id DESC
+           LIMIT %s''',
+        (member_id, conversation_id, summarized_id, AI_CONTEXT_MAX_MESSAGES)
+    )
+    rows = cursor.fetchall()
+
+    budget = AI_CONTEXT_MAX_TOKENS - (estimate_tokens(summary) + _MESSAGE_OVERHEAD if summary else 0)
+    recent = []
+    used = 0
+    for r in rows:
+        cost = estimate_tokens(r['content']) + _MESSAGE_OVERHEAD
+        if recent and used + cost > budget:
+            break
+        recent.append(r)
+        used += cost
+
+    # 有消息没放进上下文（超出预算，或超过条数上限后还有更早的）→ 后台合并进摘要
+    if recent and (len(recent) < len(rows) or len(rows) == AI_CONTEXT_MAX_MESSAGES):
+        schedule_summary(member_id, conversation_id, before_id=recent[-1]['id'])
+
+    recent.reverse()
+    messages = [{'role': r['role'], 'content': r['content']} for r in recent]
+    if summary:
+        messages.insert(0, {'role': 'system', 'content': f'以下是与该用户更早对话的摘要，供参考：\n{summary}'})
+    return messages
+
+
+def has_chat_context(cursor, member_id, conversation_id=DEFAULT_CONVERSATION_ID) -> bool:
+    """会话是否已有消息或摘要（没有时本轮上下文只有当前这条提问）"""
+    cursor.execute(
+        'SELECT 1 FROM ai_chat_message WHERE member_id = %s AND conversation_id = %s LIMIT 1',
+        (member_id, conversation_id)
+    )
+    if cursor.fetchone():
+        return True
+    cursor.execute(
+        'SELECT 1 FROM ai_chat_summary WHERE member_id = %s AND conversation_id = %s',
+        (member_id, conversation_id)
+    )
+    return cursor.fetchone() is not None
+
+
+def schedule_summary(member_id, conversation_id, before_id):
+    """在后台把 id < before_id 且未并入摘要的消息合并进摘要（同一会话同时只运行一个）"""
+    key = (member_id, conversation_id)
+    with _summarizing_lock:
+        if key in _summarizing:
+            return
+        _summarizing.add(key)
+    threading.Thread(
+        target=_summarize_worker, args=(member_id, conversation_id, before_id),
+        name='chat-summary', daemon=True
+    ).start()
+
+
+def delete_summaries(cursor, member_id, conversation_id=None):
+    """清空聊天记录时一并删除摘要（不传 conversation_id 则删除该用户全部会话的摘要）"""
+    if conversation_id:
+        cursor.execute(
+            'DELETE FROM ai_chat_summary WHERE member_id = %s AND conversation_id = %s',
+            (member_id, conversation_id)
+        )
+    else:
+        cursor.execute('DELETE FROM ai_chat_summary WHERE member_id = %s', (member_id,))
+
+
+def _summarize_worker(member_id, conversation_id, before_id):
+    try:
+        while _summarize_batch(member_id, conversation_id, before_id):
+            pass
+    except Exception as e:
+        logger.error(f'[对话摘要] member_id={member_id} conversation={conversation_id} 更新失败：{str(e)}')
+    finally:
+        with _summarizing_lock:
+            _summarizing.discard((member_id, conversation_id))
+
+
+def _summarize_batch(member_id, conversation_id, before_id) -> bool:
+    """合并一批消息，返回是否可能还有剩余"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        cursor.execute(
+            '''SELECT summary, last_message_id FROM ai_chat_summary
+               WHERE member_id = %s AND conversation_id = %s''',
+            (member_id, conversation_id)
+        )
+        row = cursor.fetchone()
+        summary = row['summary'] if row else ''
+        summarized_id = row['last_message_id'] if row else 0
+        cursor.execute(
+            '''SELECT id, role, content FROM ai_chat_message
+               WHERE member_id = %s AND conversation_id = %s AND id > %s AND id < %s
+               ORDER BY create_time, id
+               LIMIT %s''',
+            (member_id, conversation_id, summarized_id, before_id, AI_SUMMARY_BATCH)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+    if not rows:
+        return False
+
+    if summary_available():
+        # 与对话共用 AI 并发名额，不与用户请求争抢；名额已满或调用失败时不推进 last_message_id，
+        # 这批消息留到下一次 schedule_summary 再合并（截取原文会永久丢掉消息后半部分）
+        if not acquire_ai_slot(timeout=0):
+            return False
+        try:
+            new_summary = summarize_chat(summary, rows, AI_SUMMARY_MAX_CHARS)
+        finally:
+            release_ai_slot()
+        if not new_summary:
+            return False
+    else:
+        # 未配置 AI（模拟回复）：只能截取原文
+        new_summary = _fallback_summary(summary, rows)
+
+    last_id = max(r['id'] for r in rows)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # 乐观并发：只在摘要未被其他进程更新 / 未被清空时写入
+        if row:
+            cursor.execute(
+                '''UPDATE ai_chat_summary SET summary = %s, last_message_id = %s
+                   WHERE member_id = %s AND conversation_id = %s AND last_message_id = %s''',
+                (new_summary, last_id, member_id, conversation_id, summarized_id)
+            )
+        else:
+            cursor.execute(
+                '''INSERT IGNORE INTO ai_chat_summary (member_id, conversation_id, summary, last_message_id)
+                   VALUES (%s, %s, %s, %s)''',
+                (member_id, conversation_id, new_summary, last_id)
+            )
+        updated = cursor.rowcount
+        conn.commit()
+        cursor.close()
+
+    logger.info(f'[对话摘要] member_id={member_id} conversation={conversation_id} 合并 {len(rows)} 条，'
+                f'摘要长度={len(new_summary)}')
+    return bool(updated) and len(rows) == AI_SUMMARY_BATCH
+
+
+def _fallback_summary(summary, rows) -> str:
+    """未配置 AI 时的摘要：保留每条消息开头，超出长度时丢弃最早的部分"""
+    lines = [summary] if summary else []
+    lines += [f'{"用户" if r["role"] == "user" else "助手"}：{r["content"][:60]}' for r in rows]
+    return '\n'.join(lines)[-AI_SUMMARY_MAX_CHARS:]
@@ -0,0 +1,256 @@
+"""
+MySQL 连接池
+──────────
+每个进程维护一个连接池（gunicorn fork 出的 worker 各自独立），避免每次请求都重新
+TCP 握手 + MySQL 认证。
+
+  - min_size / max_size   池中保持的最少连接数 / 允许同时存在的最大连接数
+  - max_age               连接最长存活秒数，超过后归还时直接丢弃（重建）
+  - ping_interval         空闲超过该秒数的连接，借出前先 ping 一次做健康检查
+  - timeout               池满时等待空闲连接的最长秒数，超时抛 PoolTimeoutError
+
+借出的连接是 PooledConnection：用法与 pymysql 连接一致，`close()` 不会真正断开，
+而是回滚未提交事务后归还到池中；也支持 `with pool.connection() as conn:` 写法。
+"""
+
+import os
+import time
+import logging
+import threading
+
+import pymysql
+
+logger = logging.getLogger('photo_manager')
+
+
+class PoolTimeoutError(pymysql.err.OperationalError):
+    """连接池已满且等待超时"""
+
+
+class PooledConnection:
+    """
+    包装 pymysql 连接：除 close() 外的属性/方法全部透传给原始连接。
+    close() 可重复调用，只会归还一次。
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def released(self):
+        return self._released
+
+    def close(self):
+        """归还连接到池中（不会真正断开）"""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    def __init__(self, db_config, min_size=1, max_size=10, max_age=3600,
+                 ping_interval=30, timeout=10):
+        self._db_config = db_config
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(raw_conn, created_at, last_used_at)]，栈结构：后进先出，热连接优先
+        self._in_use = 0
+        self._pid = os.getpid()
+
+        # ── 统计信息 ──
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    # ─────────────────────────────────────
+    # 借出 / 归还
+    # ─────────────────────────────────────
+    def connection(self):
+        """借出一个连接（PooledConnection），池满时最多等待 timeout 秒"""
+        self._check_fork()
+        start = time.monotonic()
+        waited = False
+
+        with self._cond:
+            self._stats['checkouts'] += 1
+            while True:
+                if self._idle:
+                    raw, created_at, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    # 预留名额，在锁外建立连接
+                    self._in_use += 1
+                    raw = None
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'数据库连接池已满（max_size={self.max_size}），等待 {self.timeout} 秒超时'
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            if waited:
+                wait_time = time.monotonic() - start
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+        try:
+            if raw is None:
+                raw, created_at = self._connect()
+            else:
+                raw, created_at = self._checkout_health(raw, created_at, last_used)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, raw, created_at)
+
+    def _checkout_health(self, raw, created_at, last_used):
+        """借出前检查：超龄则重建，空闲过久则 ping 一次"""
+        now = time.monotonic()
+        if self.max_age and now - created_at > self.max_age:
+            self._close_raw(raw)
+            with self._cond:
+                self._stats['recycled'] += 1
+            return self._connect()
+        if now - last_used > self.ping_interval:
+            try:
+                raw.ping(reconnect=False)
+            except Exception as e:
+                logger.warning(f'[连接池] 连接健康检查失败，重新建立连接：{str(e)}')
+                self._close_raw(raw)
+                with self._cond:
+                    self._stats['discarded'] += 1
+                return self._connect()
+        return raw, created_at
+
+    def _release(self, raw, created_at):
+        """归还连接：回滚未提交事务，超龄或异常的连接直接丢弃"""
+        if os.getpid() != self._pid:
+            # fork 前借出的连接，不能在子进程中复用
+            return
+
+        reusable = True
+        if self.max_age and time.monotonic() - created_at > self.max_age:
+            reusable = False
+            recycled = True
+        else:
+            recycled = False
+            try:
+                # 结束只读事务的快照 / 丢弃未提交的写入，避免污染下一个使用者
+                raw.rollback()
+            except Exception:
+                reusable = False
+
+        if not reusable:
+            self._close_raw(raw)
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((raw, created_at, time.monotonic()))
+            elif recycled:
+                self._stats['recycled'] += 1
+            else:
+                self._stats['discarded'] += 1
+            self._cond.notify()
+
+    # ─────────────────────────────────────
+    # 工具方法
+    # ─────────────────────────────────────
+    def _connect(self):
+        raw = pymysql.connect(**self._db_config)
+        with self._cond:
+            self._stats['created'] += 1
+        return raw, time.monotonic()
+
+    @staticmethod
+    def _close_raw(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _check_fork(self):
+        """gunicorn fork 后子进程不能复用父进程的 socket，丢弃后重新建池"""
+        if os.getpid() == self._pid:
+            return
+        with self._cond:
+            if os.getpid() != self._pid:
+                self._idle = []
+                self._in_use = 0
+                self._pid = os.getpid()
+
+    def prefill(self):
+        """预先建立 min_size 个连接"""
+        self._check_fork()
+        while True:
+            with self._cond:
+                if len(self._idle) + self._in_use >= self.min_size:
+                    return
+                self._in_use += 1
+            try:
+                raw, created_at = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._in_use -= 1
+                logger.warning(f'[连接池] 预建连接失败：{str(e)}')
+                return
+            with self._cond:
+                self._in_use -= 1
+                self._idle.append((raw, created_at, time.monotonic()))
+                self._cond.notify()
+
+    def close_all(self):
+        """关闭所有空闲连接（进程退出时调用）"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw, _, _ in idle:
+            self._close_raw(raw)
+
+    def stats(self):
+        """连接池状态，用于评估 min_size / max_size 是否合理"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'pid': self._pid,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            })
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        for key in ('wait_time_total', 'wait_time_max', 'wait_time_avg'):
+            stats[key] = round(stats[key], 4)
+        return stats
@@ -1,6 +1,6 @@
 import pymysql
 from flask import Blueprint, request, jsonify, g
-from .utils import get_db_connection
+from .utils import get_db_connection, keyset_condition, encode_cursor
 from .auth import login_required
 
 favorite_bp = Blueprint('favorite', __name__)
@@ -13,7 +13,7 @@ def get_favorite_folders():
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         # 查询当前用户的所有收藏夹，优先显示默认收藏夹
         cursor.execute(
-            '''SELECT id, folder_name, is_default, create_time 
+            '''SELECT id, folder_name, is_default, photo_count, create_time 
                FROM favorite_folder 
                WHERE member_id = %s 
                ORDER BY is_default DESC, create_time DESC''',
@@ -208,12 +208,16 @@ def add_photo_to_favorite():
             conn.close()
             return jsonify({'code': 400, 'msg': '该照片已在收藏夹中'}), 400
 
-        # 新增收藏记录
+        # 新增收藏记录，同时维护收藏夹照片数量
         cursor.execute(
             '''INSERT INTO favorite_photo (folder_id, photo_id, member_id) 
                VALUES (%s, %s, %s)''',
             (folder_id, photo_id, g.member_id)
         )
+        cursor.execute(
+            'UPDATE favorite_folder SET photo_count = photo_count + 1 WHERE id = %s',
+            (folder_id,)
+        )
         conn.commit()
 
         cursor.close()
@@ -251,12 +255,17 @@ def remove_photo_from_favorite():
             conn.close()
             return jsonify({'code': 403, 'msg': '无权限操作该收藏夹'}), 403
 
-        # 删除收藏记录
+        # 删除收藏记录，同时维护收藏夹照片数量
         cursor.execute(
             '''DELETE FROM favorite_photo 
                WHERE folder_id = %s AND photo_id = %s AND member_id = %s''',
             (folder_id, photo_id, g.member_id)
         )
+        if cursor.rowcount:
+            cursor.execute(
+                'UPDATE favorite_folder SET photo_count = GREATEST(photo_count - %s, 0) WHERE id = %s',
+                (cursor.rowcount, folder_id)
+            )
         conn.commit()
 
         cursor.close()
@@ -274,52 +283,57 @@ def get_favorite_photos(folder_id):
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 12))
     offset = (page - 1) * page_size
+    # 游标分页（可选）：传 cursor 参数时按收藏时间 (fp.create_time, fp.id) 定位，忽略 page
+    cursor_mode = 'cursor' in request.args
+    try:
+        keyset_sql, keyset_params = keyset_condition('fp.create_time', 'fp.id', request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
 
     try:
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
-        # 检查收藏夹是否属于当前用户
+        # 检查收藏夹是否属于当前用户，同时取出收藏数量作为总条数（无需 COUNT(*)）
         cursor.execute(
-            '''SELECT id FROM favorite_folder 
+            '''SELECT id, photo_count FROM favorite_folder 
                WHERE id = %s AND member_id = %s''',
             (folder_id, g.member_id)
         )
-        if not cursor.fetchone():
+        folder = cursor.fetchone()
+        if not folder:
             cursor.close()
             conn.close()
             return jsonify({'code': 403, 'msg': '无权限访问该收藏夹'}), 403
+        total = folder['photo_count']
 
-        # 1. 查询总条数
-        cursor.execute(
-            '''SELECT COUNT(*) as total 
-               FROM favorite_photo fp 
-               JOIN photo p ON fp.photo_id = p.id 
-               WHERE fp.folder_id = %s AND fp.member_id = %s''',
-            (folder_id, g.member_id)
-        )
-        total = cursor.fetchone()['total']
-
-        # 2. 查询当前页照片数据（关联用户信息）
-        cursor.execute(
-            '''SELECT p.*, m.name as member_name, o.name as operator_name, a.album_name
+        # 查询当前页照片数据（关联用户信息，多取 1 条用于判断是否还有下一页）
+        sql = f'''SELECT p.*, m.name as member_name, o.name as operator_name, a.album_name,
+                      fp.id as favorite_id, fp.create_time as favorite_time
                FROM favorite_photo fp 
                JOIN photo p ON fp.photo_id = p.id 
                LEFT JOIN family_member m ON p.member_id = m.id 
                LEFT JOIN family_member o ON p.operator_id = o.id 
                LEFT JOIN album a ON p.album_id = a.id
-               WHERE fp.folder_id = %s AND fp.member_id = %s 
-               ORDER BY fp.create_time DESC 
-               LIMIT %s OFFSET %s''',
-            (folder_id, g.member_id, page_size, offset)
-        )
+               WHERE fp.folder_id = %s AND fp.member_id = %s{keyset_sql} 
+               ORDER BY fp.create_time DESC, fp.id DESC 
+               LIMIT %s OFFSET %s'''
+        if cursor_mode:
+            cursor.execute(sql, [folder_id, g.member_id, *keyset_params, page_size + 1, 0])
+        else:
+            cursor.execute(sql, (folder_id, g.member_id, page_size + 1, offset))
         photos = cursor.fetchall()
 
+        has_more = len(photos) > page_size
+        photos = photos[:page_size]
         # 格式化时间
         for photo in photos:
             if photo.get('shoot_time'):
                 photo['shoot_time'] = photo['shoot_time'].strftime('%Y-%m-%d %H:%M:%S')
             if photo.get('upload_time'):
                 photo['upload_time'] = photo['upload_time'].strftime('%Y-%m-%d %H:%M:%S')
+            if photo.get('favorite_time'):
+                photo['favorite_time'] = photo['favorite_time'].strftime('%Y-%m-%d %H:%M:%S')
+        next_cursor = encode_cursor(photos[-1]['favorite_time'], photos[-1]['favorite_id']) if photos else None
 
         cursor.close()
         conn.close()
@@ -328,7 +342,8 @@ def get_favorite_photos(folder_id):
             'msg': '查询成功',
             'data': photos,
             'total': total,
-            'has_more': page * page_size < total
+            'has_more': has_more,
+            'next_cursor': next_cursor,
         })
     except Exception as e:
         print(f"获取收藏照片异常：{str(e)}")
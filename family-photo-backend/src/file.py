@@ -1,12 +1,17 @@
 import os
-from flask import Blueprint, request, jsonify, send_from_directory, g, abort
+import mimetypes
+from urllib.parse import quote
+from flask import Blueprint, request, jsonify, send_from_directory, g, abort, make_response
+from werkzeug.http import http_date
 
 file_bp = Blueprint('file', __name__)
 
 from config.config import (
-    UPLOAD_PHOTO_FOLDER, UPLOAD_COVER_FOLDER
+    UPLOAD_PHOTO_FOLDER, UPLOAD_COVER_FOLDER, UPLOAD_RENDITION_FOLDER, RENDITION_SIZES,
+    UPLOAD_CACHE_MAX_AGE, UPLOAD_ROOT_FOLDER, FILE_SERVE_MODE, X_ACCEL_PREFIX
 )
 from .auth import login_required
+from .rendition import ORIGINAL, rendition_path, ensure_rendition
 
 
 def _safe_path(folder, filename):
@@ -21,12 +26,87 @@ def _safe_path(folder, filename):
     return target_path.startswith(base_dir + os.sep) or target_path == base_dir
 
 
+def _send_cached(folder, filename, immutable=True):
+    """
+    发送上传文件并允许浏览器长期缓存
+    上传文件名带时间戳 + 随机串，同一路径的内容不会变化，因此：
+      - ETag 由修改时间 + 文件大小生成（与 nginx 静态文件的 ETag 格式一致），同时返回 Last-Modified
+      - Cache-Control: private（需要登录，不允许共享缓存）+ immutable
+      - 条件请求（If-None-Match / If-Modified-Since）命中时直接返回 304，不打开文件
+    immutable=False 用于临时内容（如缩略图生成失败时回退的原图），只允许缓存后重新校验
+    """
+    try:
+        st = os.stat(os.path.join(folder, filename))
+    except OSError:
+        abort(404)
+    etag = f'{int(st.st_mtime):x}-{st.st_size:x}'
+    last_modified = int(st.st_mtime)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        # 仅在没有 If-None-Match 时才看 If-Modified-Since（RFC 9110）
+        since = request.if_modified_since
+        not_modified = since is not None and int(since.timestamp()) >= last_modified
+
+    if not_modified:
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Last-Modified'] = http_date(last_modified)
+    elif FILE_SERVE_MODE == 'direct':
+        response = send_from_directory(folder, filename, etag=etag, last_modified=last_modified,
+                                       conditional=False)
+    else:
+        response = _offload_response(os.path.join(folder, filename))
+        response.set_etag(etag)
+        response.headers['Last-Modified'] = http_date(last_modified)
+    if immutable:
+        response.headers['Cache-Control'] = f'private, max-age={UPLOAD_CACHE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    # 同一路径按 ?size 返回不同内容，缓存键包含查询串即可，无需 Vary
+    return response
+
+
+def _offload_response(path):
+    """
+    由前置代理发送文件内容（权限和路径校验已在 Flask 中完成），worker 不再逐字节读写文件：
+      x-accel     nginx：X-Accel-Redirect 指向 internal location（X_ACCEL_PREFIX + 相对 uploads 的路径）
+      x-sendfile  Apache mod_xsendfile / lighttpd：X-Sendfile 为文件绝对路径
+    """
+    response = make_response('', 200)
+    response.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if FILE_SERVE_MODE == 'x-accel':
+        relative = os.path.relpath(path, UPLOAD_ROOT_FOLDER).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = f'{X_ACCEL_PREFIX.rstrip("/")}/{quote(relative)}'
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    return response
+
+
 @file_bp.route('/photos/<path:filename>')
 @login_required
 def serve_photo(filename):
+    """
+    可选参数：
+      size  thumb（网格缩略图）| preview（大图预览）| original（原图，默认）
+    对应规格不存在时按需生成，生成失败则回退到原图
+    """
     if not _safe_path(UPLOAD_PHOTO_FOLDER, filename):
         abort(403, '禁止访问：路径不合法')
-    return send_from_directory(UPLOAD_PHOTO_FOLDER, filename)
+    # 隐藏目录（如分片上传的临时文件 .partial）不对外提供
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+
+    size = request.args.get('size', ORIGINAL)
+    if size != ORIGINAL:
+        if size not in RENDITION_SIZES:
+            abort(400, '不支持的图片规格')
+        if os.path.isfile(rendition_path(filename, ORIGINAL)) and ensure_rendition(filename, size):
+            return _send_cached(os.path.join(UPLOAD_RENDITION_FOLDER, size), filename)
+        # 规格生成失败回退原图：不能按该规格的 URL 长期缓存，否则之后生成成功也不会再请求
+        return _send_cached(UPLOAD_PHOTO_FOLDER, filename, immutable=False)
+    return _send_cached(UPLOAD_PHOTO_FOLDER, filename)
 
 
 @file_bp.route('/covers/<path:filename>')
@@ -34,4 +114,4 @@ def serve_photo(filename):
 def serve_cover(filename):
     if not _safe_path(UPLOAD_COVER_FOLDER, filename):
         abort(403, '禁止访问：路径不合法')
-    return send_from_directory(UPLOAD_COVER_FOLDER, filename)
\ No newline at end of file
+    return _send_cached(UPLOAD_COVER_FOLDER, filename)
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+上传文件直接落盘
+──────────
+Werkzeug 默认把 multipart 中的文件先写入临时文件（SpooledTemporaryFile），`file.save()` 再整份复制到目标路径，
+每次上传写两遍磁盘，且不计算哈希。标记了 @stream_uploads 的接口改为：
+
+  1. 解析请求体时，文件内容直接写入 UPLOAD_INCOMING_FOLDER 下的临时文件，边写边计算 SHA-256
+  2. 接口调用 save_upload(file, file_path) 时重命名到目标路径（同一文件系统，不复制），返回内容哈希
+  3. 请求结束时删除未被使用的临时文件（格式不支持、保存失败等）
+
+未标记的接口、格式不支持的文件仍使用 Werkzeug 默认的临时文件，save_upload 会在复制时顺带计算哈希。
+进程异常退出留下的临时文件由 upload.purge_expired_uploads 按修改时间清理。
+"""
+
+import os
+import secrets
+import hashlib
+
+from flask import Request, g, current_app
+
+from config.config import UPLOAD_INCOMING_FOLDER
+from .utils import allowed_file
+
+# 复制回退路径每次读取的字节数
+_COPY_BLOCK = 1024 * 1024
+
+
+def stream_uploads(f):
+    """接口装饰器（放在 route 与 login_required 之间）：该接口上传的照片文件直接写入最终目录所在的文件系统"""
+    f.stream_uploads = True
+    return f
+
+
+class IncomingFile:
+    """边写入边计算 SHA-256 的临时文件，其余方法（read / seek / tell ...）透传给底层文件"""
+
+    def __init__(self, folder):
+        self.path = os.path.join(folder, f'{secrets.token_hex(16)}.incoming')
+        self._file = open(self.path, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self.committed = False
+
+    def write(self, data):
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    @property
+    def content_hash(self):
+        return self._sha256.hexdigest()
+
+    def commit(self, target):
+        """关闭并重命名到目标路径，返回内容哈希"""
+        self._file.close()
+        os.replace(self.path, target)
+        self.committed = True
+        return self.content_hash
+
+    def discard(self):
+        self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadRequest(Request):
+    """标记了 @stream_uploads 的接口，照片文件直接写入 IncomingFile"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        view = current_app.view_functions.get(self.endpoint) if self.url_rule else None
+        if not getattr(view, 'stream_uploads', False) or not filename or not allowed_file(filename):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        incoming = IncomingFile(UPLOAD_INCOMING_FOLDER)
+        g.setdefault('incoming_files', []).append(incoming)
+        return incoming
+
+
+def save_upload(file, file_path) -> str:
+    """
+    保存上传文件并返回内容 SHA-256
+    直接落盘的文件只做一次重命名；其他情况从 Werkzeug 临时文件复制，复制时计算哈希（不再额外读一遍）
+    """
+    if isinstance(file.stream, IncomingFile):
+        return file.stream.commit(file_path)
+    sha256 = hashlib.sha256()
+    file.stream.seek(0)
+    with open(file_path, 'wb') as dst:
+        for block in iter(lambda: file.stream.read(_COPY_BLOCK), b''):
+            sha256.update(block)
+            dst.write(block)
+    return sha256.hexdigest()
+
+
+def discard_incoming_files(exc=None):
+    """请求结束时删除未被 save_upload 使用的临时文件（注册为 teardown_request）"""
+    for incoming in g.pop('incoming_files', []):
+        try:
+            incoming.discard()
+        except OSError:
+            pass
@@ -0,0 +1,270 @@
+"""
+照片后台处理队列
+──────────
+上传接口只负责落盘 + 写 photo 记录，耗时的后续处理写入 photo_job 表，由后台线程异步执行：
+
+  rendition   生成缩略图/预览图
+  exif        从 EXIF 读取拍摄时间（上传时未填写 shoot_time 才回填）
+  hash        计算文件 SHA-256，写入 photo.content_hash（普通 / 批量上传已在落盘时计算，不再入队）
+
+任务存放在数据库中，服务重启后未完成的任务会继续执行；领取任务使用
+`UPDATE ... WHERE status='pending' ORDER BY id LIMIT 1` 抢占（兼容 MySQL 5.7，无需 SKIP LOCKED），
+多个 gunicorn worker 同时运行也不会重复处理。
+
+配置（环境变量）：
+  JOB_WORKERS         每个进程的后台线程数（默认 2，设为 0 则不在 Web 进程中处理）
+  JOB_POLL_INTERVAL   队列为空时的轮询间隔秒数（默认 2）
+  JOB_MAX_ATTEMPTS    单个任务最多尝试次数（默认 3）
+  JOB_STALE_SECONDS   running 状态超过该秒数视为 worker 已退出，重新入队（默认 300）
+
+也可以单独启动处理进程：python -m src.jobs
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+
+import pymysql
+
+from config.config import (
+    UPLOAD_PHOTO_FOLDER, JOB_WORKERS, JOB_POLL_INTERVAL, JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS
+)
+from .utils import get_db_connection
+from .rendition import generate_renditions
+
+logger = logging.getLogger('photo_manager')
+
+# 任务类型（按执行顺序）：缩略图最影响浏览体验，优先处理
+JOB_TYPES = ('rendition', 'exif', 'hash')
+
+_wakeup = threading.Event()
+_threads = []
+_threads_lock = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────
+# 入队 / 查询
+# ─────────────────────────────────────────────────────────
+def enqueue_photo_jobs(cursor, photo_id, job_types=JOB_TYPES):
+    """
+    在调用方的事务中为照片创建后台任务（随 photo 记录一起提交）
+    提交后调用 notify_job_workers() 可让本进程的 worker 立即开始处理
+    """
+    cursor.executemany(
+        'INSERT INTO photo_job (photo_id, job_type) VALUES (%s, %s)',
+        [(photo_id, job_type) for job_type in job_types]
+    )
+
+
+def enqueue_batch_jobs(cursor, photo_ids, job_types=JOB_TYPES):
+    """
+    批量上传：所有照片的缩略图 / EXIF / 哈希任务一次写入
+    """
+    rows = [(photo_id, job_type) for photo_id in photo_ids for job_type in job_types]
+    cursor.executemany('INSERT INTO photo_job (photo_id, job_type) VALUES (%s, %s)', rows)
+
+
+def notify_job_workers():
+    _wakeup.set()
+
+
+def summarize_job_status(jobs):
+    """多个任务的整体状态：有失败 → failed；全部完成 → done；有执行中 → running；否则 pending"""
+    statuses = {job['status'] for job in jobs}
+    if not statuses or statuses == {'done'}:
+        return 'done'
+    if 'failed' in statuses:
+        return 'failed'
+    if 'running' in statuses:
+        return 'running'
+    return 'pending'
+
+
+# ─────────────────────────────────────────────────────────
+# 任务处理函数：(cursor, photo) → None，抛异常表示失败
+# ─────────────────────────────────────────────────────────
+def _job_rendition(cursor, photo):
+    # 生成失败抛出异常，按 JOB_MAX_ATTEMPTS 重试，最终标记为 failed（未安装 Pillow 时不生成，视为完成）
+    generate_renditions(photo['file_path'], raise_errors=True)
+
+
+def _job_exif(cursor, photo):
+    if photo['shoot_time']:
+        return
+    shoot_time = _read_exif_shoot_time(os.path.join(UPLOAD_PHOTO_FOLDER, photo['file_path']))
+    if shoot_time:
+        cursor.execute(
+            'UPDATE photo SET shoot_time = %s WHERE id = %s AND shoot_time IS NULL',
+            (shoot_time, photo['id'])
+        )
+
+
+def _job_hash(cursor, photo):
+    if photo.get('content_hash'):
+        return
+    sha256 = hashlib.sha256()
+    with open(os.path.join(UPLOAD_PHOTO_FOLDER, photo['file_path']), 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    cursor.execute(
+        'UPDATE photo SET content_hash = %s WHERE id = %s',
+        (sha256.hexdigest(), photo['id'])
+    )
+
+
+_HANDLERS = {
+    'rendition': _job_rendition,
+    'exif': _job_exif,
+    'hash': _job_hash,
+}
+
+
+def _read_exif_shoot_time(file_path):
+    """读取 EXIF 拍摄时间（DateTimeOriginal，缺失时取 DateTime），返回 'YYYY-MM-DD HH:MM:SS' 或 None"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(file_path) as img:
+            exif = img.getexif()
+            # 0x8769 = Exif IFD，36867 = DateTimeOriginal；306 = DateTime
+            value = exif.get_ifd(0x8769).get(36867) or exif.get(306)
+    except Exception:
+        return None
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        date_part, time_part = value.strip().split(' ', 1)
+        return f'{date_part.replace(":", "-")} {time_part}'[:19]
+    except ValueError:
+        return None
+
+
+# ─────────────────────────────────────────────────────────
+# Worker
+# ─────────────────────────────────────────────────────────
+def _claim_job():
+    """抢占一个待处理任务，返回任务字典或 None"""
+    token = uuid.uuid4().hex
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        claimed = cursor.execute(
+            '''UPDATE photo_job SET status = 'running', worker = %s, attempts = attempts + 1
+               WHERE status = 'pending'
+               ORDER BY id
+               LIMIT 1''',
+            (token,)
+        )
+        conn.commit()
+        cursor.close()
+        if not claimed:
+            return None
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        cursor.execute(
+            '''SELECT j.id, j.job_type, j.attempts, p.id AS photo_id, p.file_path, p.album_id,
+                      p.shoot_time, p.content_hash
+               FROM photo_job j
+               LEFT JOIN photo p ON j.photo_id = p.id
+               WHERE j.worker = %s AND j.status = 'running' ''',
+            (token,)
+        )
+        job = cursor.fetchone()
+        cursor.close()
+        return job
+
+
+def _run_job(job):
+    handler = _HANDLERS.get(job['job_type'])
+    error = None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if handler is None:
+                raise ValueError(f'未知任务类型：{job["job_type"]}')
+            # 照片已被删除（任务会随 photo 级联删除，这里只是兜底）
+            if job['photo_id'] is not None:
+                handler(cursor, {
+                    'id': job['photo_id'],
+                    'file_path': job['file_path'],
+                    'album_id': job['album_id'],
+                    'shoot_time': job['shoot_time'],
+                    'content_hash': job['content_hash'],
+                })
+            cursor.execute(
+                "UPDATE photo_job SET status = 'done', last_error = NULL WHERE id = %s",
+                (job['id'],)
+            )
+        except Exception as e:
+            conn.rollback()
+            error = str(e)
+            # 未达到最大次数则重新入队
+            next_status = 'pending' if job['attempts'] < JOB_MAX_ATTEMPTS else 'failed'
+            cursor.execute(
+                'UPDATE photo_job SET status = %s, last_error = %s, worker = NULL WHERE id = %s',
+                (next_status, error[:500], job['id'])
+            )
+        conn.commit()
+        cursor.close()
+
+    if error:
+        logger.error(f'[后台任务] {job["job_type"]} 失败（photo_id={job["photo_id"]}，第 {job["attempts"]} 次）：{error}')
+
+
+def requeue_stale_jobs():
+    """worker 进程退出（重启/崩溃）后遗留的 running 任务重新入队"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            '''UPDATE photo_job
+               SET status = IF(attempts < %s, 'pending', 'failed'), worker = NULL
+               WHERE status = 'running' AND update_time < NOW() - INTERVAL %s SECOND''',
+            (JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS)
+        )
+        requeued = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    if requeued:
+        logger.warning(f'[后台任务] {requeued} 个超时任务已重新入队')
+
+
+def _worker_loop():
+    last_stale_check = 0.0
+    while True:
+        try:
+            if time.monotonic() - last_stale_check > JOB_STALE_SECONDS / 2:
+                last_stale_check = time.monotonic()
+                requeue_stale_jobs()
+
+            job = _claim_job()
+            if job:
+                _run_job(job)
+                continue
+        except Exception as e:
+            logger.error(f'[后台任务] worker 异常：{str(e)}')
+
+        # 队列为空（或数据库暂不可用）：等待新任务通知或轮询超时
+        _wakeup.wait(JOB_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_job_workers(count=JOB_WORKERS):
+    """在当前进程启动后台处理线程（重复调用不会重复启动）"""
+    with _threads_lock:
+        _threads[:] = [t for t in _threads if t.is_alive()]
+        for i in range(len(_threads), count):
+            t = threading.Thread(target=_worker_loop, name=f'photo-job-{i}', daemon=True)
+            t.start()
+            _threads.append(t)
+
+
+if __name__ == '__main__':
+    from config.log_config import setup_logger
+    setup_logger(os.environ.get('FLASK_ENV', 'dev'))
+    logger.info(f'[后台任务] 独立处理进程启动，线程数={max(JOB_WORKERS, 1)}')
+    start_job_workers(max(JOB_WORKERS, 1))
+    while True:
+        time.sleep(3600)
@@ -17,22 +17,58 @@ from .favorite import favorite_bp
 from .file import file_bp
 from .member import member_bp
 from .photo import photo_bp
+from .upload import upload_bp
+from .incoming import UploadRequest, discard_incoming_files
+from .system import system_bp
+from .utils import release_db_connections, prefill_db_pool
+from .jobs import start_job_workers
+from .retention import start_retention_scheduler
+from .migrate import run_migrations
+from config.config import DB_AUTO_MIGRATE, PROXY_FIX_X_FOR
 
 app = Flask(__name__)
+# 照片上传接口的文件在解析请求体时直接落盘并计算哈希（见 incoming.py）
+app.request_class = UploadRequest
+# 部署在反向代理之后时，按 X-Forwarded-For 还原客户端 IP（登录限流按 IP 统计）
+if PROXY_FIX_X_FOR:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_X_FOR)
 CORS(app, supports_credentials=True, resources=r'/*', expose_headers='Authorization')
 
 app.register_blueprint(auth_bp, url_prefix='/api')
 app.register_blueprint(photo_bp, url_prefix='/api')
+app.register_blueprint(upload_bp, url_prefix='/api')   # 分片上传（断点续传）
 app.register_blueprint(file_bp, url_prefix='/uploads')
 app.register_blueprint(member_bp, url_prefix='/api')
 app.register_blueprint(favorite_bp, url_prefix='/api')
 app.register_blueprint(album_bp, url_prefix='/api')
 app.register_blueprint(chat_bp, url_prefix='/api')     # AI 对话接口
+app.register_blueprint(system_bp, url_prefix='/api')   # 系统运行状态
+
+# 请求结束时归还未关闭的数据库连接（防止提前 return / 异常导致连接池泄漏）
+app.teardown_appcontext(release_db_connections)
+app.teardown_request(discard_incoming_files)
 
 from config.log_config import setup_logger
 # 初始化日志器
 env = os.environ.get('FLASK_ENV', 'dev')
 logger = setup_logger(env)
 
+# 可选：启动时执行数据库结构迁移（多个 worker 通过 GET_LOCK 串行，已执行的迁移会跳过）
+if DB_AUTO_MIGRATE:
+    try:
+        run_migrations()
+    except Exception as e:
+        logger.error(f'数据库迁移失败：{str(e)}')
+
+# 预建连接池最小连接数（每个 worker 进程各自执行）
+prefill_db_pool()
+
+# 启动照片后台处理线程（缩略图 / EXIF / 哈希）
+start_job_workers()
+
+# 启动 AI 聊天记录定时清理线程（未配置 CHAT_RETENTION_DAYS 时不启动）
+start_retention_scheduler()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,385 @@
+"""
+数据库结构迁移
+──────────
+按版本号顺序执行 MIGRATIONS 中尚未执行的迁移，执行记录保存在 schema_migrations 表。
+每个迁移都先检查 information_schema 再变更（MySQL 5.7 不支持 ADD COLUMN / CREATE INDEX IF NOT EXISTS），
+所以对用 sql/table_info.sql 新建的库和历史老库都能安全执行。
+
+执行方式：
+  python -m src.migrate             执行全部未执行的迁移（docker-entrypoint.sh 启动前自动执行）
+  python -m src.migrate --status    查看迁移执行情况
+  python -m src.migrate --explain   用 EXPLAIN 检查热点查询是否命中预期索引，不符合时返回非 0
+  DB_AUTO_MIGRATE=1                 Flask 进程启动时自动执行（多 worker 通过 GET_LOCK 串行）
+"""
+
+import sys
+import logging
+
+import pymysql
+
+from .utils import get_db_connection
+
+logger = logging.getLogger('photo_manager')
+
+_LOCK_NAME = 'family_photo_schema_migrations'
+
+
+# ─────────────────────────────────────────────────────────
+# information_schema 工具
+# ─────────────────────────────────────────────────────────
+def _table_exists(cursor, table):
+    cursor.execute(
+        '''SELECT 1 FROM information_schema.TABLES
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s''',
+        (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        '''SELECT 1 FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s''',
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute(
+        '''SELECT 1 FROM information_schema.STATISTICS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s''',
+        (table, index)
+    )
+    return cursor.fetchone() is not None
+
+
+def _add_column(cursor, table, column, definition):
+    """列不存在时添加，返回是否新增"""
+    if _column_exists(cursor, table, column):
+        return False
+    cursor.execute(f'ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}')
+    return True
+
+
+def _add_index(cursor, table, index, columns):
+    if not _index_exists(cursor, table, index):
+        cursor.execute(f'CREATE INDEX `{index}` ON `{table}` ({columns})')
+
+
+def _drop_index(cursor, table, index):
+    if _index_exists(cursor, table, index):
+        cursor.execute(f'DROP INDEX `{index}` ON `{table}`')
+
+
+# ─────────────────────────────────────────────────────────
+# 迁移定义：(版本号, 名称, 执行函数)，版本号只增不改
+# ─────────────────────────────────────────────────────────
+def _m0001_baseline_upgrades(cursor):
+    """补齐 table_info.sql 后续新增的结构（老库升级用）：后台任务表、内容哈希、照片数量"""
+    _add_column(cursor, 'photo', 'content_hash',
+                "char(64) null comment '文件内容 SHA-256（后台任务计算）'")
+
+    if not _table_exists(cursor, 'photo_job'):
+        cursor.execute('''
+            create table photo_job
+            (
+                id          bigint auto_increment
+                    primary key,
+                photo_id    int                                   not null comment '照片ID（关联photo.id）',
+                job_type    varchar(30)                           not null comment '任务类型：rendition / exif / hash',
+                status      varchar(20) default 'pending'         not null comment '状态：pending / running / done / failed',
+                attempts    int         default 0                 not null comment '已尝试次数',
+                last_error  varchar(500)                          null comment '最近一次失败原因',
+                worker      varchar(64)                           null comment '领取任务的 worker 标识',
+                create_time datetime    default CURRENT_TIMESTAMP not null,
+                update_time datetime    default CURRENT_TIMESTAMP not null on update CURRENT_TIMESTAMP,
+                constraint fk_photo_job_photo
+                    foreign key (photo_id) references photo (id)
+                        on delete cascade
+            )
+                comment '照片后台处理任务'
+        ''')
+        cursor.execute('create index idx_photo_job_status on photo_job (status, id)')
+        cursor.execute('create index idx_photo_job_photo on photo_job (photo_id)')
+
+    # 新增计数列时按现有数据回填
+    if _add_column(cursor, 'album', 'photo_count',
+                   "int default 0 not null comment '照片数量（上传/删除时维护，避免分页时 COUNT(*)）'"):
+        cursor.execute('''
+            UPDATE album a
+            SET a.photo_count = (SELECT COUNT(*) FROM photo p WHERE p.album_id = a.id)
+        ''')
+    if _add_column(cursor, 'favorite_folder', 'photo_count',
+                   "int default 0 not null comment '收藏照片数量（加入/移出/照片删除时维护）'"):
+        cursor.execute('''
+            UPDATE favorite_folder f
+            SET f.photo_count = (SELECT COUNT(*) FROM favorite_photo fp WHERE fp.folder_id = f.id)
+        ''')
+
+
+def _m0002_hot_query_indexes(cursor):
+    """热点查询的复合索引：相册照片分页、拍摄时间/上传者筛选、相册列表、收藏夹分页"""
+    # 游标分页的排序列不能为 NULL：(t < ? OR (t = ? AND id < ?)) 匹配不到 NULL 行，末行为 NULL 时也无法生成游标
+    # 先回填再改为 NOT NULL（在建索引之前，索引只建一次）
+    cursor.execute('UPDATE photo SET upload_time = COALESCE(shoot_time, NOW()) WHERE upload_time IS NULL')
+    cursor.execute('ALTER TABLE photo MODIFY upload_time datetime default CURRENT_TIMESTAMP not null')
+    cursor.execute('''
+        UPDATE favorite_photo fp
+        JOIN photo p ON p.id = fp.photo_id
+        SET fp.create_time = p.upload_time
+        WHERE fp.create_time IS NULL
+    ''')
+    cursor.execute('ALTER TABLE favorite_photo MODIFY create_time datetime default CURRENT_TIMESTAMP not null')
+    # 相册照片分页：WHERE album_id = ? ORDER BY upload_time DESC, id DESC（含游标条件）
+    _add_index(cursor, 'photo', 'idx_photo_album_upload', 'album_id, upload_time, id')
+    # 搜索：album_id + 拍摄时间范围 / 上传者
+    _add_index(cursor, 'photo', 'idx_photo_album_shoot', 'album_id, shoot_time')
+    _add_index(cursor, 'photo', 'idx_photo_album_operator', 'album_id, operator_id')
+    # 旧的单列 album_id 索引已被上面的复合索引覆盖（外键可改用复合索引）
+    _drop_index(cursor, 'photo', 'album_id')
+    # 相册列表：WHERE creator_id = ? ORDER BY create_time DESC
+    _add_index(cursor, 'album', 'idx_album_creator_time', 'creator_id, create_time')
+    # 收藏夹分页：WHERE folder_id = ? AND member_id = ? ORDER BY create_time DESC
+    _add_index(cursor, 'favorite_photo', 'idx_favorite_photo_folder_member_time', 'folder_id, member_id, create_time')
+
+
+def _m0003_photo_fulltext(cursor):
+    """照片名称 + 备注全文索引（ngram 分词，支持中文），替代 LIKE '%关键词%' 全表扫描"""
+    if not _index_exists(cursor, 'photo', 'ft_photo_text'):
+        cursor.execute(
+            'ALTER TABLE photo ADD FULLTEXT INDEX ft_photo_text (photo_name, remarks) WITH PARSER ngram'
+        )
+
+
+def _m0004_chat_summary(cursor):
+    """AI 对话滚动摘要表（chat_context 构建上下文时使用）"""
+    if not _table_exists(cursor, 'ai_chat_summary'):
+        cursor.execute('''
+            create table ai_chat_summary
+            (
+                member_id       int                                   not null comment '家庭成员ID（关联 family_member.id）',
+                conversation_id varchar(64)                           not null comment '会话ID',
+                summary         text                                  not null comment '早期对话的滚动摘要',
+                last_message_id bigint      default 0                 not null comment '已并入摘要的最后一条消息ID',
+                update_time     datetime    default CURRENT_TIMESTAMP not null on update CURRENT_TIMESTAMP,
+                primary key (member_id, conversation_id)
+            )
+                comment 'AI 聊天上下文摘要（超出 token 预算的早期对话）' collate = utf8mb4_unicode_ci
+        ''')
+
+
+def _m0005_chat_conversations(cursor):
+    """AI 多会话：会话表 + 按已有聊天记录回填（历史消息归入 default 会话）"""
+    cursor.execute("UPDATE ai_chat_message SET conversation_id = 'default' WHERE conversation_id IS NULL")
+    if not _table_exists(cursor, 'ai_conversation'):
+        cursor.execute('''
+            create table ai_conversation
+            (
+                member_id         int                                   not null comment '家庭成员ID（关联 family_member.id）',
+                conversation_id   varchar(64)                           not null comment '会话ID（对应 ai_chat_message.conversation_id）',
+                title             varchar(100)                          not null comment '会话标题',
+                create_time       datetime    default CURRENT_TIMESTAMP not null,
+                last_message_time datetime    default CURRENT_TIMESTAMP not null comment '最后一条消息时间（会话列表排序）',
+                primary key (member_id, conversation_id)
+            )
+                comment 'AI 会话' collate = utf8mb4_unicode_ci
+        ''')
+        cursor.execute('create index idx_ai_conversation_member_last on ai_conversation (member_id, last_message_time)')
+    cursor.execute('''
+        INSERT IGNORE INTO ai_conversation (member_id, conversation_id, title, create_time, last_message_time)
+        SELECT member_id, conversation_id,
+               IF(conversation_id = 'default', '默认对话', '历史对话'), MIN(create_time), MAX(create_time)
+        FROM ai_chat_message
+        GROUP BY member_id, conversation_id
+    ''')
+
+
+def _m0006_photo_upload(cursor):
+    """分片上传会话表（断点续传：init → 按偏移量上传分片 → complete）"""
+    if not _table_exists(cursor, 'photo_upload'):
+        cursor.execute('''
+            create table photo_upload
+            (
+                id          char(32)                              not null
+                    primary key comment '上传会话ID（同时作为临时文件名）',
+                operator_id int                                   not null comment '发起上传的成员（关联family_member.id）',
+                album_id    int                                   not null comment '目标相册（关联album.id）',
+                file_name   varchar(255)                          not null comment '原始文件名',
+                file_size   bigint                                not null comment '文件总字节数',
+                received    bigint      default 0                 not null comment '已写入的连续字节数（续传偏移量）',
+                photo_name  varchar(100)                          null,
+                shoot_time  datetime                              null,
+                member_id   int                                   null comment '归属人（完成后写入 photo.member_id）',
+                remarks     text                                  null,
+                create_time datetime    default CURRENT_TIMESTAMP not null,
+                update_time datetime    default CURRENT_TIMESTAMP not null on update CURRENT_TIMESTAMP,
+                constraint fk_photo_upload_operator
+                    foreign key (operator_id) references family_member (id)
+                        on delete cascade,
+                constraint fk_photo_upload_album
+                    foreign key (album_id) references album (id)
+                        on delete cascade
+            )
+                comment '分片上传会话（断点续传）'
+        ''')
+    _add_index(cursor, 'photo_upload', 'idx_photo_upload_update', 'update_time')
+
+
+MIGRATIONS = [
+    (1, 'baseline_upgrades', _m0001_baseline_upgrades),
+    (2, 'hot_query_indexes', _m0002_hot_query_indexes),
+    (3, 'photo_fulltext', _m0003_photo_fulltext),
+    (4, 'chat_summary', _m0004_chat_summary),
+    (5, 'chat_conversations', _m0005_chat_conversations),
+    (6, 'photo_upload', _m0006_photo_upload),
+]
+
+
+# ─────────────────────────────────────────────────────────
+# 执行
+# ─────────────────────────────────────────────────────────
+def _ensure_migrations_table(cursor):
+    cursor.execute('''
+        create table if not exists schema_migrations
+        (
+            version    int                                not null
+                primary key,
+            name       varchar(100)                       not null,
+            applied_at datetime default CURRENT_TIMESTAMP not null
+        )
+            comment '数据库结构迁移记录'
+    ''')
+
+
+def _applied_versions(cursor):
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def run_migrations(lock_timeout=60):
+    """执行全部未执行的迁移，返回本次执行的版本号列表"""
+    applied_now = []
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT GET_LOCK(%s, %s)', (_LOCK_NAME, lock_timeout))
+        if cursor.fetchone()[0] != 1:
+            cursor.close()
+            raise RuntimeError('获取迁移锁超时，可能有其他进程正在执行迁移')
+        try:
+            _ensure_migrations_table(cursor)
+            applied = _applied_versions(cursor)
+            for version, name, func in MIGRATIONS:
+                if version in applied:
+                    continue
+                logger.info(f'[迁移] 执行 {version:04d}_{name}')
+                # 注意：MySQL 的 DDL 会隐式提交，迁移函数需保证可重复执行
+                func(cursor)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                    (version, name)
+                )
+                conn.commit()
+                applied_now.append(version)
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (_LOCK_NAME,))
+            cursor.close()
+    if applied_now:
+        logger.info(f'[迁移] 完成，本次执行 {len(applied_now)} 个迁移')
+    return applied_now
+
+
+def migration_status():
+    """返回 [(版本号, 名称, 执行时间或 None)]"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        _ensure_migrations_table(cursor)
+        cursor.execute('SELECT version, applied_at FROM schema_migrations')
+        applied = dict(cursor.fetchall())
+        cursor.close()
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+
+
+# ─────────────────────────────────────────────────────────
+# EXPLAIN 回归检查：热点查询必须能用上预期索引
+# ─────────────────────────────────────────────────────────
+# (说明, SQL, 参数, 表别名, 预期索引, 是否要求无 filesort)
+EXPLAIN_CHECKS = [
+    ('相册照片分页',
+     'SELECT p.id FROM photo p WHERE p.album_id = %s ORDER BY p.upload_time DESC, p.id DESC LIMIT 13',
+     (1,), 'p', 'idx_photo_album_upload', True),
+    ('相册照片游标分页',
+     '''SELECT p.id FROM photo p WHERE p.album_id = %s
+          AND (p.upload_time < %s OR (p.upload_time = %s AND p.id < %s))
+        ORDER BY p.upload_time DESC, p.id DESC LIMIT 13''',
+     (1, '2030-01-01 00:00:00', '2030-01-01 00:00:00', 1 << 30), 'p', 'idx_photo_album_upload', True),
+    ('按拍摄时间筛选',
+     'SELECT p.id FROM photo p WHERE p.album_id = %s AND p.shoot_time >= %s AND p.shoot_time <= %s',
+     (1, '2019-01-01', '2019-12-31'), 'p', 'idx_photo_album_shoot', False),
+    ('按上传者筛选',
+     'SELECT p.id FROM photo p WHERE p.album_id = %s AND p.operator_id = %s',
+     (1, 1), 'p', 'idx_photo_album_operator', False),
+    ('相册列表（非管理员）',
+     'SELECT a.id FROM album a WHERE a.creator_id = %s ORDER BY a.create_time DESC',
+     (1,), 'a', 'idx_album_creator_time', True),
+    ('收藏夹照片分页',
+     '''SELECT fp.id FROM favorite_photo fp WHERE fp.folder_id = %s AND fp.member_id = %s
+        ORDER BY fp.create_time DESC, fp.id DESC LIMIT 13''',
+     (1, 1), 'fp', 'idx_favorite_photo_folder_member_time', False),
+    ('会话消息分页',
+     '''SELECT m.id FROM ai_chat_message m WHERE m.member_id = %s AND m.conversation_id = %s
+        ORDER BY m.create_time DESC, m.id DESC LIMIT 51''',
+     (1, 'default'), 'm', 'idx_conversation', True),
+    ('照片关键词搜索',
+     'SELECT p.id FROM photo p WHERE MATCH(p.photo_name, p.remarks) AGAINST (%s IN BOOLEAN MODE)',
+     ('+"生日"',), 'p', 'ft_photo_text', False),
+]
+
+
+def explain_checks():
+    """
+    逐条 EXPLAIN 热点查询：
+      fail  预期索引不在 possible_keys 中（索引缺失或查询写法导致无法使用）
+      warn  优化器当前未选择该索引（小表上常见，数据量上来后会改变）
+      ok    命中预期索引，且（如要求）没有 filesort
+    :return: [(说明, 结果, 详情)]
+    """
+    results = []
+    with get_db_connection() as conn:
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        for title, sql, params, alias, index, no_filesort in EXPLAIN_CHECKS:
+            cursor.execute('EXPLAIN ' + sql, params)
+            row = next((r for r in cursor.fetchall() if r.get('table') == alias), None) or {}
+            possible = (row.get('possible_keys') or '').split(',')
+            key = row.get('key')
+            extra = row.get('Extra') or ''
+            detail = f'key={key} possible_keys={row.get("possible_keys")} extra={extra}'
+            if index not in possible:
+                results.append((title, 'fail', detail))
+            elif key != index:
+                results.append((title, 'warn', detail))
+            elif no_filesort and 'filesort' in extra:
+                results.append((title, 'fail', detail))
+            else:
+                results.append((title, 'ok', detail))
+        cursor.close()
+    return results
+
+
+if __name__ == '__main__':
+    import os
+    from config.log_config import setup_logger
+    setup_logger(os.environ.get('FLASK_ENV', 'dev'))
+
+    if '--status' in sys.argv:
+        for version, name, applied_at in migration_status():
+            print(f'{version:04d}_{name:<30} {applied_at or "未执行"}')
+    elif '--explain' in sys.argv:
+        failed = False
+        for title, result, detail in explain_checks():
+            print(f'[{result:<4}] {title}：{detail}')
+            failed = failed or result == 'fail'
+        sys.exit(1 if failed else 0)
+    else:
+        done = run_migrations()
+        print(f'迁移完成，本次执行：{done or "无"}')
@@ -8,12 +8,20 @@ from werkzeug.utils import secure_filename
 photo_bp = Blueprint('photo', __name__)
 
 from config.config import (
-    UPLOAD_PHOTO_FOLDER, UPLOAD_COVER_FOLDER
+    UPLOAD_PHOTO_FOLDER, UPLOAD_COVER_FOLDER, SEARCH_TIMEOUT_MS, PHOTO_BATCH_MAX_FILES, PHOTO_MAX_FILE_SIZE
 )
-from .utils import get_db_connection, allowed_file
+from .utils import get_db_connection, allowed_file, keyset_condition, encode_cursor
 from .auth import login_required
+from .rendition import delete_renditions
+from .access import can_access_album
+from .jobs import JOB_TYPES, enqueue_photo_jobs, enqueue_batch_jobs, notify_job_workers, summarize_job_status
+from .incoming import stream_uploads, save_upload
+
+# 上传时已边写边计算内容哈希，不再需要后台 hash 任务
+_UPLOAD_JOB_TYPES = tuple(job_type for job_type in JOB_TYPES if job_type != 'hash')
 
 @photo_bp.route('/photos/upload', methods=['POST'])
+@stream_uploads
 @login_required
 def upload_photo():
     if 'photo' not in request.files:
@@ -43,18 +51,8 @@ def upload_photo():
 
     # ── 权限校验：非管理员只能上传到自己创建的相册 ──
     try:
-        _conn = get_db_connection()
-        _cur = _conn.cursor(pymysql.cursors.DictCursor)
-        if g.is_admin:
-            _cur.execute('SELECT id FROM album WHERE id = %s', (album_id,))
-        else:
-            _cur.execute('SELECT id FROM album WHERE id = %s AND creator_id = %s', (album_id, g.member_id))
-        if not _cur.fetchone():
-            _cur.close()
-            _conn.close()
+        if not can_access_album(album_id):
             return jsonify({'code': 403, 'msg': '无权向该相册上传照片'}), 403
-        _cur.close()
-        _conn.close()
     except Exception as e:
         return jsonify({'code': 500, 'msg': f'权限校验失败：{str(e)}'}), 500
 
@@ -72,7 +70,12 @@ def upload_photo():
         if not os.path.exists(album_dir):
             os.makedirs(album_dir)
         file_path = os.path.join(album_dir, unique_filename)
-        file.save(file_path)
+        # 请求体解析时已直接写入同一文件系统，这里只做重命名，同时得到内容哈希
+        content_hash = save_upload(file, file_path)
+        if os.path.getsize(file_path) > PHOTO_MAX_FILE_SIZE:
+            os.remove(file_path)
+            return jsonify({'code': 413, 'msg': f'照片不能超过 {_size_mb(PHOTO_MAX_FILE_SIZE)}MB，'
+                                                f'更大的文件请使用分片上传'}), 413
 
         relative_path = os.path.join(str(album_id), unique_filename)
         try:
@@ -81,26 +84,237 @@ def upload_photo():
             # 插入时新增operator_id字段（核心变更）
             cursor.execute(
                 '''INSERT INTO photo 
-                   (photo_name, file_path, shoot_time, album_id, member_id, operator_id, remarks) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)''',
-                (photo_name, relative_path, shoot_time, album_id, member_id, operator_id, remarks)
+                   (photo_name, file_path, shoot_time, album_id, member_id, operator_id, remarks, content_hash) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                (photo_name, relative_path, shoot_time, album_id, member_id, operator_id, remarks, content_hash)
             )
+            photo_id = cursor.lastrowid
+            # 缩略图 / EXIF交给后台队列，不阻塞上传响应
+            enqueue_photo_jobs(cursor, photo_id, _UPLOAD_JOB_TYPES)
 
             cursor.execute(
-                '''UPDATE album set last_upload_user_id = %s, last_upload_time=%s WHERE id=%s''',
+                '''UPDATE album set last_upload_user_id = %s, last_upload_time=%s, photo_count = photo_count + 1
+                   WHERE id=%s''',
                 (operator_id, datetime.now(), album_id)
             )
             conn.commit()
             cursor.close()
             conn.close()
-            return jsonify({'code': 200, 'msg': '上传成功', 'data': {'file_path': relative_path}})
         except Exception as e:
             if os.path.exists(file_path):
                 os.remove(file_path)
             return jsonify({'code': 500, 'msg': f'保存数据失败：{str(e)}'})
+
+        notify_job_workers()
+        return jsonify({'code': 200, 'msg': '上传成功', 'data': {
+            'photo_id': photo_id,
+            'file_path': relative_path,
+            'status': 'pending',
+        }})
     else:
         return jsonify({'code': 400, 'msg': '不支持的文件格式，仅支持png/jpg/jpeg/gif/bmp'})
 
+
+@photo_bp.route('/photos/upload/batch', methods=['POST'])
+@stream_uploads
+@login_required
+def upload_photos_batch():
+    """
+    批量上传（一次请求多张照片）
+    表单参数：
+      photos                   照片文件，可重复多个（最多 PHOTO_BATCH_MAX_FILES 个，单张不超过 PHOTO_MAX_FILE_SIZE）
+      album_id                 所属相册（必填）
+      member_id / remarks      归属人 / 备注，整批共用
+      photo_name / shoot_time  可按 photos 的顺序重复传入、逐个对应；只传一个则整批共用，不传时名称取文件名
+    权限只校验一次，文件在解析请求体时已直接落盘并计算哈希，逐个重命名到相册目录后，
+    照片记录一次 executemany 写入、相册统计只更新一次（同一事务）；
+    数据库写入失败时删除本批已保存的文件
+    返回：{ success, failed, results: [{index, name, code, msg, photo_id, file_path, status}] }
+    """
+    files = request.files.getlist('photos')
+    if not files:
+        return jsonify({'code': 400, 'msg': '未选择照片文件'}), 400
+    if len(files) > PHOTO_BATCH_MAX_FILES:
+        return jsonify({'code': 400, 'msg': f'单次最多上传 {PHOTO_BATCH_MAX_FILES} 张照片'}), 400
+
+    # ── 安全校验：album_id 必须为正整数，防止路径遍历攻击 ──
+    try:
+        album_id = int(request.form.get('album_id'))
+        if album_id <= 0:
+            raise ValueError()
+    except (ValueError, TypeError):
+        return jsonify({'code': 400, 'msg': '相册ID必须为正整数'}), 400
+
+    # ── 权限校验（整批一次）：非管理员只能上传到自己创建的相册 ──
+    try:
+        if not can_access_album(album_id):
+            return jsonify({'code': 403, 'msg': '无权向该相册上传照片'}), 403
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'权限校验失败：{str(e)}'}), 500
+
+    member_id = request.form.get('member_id') or None
+    remarks = request.form.get('remarks', '')
+    operator_id = g.member_id
+    photo_names = request.form.getlist('photo_name')
+    shoot_times = request.form.getlist('shoot_time')
+
+    def per_file(values, index):
+        if len(values) == len(files):
+            return values[index]
+        return values[0] if len(values) == 1 else None
+
+    # ── 1. 逐个校验并落盘 ──
+    album_dir = os.path.join(UPLOAD_PHOTO_FOLDER, str(album_id))
+    os.makedirs(album_dir, exist_ok=True)
+    results = []
+    rows = []
+    saved_paths = []
+    for index, file in enumerate(files):
+        result = {'index': index, 'name': file.filename}
+        results.append(result)
+        filename = secure_filename(file.filename or '')
+        if not filename or not allowed_file(filename):
+            result.update(code=400, msg='不支持的文件格式，仅支持png/jpg/jpeg/gif/bmp')
+            continue
+
+        ext_part = filename.rpartition('.')[2]
+        unique_filename = f'{datetime.now().strftime("%Y%m%d%H%M%S")}_{secrets.token_hex(4)}.{ext_part}'
+        file_path = os.path.join(album_dir, unique_filename)
+        try:
+            content_hash = save_upload(file, file_path)
+            too_large = os.path.getsize(file_path) > PHOTO_MAX_FILE_SIZE
+            if too_large:
+                os.remove(file_path)
+        except Exception as e:
+            result.update(code=500, msg=f'保存文件失败：{str(e)}')
+            continue
+        if too_large:
+            result.update(code=413, msg=f'照片不能超过 {_size_mb(PHOTO_MAX_FILE_SIZE)}MB')
+            continue
+        saved_paths.append(file_path)
+
+        relative_path = os.path.join(str(album_id), unique_filename)
+        result.update(code=200, msg='上传成功', file_path=relative_path, status='pending')
+        rows.append((per_file(photo_names, index) or file.filename, relative_path,
+                     per_file(shoot_times, index) or None, album_id, member_id, operator_id, remarks,
+                     content_hash))
+
+    if not rows:
+        return jsonify({'code': 400, 'msg': '没有可上传的照片', 'data': {
+            'success': 0, 'failed': len(results), 'results': results,
+        }}), 400
+
+    # ── 2. 一个事务写入全部记录 ──
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(
+                '''INSERT INTO photo
+                   (photo_name, file_path, shoot_time, album_id, member_id, operator_id, remarks, content_hash)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                rows
+            )
+            # 取回新照片 ID（文件名唯一，走 idx_photo_album_upload 的 album_id 前缀）
+            cursor.execute(
+                f'''SELECT file_path, id FROM photo
+                    WHERE album_id = %s AND file_path IN ({", ".join(["%s"] * len(rows))})''',
+                [album_id] + [row[1] for row in rows]
+            )
+            photo_ids = dict(cursor.fetchall())
+            enqueue_batch_jobs(cursor, list(photo_ids.values()), _UPLOAD_JOB_TYPES)
+            cursor.execute(
+                '''UPDATE album SET last_upload_user_id = %s, last_upload_time = %s, photo_count = photo_count + %s
+                   WHERE id = %s''',
+                (operator_id, datetime.now(), len(rows), album_id)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+    except Exception as e:
+        for path in saved_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        for result in results:
+            if result['code'] == 200:
+                result.update(code=500, msg=f'保存数据失败：{str(e)}', file_path=None, status=None)
+        return jsonify({'code': 500, 'msg': f'保存数据失败：{str(e)}', 'data': {
+            'success': 0, 'failed': len(results), 'results': results,
+        }}), 500
+
+    for result in results:
+        if result['code'] == 200:
+            result['photo_id'] = photo_ids.get(result['file_path'])
+    notify_job_workers()
+    success = len(rows)
+    return jsonify({'code': 200, 'msg': f'上传完成：成功 {success} 张，失败 {len(results) - success} 张', 'data': {
+        'success': success, 'failed': len(results) - success, 'results': results,
+    }})
+
+
+def _size_mb(size):
+    return f'{size / (1024 * 1024):g}'
+
+
+@photo_bp.route('/photos/<int:photo_id>/status', methods=['GET'])
+@login_required
+def get_photo_status(photo_id):
+    """
+    查询照片后台处理进度
+    返回：{ photo_id, status: pending|running|done|failed, jobs: [{job_type, status, attempts, last_error, update_time}] }
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+
+        cursor.execute(
+            '''SELECT p.id, a.creator_id
+               FROM photo p
+               LEFT JOIN album a ON p.album_id = a.id
+               WHERE p.id = %s''',
+            (photo_id,)
+        )
+        photo = cursor.fetchone()
+        if not photo:
+            cursor.close()
+            conn.close()
+            return jsonify({'code': 404, 'msg': '照片不存在'}), 404
+
+        # 权限校验：非管理员只能查看自己创建的相册中的照片
+        if not g.is_admin and photo.get('creator_id') != g.member_id:
+            cursor.close()
+            conn.close()
+            return jsonify({'code': 403, 'msg': '无权查看该照片'}), 403
+
+        cursor.execute(
+            '''SELECT job_type, status, attempts, last_error, update_time
+               FROM photo_job
+               WHERE photo_id = %s
+               ORDER BY id''',
+            (photo_id,)
+        )
+        jobs = cursor.fetchall()
+        for job in jobs:
+            if job.get('update_time'):
+                job['update_time'] = job['update_time'].strftime('%Y-%m-%d %H:%M:%S')
+
+        cursor.close()
+        conn.close()
+        return jsonify({
+            'code': 200,
+            'data': {
+                'photo_id': photo_id,
+                'status': summarize_job_status(jobs),
+                'jobs': jobs,
+            }
+        })
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'查询处理进度失败：{str(e)}'}), 500
+
 # app.py.bak 中的 delete_photo 接口（完整修复版）
 @photo_bp.route('/photos/delete', methods=['POST'])
 @login_required
@@ -139,6 +353,21 @@ def delete_photo():
         file_path = os.path.join(UPLOAD_PHOTO_FOLDER, photo['file_path'])
         if os.path.exists(file_path):
             os.remove(file_path)
+        delete_renditions(photo['file_path'])
+
+        # 维护相册/收藏夹的照片数量（favorite_photo 记录随照片级联删除）
+        cursor.execute(
+            '''UPDATE favorite_folder ff
+               JOIN favorite_photo fp ON fp.folder_id = ff.id
+               SET ff.photo_count = GREATEST(ff.photo_count - 1, 0)
+               WHERE fp.photo_id = %s''',
+            (photo_id,)
+        )
+        if photo['album_id']:
+            cursor.execute(
+                'UPDATE album SET photo_count = GREATEST(photo_count - 1, 0) WHERE id = %s',
+                (photo['album_id'],)
+            )
 
         # 删除数据库记录
         cursor.execute('DELETE FROM photo WHERE id = %s', (photo_id,))
@@ -153,83 +382,177 @@ def delete_photo():
         return jsonify({'code': 500, 'msg': f'删除失败：{str(e)}'}), 500
 
 
+# ngram 全文索引的最小分词长度（MySQL ngram_token_size，默认 2），更短的关键词回退为 LIKE
+_NGRAM_TOKEN_SIZE = 2
+
+
+def _photo_filter_sql(args):
+    """
+    根据筛选参数拼接 WHERE 条件（均以 AND 开头）
+    :return: (sql 片段, 参数列表, 全文检索表达式或 None)
+      keyword    在照片名称和备注中全文检索（ngram 分词，支持中文），多个词用空格分隔，需全部命中
+      name_like  仅匹配照片名称（兼容旧参数）
+    """
+    sql = ''
+    params = []
+    match_expr = None
+
+    keyword = args.get('keyword', '').strip()
+    if keyword:
+        # 去掉布尔模式的特殊字符，每个词作为短语必须命中
+        terms = [t for t in ''.join(c if c not in '+-<>()~*"@' else ' ' for c in keyword).split() if t]
+        if terms and all(len(t) >= _NGRAM_TOKEN_SIZE for t in terms):
+            match_expr = ' '.join(f'+"{t}"' for t in terms)
+            sql += ' AND MATCH(p.photo_name, p.remarks) AGAINST (%s IN BOOLEAN MODE)'
+            params.append(match_expr)
+        else:
+            for t in terms or [keyword]:
+                sql += ' AND (p.photo_name LIKE %s OR p.remarks LIKE %s)'
+                params.extend([f'%{t}%', f'%{t}%'])
+
+    name_like = args.get('name_like', '')
+    if name_like:
+        sql += ' AND p.photo_name LIKE %s'
+        params.append(f'%{name_like}%')
+    if args.get('member_id'):
+        sql += ' AND p.member_id = %s'
+        params.append(args.get('member_id'))
+    if args.get('operator_id'):
+        sql += ' AND p.operator_id = %s'
+        params.append(args.get('operator_id'))
+    if args.get('start_date'):
+        sql += ' AND p.shoot_time >= %s'
+        params.append(args.get('start_date'))
+    if args.get('end_date'):
+        sql += ' AND p.shoot_time <= %s'
+        params.append(args.get('end_date'))
+    return sql, params, match_expr
+
+
+def _is_query_timeout(e):
+    """MAX_EXECUTION_TIME 超时：3024（MySQL 5.7.8+）/ 1907（5.7.4~5.7.7）"""
+    return isinstance(e, pymysql.err.OperationalError) and e.args and e.args[0] in (3024, 1907)
+
+
 @photo_bp.route('/photos/search', methods=['GET'])
 @login_required
 def search_photos():
-    album_id = request.args.get('album_id')
-    name_like = request.args.get('name_like', '')
-    member_id = request.args.get('member_id', '')
-    operator_id = request.args.get('operator_id', '')
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
+    """
+    条件筛选照片
+    可选参数：
+      album_id    相册ID；不传时跨相册搜索，一次查询覆盖当前用户有权限的全部相册
+                  （管理员：全部相册；其他成员：自己创建的相册），每条结果带 album_name
+      keyword     全文检索照片名称和备注，结果按相关度排序（游标分页时按上传时间排序）
+      count_mode  总条数计算方式：
+                    first_page  仅第一页精确统计，翻页时 total 返回 null（默认，前端沿用第一页的 total）
+                    exact       每页都精确统计
+                    estimate    使用 EXPLAIN 的行数估算（total_estimated=true）
+                    none        不统计
+      cursor      游标分页（传上一页返回的 next_cursor），忽略 page
+    has_more 始终通过多取 1 条判断，与 total 无关
+    单条 SQL 最长执行 SEARCH_TIMEOUT_MS 毫秒，超时返回 503
+    """
+    # 游标分页（可选）：传 cursor 参数时按 (upload_time, id) 定位，忽略 page
+    return _search_photos(request.args.get('album_id'), 'cursor' in request.args)
+
+
+def _search_photos(album_id, cursor_mode):
+    """
+    执行照片搜索，album_id 为空时搜索当前用户有权限的全部相册
+    :param cursor_mode: True 按 (upload_time, id) 游标分页，False 按 page 偏移分页
+                        （page 模式带 keyword 时按相关度排序，不返回 next_cursor）
+    """
+    count_mode = request.args.get('count_mode', 'first_page')
 
     # 分页参数
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 12))
     offset = (page - 1) * page_size
+    is_first_page = not request.args.get('cursor') if cursor_mode else page == 1
 
-    if not album_id:
-        return jsonify({'code': 400, 'msg': '相册ID不能为空'}), 400
+    if count_mode not in ('first_page', 'exact', 'estimate', 'none'):
+        return jsonify({'code': 400, 'msg': 'count_mode 仅支持 first_page/exact/estimate/none'}), 400
+    try:
+        keyset_sql, keyset_params = keyset_condition('p.upload_time', 'p.id', request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
+
+    # 优化器提示：限制单条查询的执行时间，保证搜索延迟有上限
+    hint = f'/*+ MAX_EXECUTION_TIME({SEARCH_TIMEOUT_MS}) */ '
 
     try:
+        # 权限校验：非管理员只能搜索自己创建的相册中的照片
+        if album_id and not g.is_admin and not can_access_album(album_id):
+            return jsonify({'code': 403, 'msg': '无权搜索该相册'}), 403
+
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
 
-        # 权限校验：非管理员只能搜索自己创建的相册中的照片
-        if not g.is_admin:
-            cursor.execute('SELECT id FROM album WHERE id = %s AND creator_id = %s', (album_id, g.member_id))
-            if not cursor.fetchone():
-                cursor.close()
-                conn.close()
-                return jsonify({'code': 403, 'msg': '无权搜索该相册'}), 403
-
-        # 构建查询条件
-        sql_count = 'SELECT COUNT(*) as total FROM photo p LEFT JOIN family_member m ON p.member_id = m.id LEFT JOIN family_member o ON p.operator_id = o.id WHERE p.album_id = %s'
-        sql_data = '''SELECT p.*, m.name as member_name, o.name as operator_name 
+        if album_id:
+            where = ' WHERE p.album_id = %s'
+            params = [album_id]
+        elif g.is_admin:
+            where = ' WHERE 1 = 1'
+            params = []
+        else:
+            # 跨相册搜索：非管理员只在自己创建的相册中查找（与 album.py 的相册列表权限一致）
+            where = ' WHERE p.album_id IN (SELECT id FROM album WHERE creator_id = %s)'
+            params = [g.member_id]
+
+        # 构建查询条件（统计只需 photo 表本身，不关联 family_member）
+        filter_sql, filter_params, match_expr = _photo_filter_sql(request.args)
+        where += filter_sql
+        params += filter_params
+
+        # 1. 查询总条数（按 count_mode）
+        total = None
+        total_estimated = False
+        if album_id and not filter_sql:
+            # 无筛选条件：直接使用相册维护的照片数量
+            cursor.execute('SELECT photo_count FROM album WHERE id = %s', (album_id,))
+            album = cursor.fetchone()
+            total = album['photo_count'] if album else 0
+        elif count_mode == 'exact' or (count_mode == 'first_page' and is_first_page):
+            cursor.execute(f'SELECT {hint}COUNT(*) as total FROM photo p' + where, params)
+            total = cursor.fetchone()['total']
+        elif count_mode == 'estimate':
+            cursor.execute('EXPLAIN SELECT p.id FROM photo p' + where, params)
+            plan = cursor.fetchone() or {}
+            total = int((plan.get('rows') or 0) * float(plan.get('filtered') or 100) / 100)
+            total_estimated = True
+
+        # 2. 查询当前页数据（多取 1 条，用于判断是否还有下一页）
+        rank_by_relevance = match_expr is not None and not cursor_mode
+        select_params = [match_expr] if rank_by_relevance else []
+        sql_data = f'''SELECT {hint}p.*, m.name as member_name, o.name as operator_name, a.album_name
+                      {', MATCH(p.photo_name, p.remarks) AGAINST (%s IN BOOLEAN MODE) AS relevance' if rank_by_relevance else ''}
                       FROM photo p 
                       LEFT JOIN family_member m ON p.member_id = m.id 
-                      LEFT JOIN family_member o ON p.operator_id = o.id 
-                      WHERE p.album_id = %s'''
-        params = [album_id]
-
-        # 拼接条件
-        if name_like:
-            sql_count += ' AND p.photo_name LIKE %s'
-            sql_data += ' AND p.photo_name LIKE %s'
-            params.append(f'%{name_like}%')
-        if member_id:
-            sql_count += ' AND p.member_id = %s'
-            sql_data += ' AND p.member_id = %s'
-            params.append(member_id)
-        if operator_id:
-            sql_count += ' AND p.operator_id = %s'
-            sql_data += ' AND p.operator_id = %s'
-            params.append(operator_id)
-        if start_date:
-            sql_count += ' AND p.shoot_time >= %s'
-            sql_data += ' AND p.shoot_time >= %s'
-            params.append(start_date)
-        if end_date:
-            sql_count += ' AND p.shoot_time <= %s'
-            sql_data += ' AND p.shoot_time <= %s'
-            params.append(end_date)
-
-        # 1. 查询总条数
-        cursor.execute(sql_count, params)
-        total = cursor.fetchone()['total']
-
-        # 2. 查询当前页数据
-        sql_data += ' ORDER BY p.upload_time DESC LIMIT %s OFFSET %s'
-        params.extend([page_size, offset])
+                      LEFT JOIN family_member o ON p.operator_id = o.id
+                      LEFT JOIN album a ON p.album_id = a.id''' + where
+        params = select_params + params
+        if cursor_mode:
+            sql_data += keyset_sql + ' ORDER BY p.upload_time DESC, p.id DESC LIMIT %s'
+            params.extend([*keyset_params, page_size + 1])
+        else:
+            order_by = 'relevance DESC, p.upload_time DESC, p.id DESC' if rank_by_relevance else 'p.upload_time DESC, p.id DESC'
+            sql_data += f' ORDER BY {order_by} LIMIT %s OFFSET %s'
+            params.extend([page_size + 1, offset])
         cursor.execute(sql_data, params)
         photos = cursor.fetchall()
 
+        has_more = len(photos) > page_size
+        photos = photos[:page_size]
         for photo in photos:
             if photo.get('shoot_time'):
                 photo['shoot_time'] = photo['shoot_time'].strftime('%Y-%m-%d %H:%M:%S')
 
             if photo.get('upload_time'):
                 photo['upload_time'] = photo['upload_time'].strftime('%Y-%m-%d %H:%M:%S')
+        # 按相关度排序时结果不是 (upload_time, id) 顺序，游标无法续接，只能按 page 翻页
+        next_cursor = None
+        if photos and not rank_by_relevance:
+            next_cursor = encode_cursor(photos[-1]['upload_time'], photos[-1]['id'])
 
         cursor.close()
         conn.close()
@@ -238,7 +561,11 @@ def search_photos():
             'code': 200,
             'data': photos,
             'total': total,
-            'has_more': page * page_size < total
+            'total_estimated': total_estimated,
+            'has_more': has_more,
+            'next_cursor': next_cursor,
         })
     except Exception as e:
+        if _is_query_timeout(e):
+            return jsonify({'code': 503, 'msg': '搜索超时，请缩小搜索范围后重试'}), 503
         return jsonify({'code': 500, 'msg': f'搜索失败：{str(e)}'}), 500
@@ -0,0 +1,118 @@
+"""
+照片多规格渲染（缩略图 / 预览图）
+──────────
+上传后按 RENDITION_SIZES 生成固定尺寸的副本，目录结构与原图一一对应：
+  uploads/photos/<album_id>/<文件名>                  原图（original）
+  uploads/renditions/thumb/<album_id>/<文件名>        长边 256px，相册网格使用
+  uploads/renditions/preview/<album_id>/<文件名>      长边 1024px，大图预览使用
+
+依赖 Pillow（可选）：未安装时不生成副本，serve_photo 自动回退到原图。
+"""
+
+import os
+import logging
+import threading
+
+from config.config import (
+    UPLOAD_PHOTO_FOLDER, UPLOAD_RENDITION_FOLDER, RENDITION_SIZES, RENDITION_QUALITY
+)
+
+logger = logging.getLogger('photo_manager')
+
+# ─────────────────────────────────────────
+# Pillow 库可选：未安装则只保存原图
+# ─────────────────────────────────────────
+try:
+    from PIL import Image, ImageOps
+    _PIL_AVAILABLE = True
+except ImportError:
+    _PIL_AVAILABLE = False
+    logger.info('[缩略图] Pillow 库未安装，将只保存原图（pip install Pillow）')
+
+ORIGINAL = 'original'
+
+
+def rendition_path(relative_path: str, size: str) -> str:
+    """规格副本的绝对路径；size=original 时返回原图路径"""
+    if size == ORIGINAL:
+        return os.path.join(UPLOAD_PHOTO_FOLDER, relative_path)
+    return os.path.join(UPLOAD_RENDITION_FOLDER, size, relative_path)
+
+
+def generate_renditions(relative_path: str, sizes=None, raise_errors=False) -> list:
+    """
+    为一张原图生成各规格副本（已存在的跳过）
+    :param relative_path: 相对 UPLOAD_PHOTO_FOLDER 的路径，即 photo.file_path
+    :param sizes:         要生成的规格名列表，默认全部
+    :param raise_errors:  生成失败时抛出异常（后台任务据此重试 / 标记失败）；
+                          默认只记录日志并返回已成功的部分，按需生成时由调用方回退到原图
+    :return:              成功生成（或已存在）的规格名列表
+    """
+    if not _PIL_AVAILABLE:
+        return []
+
+    source = rendition_path(relative_path, ORIGINAL)
+    targets = [s for s in (sizes or RENDITION_SIZES) if s in RENDITION_SIZES]
+    done = [s for s in targets if os.path.exists(rendition_path(relative_path, s))]
+    todo = [s for s in targets if s not in done]
+    if not todo:
+        return done
+
+    try:
+        with Image.open(source) as img:
+            # 按 EXIF 方向旋正（手机竖拍照片），再统一缩放
+            img = ImageOps.exif_transpose(img)
+            # 从大到小依次缩放，小规格复用上一级结果，减少重复计算
+            for size in sorted(todo, key=lambda s: RENDITION_SIZES[s], reverse=True):
+                edge = RENDITION_SIZES[size]
+                if max(img.size) > edge:
+                    img = _resized(img, edge)
+                _save(img, rendition_path(relative_path, size))
+                done.append(size)
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.error(f'[缩略图] 生成失败 {relative_path}：{str(e)}')
+    return done
+
+
+def ensure_rendition(relative_path: str, size: str) -> bool:
+    """确保某个规格副本存在（历史照片首次访问时按需生成）"""
+    if size == ORIGINAL:
+        return True
+    if os.path.exists(rendition_path(relative_path, size)):
+        return True
+    return size in generate_renditions(relative_path, [size])
+
+
+def delete_renditions(relative_path: str):
+    """删除一张照片的全部规格副本（原图由调用方删除）"""
+    for size in RENDITION_SIZES:
+        path = rendition_path(relative_path, size)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _resized(img, edge):
+    img = img.copy()
+    img.thumbnail((edge, edge), Image.LANCZOS)
+    return img
+
+
+def _save(img, path):
+    """先写临时文件再原子替换，避免并发请求读到写了一半的图片"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ext = path.rsplit('.', 1)[-1].lower()
+    fmt = 'JPEG' if ext in ('jpg', 'jpeg') else Image.registered_extensions().get(f'.{ext}', 'PNG')
+    if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    tmp_path = f'{path}.{os.getpid()}_{threading.get_ident()}.tmp'
+    options = {'quality': RENDITION_QUALITY, 'optimize': True} if fmt == 'JPEG' else {}
+    try:
+        img.save(tmp_path, format=fmt, **options)
+        os.replace(tmp_path, path)
+    except Exception:
+        # 图片截断 / 磁盘已满等：删除写了一半的临时文件，不留在规格目录中
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,281 @@
+"""
+AI 聊天记录保留策略
+──────────
+定期清理 create_time 早于保留天数的 ai_chat_message，替代一次性 DELETE 的存储过程
+cleanup_old_chat_messages（大事务长时间锁表、撑大 undo log）：
+
+  1. 沿 idx_create_time (create_time) 按 (create_time, id) 游标逐批取出过期消息，每批一个短事务按主键删除
+  2. 两批之间休眠 CHAT_RETENTION_SLEEP 秒，给在线请求和 purge 线程留出余量
+  3. archive 模式下每批先追加写入 gzip 压缩的 JSON Lines 文件并落盘，再删除（最多重复导出，不会丢失）
+  4. 多个 gunicorn worker 通过 GET_LOCK 保证同一时间只有一个进程在清理
+
+配置（环境变量）：
+  CHAT_RETENTION_DAYS       保留天数（默认 0，不清理）
+  CHAT_RETENTION_MODE       delete 直接删除（默认）/ archive 导出到 CHAT_ARCHIVE_FOLDER 后删除
+  CHAT_RETENTION_BATCH      每批条数（默认 500）
+  CHAT_RETENTION_SLEEP      两批之间的间隔秒数（默认 0.2）
+  CHAT_RETENTION_INTERVAL   Web 进程内自动执行的间隔小时数（默认 6，0 表示只手动执行）
+  CHAT_ARCHIVE_FOLDER       归档目录（默认 family-photo-backend/archive）
+
+手动执行：
+  python -m src.retention                 按配置清理一次
+  python -m src.retention --dry-run       只统计将被清理的条数
+  python -m src.retention --days 90 --archive
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import logging
+import threading
+from datetime import datetime
+
+import pymysql
+
+from config.config import (
+    CHAT_RETENTION_DAYS, CHAT_RETENTION_MODE, CHAT_RETENTION_BATCH, CHAT_RETENTION_SLEEP,
+    CHAT_RETENTION_INTERVAL, CHAT_ARCHIVE_FOLDER
+)
+from .utils import get_db_connection
+
+logger = logging.getLogger('photo_manager')
+
+_LOCK_NAME = 'photo_manager_chat_retention'
+# 执行过程中每隔多少秒输出一次进度日志
+_PROGRESS_INTERVAL = 30
+
+_status = {
+    'running': False,
+    'cutoff': None,
+    'mode': None,
+    'deleted': 0,
+    'started_at': None,
+    'finished_at': None,
+    'archive_file': None,
+    'last_error': None,
+}
+_status_lock = threading.Lock()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def get_retention_status():
+    """当前进程最近一次清理的进度（gunicorn 多进程部署时只反映处理该请求的 worker）"""
+    with _status_lock:
+        status = dict(_status)
+    status.update(days=CHAT_RETENTION_DAYS, interval_hours=CHAT_RETENTION_INTERVAL)
+    return status
+
+
+def _update_status(**fields):
+    with _status_lock:
+        _status.update(fields)
+
+
+# ─────────────────────────────────────────────────────────
+# 清理
+# ─────────────────────────────────────────────────────────
+def purge_chat_messages(days=CHAT_RETENTION_DAYS, mode=CHAT_RETENTION_MODE, dry_run=False):
+    """
+    清理 days 天前的聊天记录
+    :return: {'cutoff', 'mode', 'deleted', 'archive_file', 'seconds'}；
+             days <= 0 或其他进程正在清理时返回 None
+    """
+    if days <= 0:
+        return None
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # 截止时间以数据库时钟为准（create_time 默认值为数据库 CURRENT_TIMESTAMP），整个过程固定不变
+        cursor.execute('SELECT NOW() - INTERVAL %s DAY', (days,))
+        cutoff = cursor.fetchone()[0]
+        if dry_run:
+            cursor.execute('SELECT COUNT(*) FROM ai_chat_message WHERE create_time < %s', (cutoff,))
+            count = cursor.fetchone()[0]
+            cursor.close()
+            return {'cutoff': cutoff, 'mode': mode, 'deleted': count, 'archive_file': None, 'seconds': 0}
+
+        # 锁随连接存在，清理期间一直持有该连接，批量读写使用另外借出的连接
+        cursor.execute('SELECT GET_LOCK(%s, 0)', (_LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            cursor.close()
+            logger.info('[聊天记录清理] 其他进程正在执行，跳过')
+            return None
+        try:
+            return _purge_before(cutoff, mode)
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (_LOCK_NAME,))
+            cursor.close()
+
+
+def _purge_before(cutoff, mode):
+    archive = _ArchiveWriter(CHAT_ARCHIVE_FOLDER) if mode == 'archive' else None
+    columns = 'id, member_id, conversation_id, role, content, create_time' if archive else 'id, create_time'
+    started = time.monotonic()
+    last_report = started
+    deleted = 0
+    last_key = None
+    _update_status(running=True, cutoff=cutoff, mode=mode, deleted=0, archive_file=None,
+                   started_at=datetime.now(), finished_at=None, last_error=None)
+    logger.info(f'[聊天记录清理] 开始：{mode}，create_time < {cutoff}')
+
+    try:
+        while True:
+            # 从上一批最后一行之后继续，不必重新扫过刚删除、尚未被 purge 的索引记录
+            after_sql, params = '', [cutoff]
+            if last_key:
+                after_sql = ' AND (create_time > %s OR (create_time = %s AND id > %s))'
+                params += [last_key[0], last_key[0], last_key[1]]
+            with get_db_connection() as conn:
+                cursor = conn.cursor(pymysql.cursors.DictCursor)
+                cursor.execute(
+                    f'''SELECT {columns} FROM ai_chat_message
+                        WHERE create_time < %s{after_sql}
+                        ORDER BY create_time, id
+                        LIMIT %s''',
+                    params + [CHAT_RETENTION_BATCH]
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    cursor.close()
+                    break
+
+                if archive:
+                    archive.write(rows)
+                ids = [r['id'] for r in rows]
+                cursor.execute(
+                    f'DELETE FROM ai_chat_message WHERE id IN ({", ".join(["%s"] * len(ids))})',
+                    ids
+                )
+                deleted += cursor.rowcount
+                conn.commit()
+                cursor.close()
+
+            last_key = (rows[-1]['create_time'], rows[-1]['id'])
+            _update_status(deleted=deleted, archive_file=archive.path if archive else None)
+            if time.monotonic() - last_report >= _PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                logger.info(f'[聊天记录清理] 进行中：已清理 {deleted} 条，当前进度 {last_key[0]}')
+            if len(rows) < CHAT_RETENTION_BATCH:
+                break
+            time.sleep(CHAT_RETENTION_SLEEP)
+
+        archive_file = archive.close() if archive else None
+    except Exception as e:
+        if archive:
+            archive.abort()
+        _update_status(running=False, finished_at=datetime.now(), last_error=str(e))
+        raise
+
+    seconds = round(time.monotonic() - started, 1)
+    _update_status(running=False, finished_at=datetime.now(), archive_file=archive_file)
+    logger.info(f'[聊天记录清理] 完成：清理 {deleted} 条，耗时 {seconds}s'
+                + (f'，归档文件 {archive_file}' if archive_file else ''))
+    return {'cutoff': cutoff, 'mode': mode, 'deleted': deleted, 'archive_file': archive_file, 'seconds': seconds}
+
+
+class _ArchiveWriter:
+    """
+    按批追加写入 gzip 压缩的 JSON Lines，每批 flush + fsync 后才删除数据库记录
+    写入中的文件以 .part 结尾，正常结束后重命名；中途失败时保留 .part（已写入的内容可正常解压）
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = None
+        self._raw = None
+        self._gz = None
+
+    def write(self, rows):
+        if self._gz is None:
+            os.makedirs(self.folder, exist_ok=True)
+            name = f'ai_chat_message_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jsonl.gz'
+            self.path = os.path.join(self.folder, name)
+            self._raw = open(self.path + '.part', 'wb')
+            self._gz = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        for r in rows:
+            line = json.dumps({
+                'id': r['id'],
+                'member_id': r['member_id'],
+                'conversation_id': r['conversation_id'],
+                'role': r['role'],
+                'content': r['content'],
+                'create_time': r['create_time'].strftime('%Y-%m-%d %H:%M:%S'),
+            }, ensure_ascii=False)
+            self._gz.write(line.encode('utf-8') + b'\n')
+        self._gz.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+
+    def close(self):
+        """结束写入，返回归档文件路径（没有写入任何记录时返回 None）"""
+        if self._gz is None:
+            return None
+        self._gz.close()
+        self._raw.close()
+        os.replace(self.path + '.part', self.path)
+        return self.path
+
+    def abort(self):
+        if self._gz is None:
+            return
+        try:
+            self._gz.close()
+        finally:
+            self._raw.close()
+
+
+# ─────────────────────────────────────────────────────────
+# 定时执行
+# ─────────────────────────────────────────────────────────
+def _scheduler_loop():
+    # 启动后随机延迟，错开多个 worker 同时启动时的锁竞争，也避开启动高峰
+    time.sleep(random.uniform(60, 300))
+    while True:
+        try:
+            purge_chat_messages()
+        except Exception as e:
+            logger.error(f'[聊天记录清理] 失败：{str(e)}')
+        time.sleep(CHAT_RETENTION_INTERVAL * 3600)
+
+
+def start_retention_scheduler():
+    """在当前进程启动定时清理线程（未配置保留天数或间隔为 0 时不启动，重复调用不会重复启动）"""
+    global _thread
+    if CHAT_RETENTION_DAYS <= 0 or CHAT_RETENTION_INTERVAL <= 0:
+        return
+    with _thread_lock:
+        if _thread and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_scheduler_loop, name='chat-retention', daemon=True)
+        _thread.start()
+
+
+if __name__ == '__main__':
+    from config.log_config import setup_logger
+    setup_logger(os.environ.get('FLASK_ENV', 'dev'))
+
+    days = CHAT_RETENTION_DAYS
+    if '--days' in sys.argv:
+        days = int(sys.argv[sys.argv.index('--days') + 1])
+    mode = CHAT_RETENTION_MODE
+    if '--archive' in sys.argv:
+        mode = 'archive'
+    elif '--delete' in sys.argv:
+        mode = 'delete'
+
+    if days <= 0:
+        print('未配置保留天数：设置 CHAT_RETENTION_DAYS 或使用 --days N')
+        sys.exit(1)
+    result = purge_chat_messages(days, mode, dry_run='--dry-run' in sys.argv)
+    if result is None:
+        print('其他进程正在清理，请稍后再试')
+        sys.exit(1)
+    if '--dry-run' in sys.argv:
+        print(f'create_time < {result["cutoff"]} 的聊天记录共 {result["deleted"]} 条（未删除）')
+    else:
+        print(f'清理完成：{result["deleted"]} 条，耗时 {result["seconds"]}s'
+              + (f'，归档文件 {result["archive_file"]}' if result['archive_file'] else ''))
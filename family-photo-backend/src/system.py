@@ -0,0 +1,60 @@
+"""
+系统运行状态接口（仅管理员）
+──────────
+  GET  /api/system/db-pool          当前 worker 进程的数据库连接池状态
+  GET  /api/system/chat-retention   当前 worker 进程最近一次聊天记录清理的进度
+  GET  /api/system/ai-cache         当前 worker 进程的 AI 回复缓存命中统计
+  GET  /api/system/token-cache      当前 worker 进程的登录 Token 验证缓存命中统计
+"""
+
+from flask import Blueprint, jsonify, g
+
+from .auth import login_required, get_token_cache_stats
+from .utils import get_db_pool_stats
+from .retention import get_retention_status
+from .ai_service import get_response_cache_stats
+
+system_bp = Blueprint('system', __name__)
+
+
+@system_bp.route('/system/db-pool', methods=['GET'])
+@login_required
+def db_pool_stats():
+    """
+    返回连接池统计：in_use / idle / 等待次数与耗时 / 新建、回收、丢弃次数等
+    注意：gunicorn 多进程部署时，每次请求只能看到处理该请求的 worker 的池
+    """
+    if not g.is_admin:
+        return jsonify({'code': 403, 'msg': '仅管理员可查看'}), 403
+    return jsonify({'code': 200, 'data': get_db_pool_stats()})
+
+
+@system_bp.route('/system/chat-retention', methods=['GET'])
+@login_required
+def chat_retention_status():
+    """返回聊天记录清理状态：是否执行中 / 截止时间 / 已清理条数 / 归档文件 / 最近错误"""
+    if not g.is_admin:
+        return jsonify({'code': 403, 'msg': '仅管理员可查看'}), 403
+    status = get_retention_status()
+    for key in ('cutoff', 'started_at', 'finished_at'):
+        if status[key]:
+            status[key] = status[key].strftime('%Y-%m-%d %H:%M:%S')
+    return jsonify({'code': 200, 'data': status})
+
+
+@system_bp.route('/system/ai-cache', methods=['GET'])
+@login_required
+def ai_cache_stats():
+    """返回 AI 回复缓存统计：命中 / 未命中 / 命中率 / 写入 / 淘汰 / 过期 / 当前条数"""
+    if not g.is_admin:
+        return jsonify({'code': 403, 'msg': '仅管理员可查看'}), 403
+    return jsonify({'code': 200, 'data': get_response_cache_stats()})
+
+
+@system_bp.route('/system/token-cache', methods=['GET'])
+@login_required
+def token_cache_stats():
+    """返回 Token 验证缓存统计：命中 / 未命中 / 命中率 / 过期 / 淘汰 / 退出登录移除 / 当前条数"""
+    if not g.is_admin:
+        return jsonify({'code': 403, 'msg': '仅管理员可查看'}), 403
+    return jsonify({'code': 200, 'data': get_token_cache_stats()})
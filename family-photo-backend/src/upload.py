@@ -0,0 +1,411 @@
+"""
+分片上传（断点续传）
+──────────
+大照片一次性 multipart 上传时，整个请求体要经过一个 worker 线程、失败只能从头重传。
+分片上传把一个文件拆成多个请求，服务端逐片追加到临时文件，内存中最多只有一个读取块：
+
+  1. POST   /photos/upload/sessions                     创建上传会话，返回 upload_id 和建议分片大小
+  2. PUT    /photos/upload/sessions/<upload_id>?offset=N  请求体为分片原始字节，写入临时文件的 N 处
+                                                       （可带 X-Chunk-SHA256 头，校验失败不推进偏移量）
+  3. GET    /photos/upload/sessions/<upload_id>          查询已接收的偏移量，断线后从这里续传
+  4. POST   /photos/upload/sessions/<upload_id>/complete 全部接收后重命名到相册目录并写入 photo 记录
+     DELETE /photos/upload/sessions/<upload_id>          取消上传
+
+会话记录在 photo_upload 表（多个 gunicorn worker 共享），临时文件为 UPLOAD_PARTIAL_FOLDER/<upload_id>.part；
+偏移量只在分片完整写入并落盘后，按 `received = offset` 条件更新，重复 / 并发提交同一分片只有一个生效。
+超过 UPLOAD_SESSION_EXPIRE_HOURS 小时没有新分片的会话视为放弃，在创建新会话时顺带清理。
+
+配置（环境变量）：
+  UPLOAD_CHUNK_SIZE             单个分片最大字节数（默认 8MB）
+  UPLOAD_MAX_FILE_SIZE          单个文件上限（默认 500MB）
+  UPLOAD_SESSION_EXPIRE_HOURS   会话过期小时数（默认 24）
+"""
+
+import os
+import re
+import time
+import secrets
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+import pymysql
+from flask import Blueprint, request, jsonify, g
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.utils import secure_filename
+
+upload_bp = Blueprint('upload', __name__)
+
+from config.config import (
+    UPLOAD_PHOTO_FOLDER, UPLOAD_PARTIAL_FOLDER, UPLOAD_INCOMING_FOLDER, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_FILE_SIZE,
+    UPLOAD_SESSION_EXPIRE_HOURS
+)
+from .utils import get_db_connection, allowed_file
+from .auth import login_required
+from .access import can_access_album
+from .jobs import enqueue_photo_jobs, notify_job_workers
+
+logger = logging.getLogger('photo_manager')
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+# 从请求体读取分片时每次读取的字节数
+_READ_BLOCK = 1024 * 1024
+# 两次清理过期会话的最短间隔（秒，每个进程）
+_PURGE_INTERVAL = 600
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def _partial_path(upload_id):
+    return os.path.join(UPLOAD_PARTIAL_FOLDER, f'{upload_id}.part')
+
+
+def _get_session(upload_id):
+    """当前成员未过期的上传会话，不存在 / 不属于当前成员 / 已过期返回 None"""
+    if not _UPLOAD_ID_RE.match(upload_id):
+        return None
+    with get_db_connection() as conn:
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        cursor.execute(
+            '''SELECT id, album_id, file_name, file_size, received, photo_name, shoot_time, member_id, remarks
+               FROM photo_upload
+               WHERE id = %s AND operator_id = %s AND update_time >= NOW() - INTERVAL %s HOUR''',
+            (upload_id, g.member_id, UPLOAD_SESSION_EXPIRE_HOURS)
+        )
+        session = cursor.fetchone()
+        cursor.close()
+    return session
+
+
+def _session_data(session, received=None):
+    return {
+        'upload_id': session['id'],
+        'file_size': session['file_size'],
+        'offset': session['received'] if received is None else received,
+        'chunk_size': UPLOAD_CHUNK_SIZE,
+    }
+
+
+def purge_expired_uploads():
+    """删除过期的上传会话和临时文件（含普通上传遗留的 .incoming 文件），返回删除的会话数"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # 走 idx_photo_upload_update (update_time)
+        cursor.execute(
+            'DELETE FROM photo_upload WHERE update_time < NOW() - INTERVAL %s HOUR',
+            (UPLOAD_SESSION_EXPIRE_HOURS,)
+        )
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+
+    # 临时文件按修改时间清理（每写入一个分片都会更新），同时覆盖相册删除后级联删除了会话的文件，
+    # 以及普通上传时进程异常退出留下的 .incoming 文件（见 incoming.py）
+    cutoff = time.time() - UPLOAD_SESSION_EXPIRE_HOURS * 3600
+    for folder in (UPLOAD_PARTIAL_FOLDER, UPLOAD_INCOMING_FOLDER):
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+    if deleted:
+        logger.info(f'[分片上传] 清理过期会话 {deleted} 个')
+    return deleted
+
+
+def _maybe_purge_expired():
+    global _last_purge
+    now = time.monotonic()
+    with _purge_lock:
+        if now - _last_purge < _PURGE_INTERVAL:
+            return
+        _last_purge = now
+    try:
+        purge_expired_uploads()
+    except Exception as e:
+        logger.error(f'[分片上传] 清理过期会话失败：{str(e)}')
+
+
+# ─────────────────────────────────────────────────────────
+# 接口
+# ─────────────────────────────────────────────────────────
+@upload_bp.route('/photos/upload/sessions', methods=['POST'])
+@login_required
+def create_upload_session():
+    """
+    创建上传会话
+    JSON 参数：file_name、file_size、album_id（必填），photo_name、shoot_time、member_id、remarks（可选，同普通上传）
+    返回：{ upload_id, file_size, offset, chunk_size }
+    """
+    data = request.get_json(silent=True) or {}
+    file_name = data.get('file_name') or ''
+
+    # ── 安全校验：album_id 必须为正整数，防止路径遍历攻击 ──
+    try:
+        album_id = int(data.get('album_id'))
+        if album_id <= 0:
+            raise ValueError()
+    except (ValueError, TypeError):
+        return jsonify({'code': 400, 'msg': '相册ID必须为正整数'}), 400
+
+    filename = secure_filename(file_name)
+    if not filename or not allowed_file(filename):
+        return jsonify({'code': 400, 'msg': '不支持的文件格式，仅支持png/jpg/jpeg/gif/bmp'}), 400
+
+    try:
+        file_size = int(data.get('file_size'))
+        if file_size <= 0:
+            raise ValueError()
+    except (ValueError, TypeError):
+        return jsonify({'code': 400, 'msg': '文件大小必须为正整数'}), 400
+    if file_size > UPLOAD_MAX_FILE_SIZE:
+        return jsonify({'code': 413, 'msg': f'文件不能超过 {UPLOAD_MAX_FILE_SIZE // (1024 * 1024)}MB'}), 413
+
+    # ── 权限校验：非管理员只能上传到自己创建的相册 ──
+    try:
+        if not can_access_album(album_id):
+            return jsonify({'code': 403, 'msg': '无权向该相册上传照片'}), 403
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'权限校验失败：{str(e)}'}), 500
+
+    _maybe_purge_expired()
+
+    upload_id = secrets.token_hex(16)
+    try:
+        open(_partial_path(upload_id), 'wb').close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                '''INSERT INTO photo_upload
+                   (id, operator_id, album_id, file_name, file_size, photo_name, shoot_time, member_id, remarks)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                (upload_id, g.member_id, album_id, file_name, file_size,
+                 (data.get('photo_name') or file_name)[:100], data.get('shoot_time') or None,
+                 data.get('member_id') or None, data.get('remarks', ''))
+            )
+            conn.commit()
+            cursor.close()
+    except Exception as e:
+        if os.path.exists(_partial_path(upload_id)):
+            os.remove(_partial_path(upload_id))
+        return jsonify({'code': 500, 'msg': f'创建上传失败：{str(e)}'}), 500
+
+    return jsonify({'code': 200, 'msg': '创建成功', 'data': {
+        'upload_id': upload_id,
+        'file_size': file_size,
+        'offset': 0,
+        'chunk_size': UPLOAD_CHUNK_SIZE,
+    }})
+
+
+@upload_bp.route('/photos/upload/sessions/<upload_id>', methods=['GET'])
+@login_required
+def get_upload_session(upload_id):
+    """查询续传偏移量：返回 { upload_id, file_size, offset, chunk_size }"""
+    try:
+        session = _get_session(upload_id)
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'查询失败：{str(e)}'}), 500
+    if not session:
+        return jsonify({'code': 404, 'msg': '上传不存在或已过期'}), 404
+    return jsonify({'code': 200, 'msg': '查询成功', 'data': _session_data(session)})
+
+
+@upload_bp.route('/photos/upload/sessions/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """
+    上传一个分片：查询参数 offset 必须等于已接收的字节数，请求体为分片原始字节（不超过 UPLOAD_CHUNK_SIZE）
+    可选请求头 X-Chunk-SHA256：分片内容的 SHA-256（十六进制），不一致时返回 400，偏移量不变
+    偏移量不一致时返回 409，data.offset 为服务端当前偏移量
+    请求体按块直接写入临时文件，读写期间不占用数据库连接
+    """
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset < 0:
+        return jsonify({'code': 400, 'msg': '缺少 offset 参数'}), 400
+    length = request.content_length
+    if not length:
+        return jsonify({'code': 400, 'msg': '分片内容为空'}), 400
+    if length > UPLOAD_CHUNK_SIZE:
+        return jsonify({'code': 413, 'msg': f'分片不能超过 {UPLOAD_CHUNK_SIZE} 字节'}), 413
+    checksum = (request.headers.get('X-Chunk-SHA256') or '').strip().lower()
+
+    try:
+        session = _get_session(upload_id)
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'查询失败：{str(e)}'}), 500
+    if not session:
+        return jsonify({'code': 404, 'msg': '上传不存在或已过期'}), 404
+    if offset != session['received']:
+        return jsonify({'code': 409, 'msg': '偏移量不一致，请从 offset 处续传',
+                        'data': _session_data(session)}), 409
+    if offset + length > session['file_size']:
+        return jsonify({'code': 400, 'msg': '分片超出文件大小'}), 400
+
+    # ── 按块写入临时文件（超出 received 的部分在偏移量推进前不会被使用，重传时直接覆盖）──
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(_partial_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                block = request.stream.read(min(_READ_BLOCK, length - written))
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+                written += len(block)
+            f.flush()
+            # 偏移量推进后即视为已持久化，先落盘再更新数据库
+            os.fsync(f.fileno())
+    except ClientDisconnected:
+        pass
+    except FileNotFoundError:
+        return jsonify({'code': 404, 'msg': '上传不存在或已过期'}), 404
+    except OSError as e:
+        return jsonify({'code': 500, 'msg': f'保存分片失败：{str(e)}'}), 500
+
+    if written != length:
+        return jsonify({'code': 400, 'msg': '分片传输中断，请重新上传该分片',
+                        'data': _session_data(session)}), 400
+    if checksum and checksum != digest.hexdigest():
+        return jsonify({'code': 400, 'msg': '分片校验失败，请重新上传该分片',
+                        'data': _session_data(session)}), 400
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # 乐观并发：只有偏移量仍为 offset 时推进，同一分片被并发 / 重复提交时只有一个生效
+            cursor.execute(
+                'UPDATE photo_upload SET received = %s WHERE id = %s AND received = %s',
+                (offset + length, upload_id, offset)
+            )
+            updated = cursor.rowcount
+            conn.commit()
+            cursor.close()
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'保存进度失败：{str(e)}'}), 500
+    if not updated:
+        return jsonify({'code': 409, 'msg': '该分片已被其他请求写入，请查询偏移量后续传'}), 409
+
+    return jsonify({'code': 200, 'msg': '上传成功', 'data': _session_data(session, offset + length)})
+
+
+@upload_bp.route('/photos/upload/sessions/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """
+    完成上传：临时文件重命名到相册目录，写入 photo 记录并加入后台处理队列（同普通上传）
+    返回：{ photo_id, file_path, status }
+    """
+    try:
+        session = _get_session(upload_id)
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'查询失败：{str(e)}'}), 500
+    if not session:
+        return jsonify({'code': 404, 'msg': '上传不存在或已过期'}), 404
+    if session['received'] != session['file_size']:
+        return jsonify({'code': 409, 'msg': '文件尚未上传完整，请从 offset 处续传',
+                        'data': _session_data(session)}), 409
+
+    album_id = session['album_id']
+    # 创建会话后相册可能已被删除 / 转移
+    try:
+        if not can_access_album(album_id):
+            return jsonify({'code': 403, 'msg': '无权向该相册上传照片'}), 403
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'权限校验失败：{str(e)}'}), 500
+
+    # ── 安全校验：生成唯一文件名，防止同名覆盖 ──
+    ext_part = secure_filename(session['file_name']).rpartition('.')[2]
+    unique_filename = f'{datetime.now().strftime("%Y%m%d%H%M%S")}_{secrets.token_hex(4)}.{ext_part}'
+    album_dir = os.path.join(UPLOAD_PHOTO_FOLDER, str(album_id))
+    os.makedirs(album_dir, exist_ok=True)
+    file_path = os.path.join(album_dir, unique_filename)
+    partial_path = _partial_path(upload_id)
+
+    try:
+        # 中断后重传的分片可能在末尾留下多余字节
+        if os.path.getsize(partial_path) < session['file_size']:
+            return jsonify({'code': 500, 'msg': '临时文件不完整，请重新上传'}), 500
+        os.truncate(partial_path, session['file_size'])
+        os.replace(partial_path, file_path)
+    except FileNotFoundError:
+        # 同一会话被并发 complete，另一个请求已经取走临时文件
+        return jsonify({'code': 409, 'msg': '上传已完成或已取消'}), 409
+
+    relative_path = os.path.join(str(album_id), unique_filename)
+    operator_id = g.member_id
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('DELETE FROM photo_upload WHERE id = %s', (upload_id,))
+            if cursor.rowcount == 0:
+                raise RuntimeError('上传已取消或已过期')
+            cursor.execute(
+                '''INSERT INTO photo
+                   (photo_name, file_path, shoot_time, album_id, member_id, operator_id, remarks)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                (session['photo_name'], relative_path, session['shoot_time'], album_id,
+                 session['member_id'], operator_id, session['remarks'])
+            )
+            photo_id = cursor.lastrowid
+            # 缩略图 / EXIF / 哈希交给后台队列，不阻塞响应
+            enqueue_photo_jobs(cursor, photo_id)
+            cursor.execute(
+                '''UPDATE album SET last_upload_user_id = %s, last_upload_time = %s, photo_count = photo_count + 1
+                   WHERE id = %s''',
+                (operator_id, datetime.now(), album_id)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+    except Exception as e:
+        # 放回临时文件，会话仍在时客户端可以直接重试 complete
+        try:
+            os.replace(file_path, partial_path)
+        except OSError:
+            pass
+        return jsonify({'code': 500, 'msg': f'保存数据失败：{str(e)}'}), 500
+
+    notify_job_workers()
+    return jsonify({'code': 200, 'msg': '上传成功', 'data': {
+        'photo_id': photo_id,
+        'file_path': relative_path,
+        'status': 'pending',
+    }})
+
+
+@upload_bp.route('/photos/upload/sessions/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id):
+    """取消上传：删除会话记录和临时文件"""
+    if not _UPLOAD_ID_RE.match(upload_id):
+        return jsonify({'code': 404, 'msg': '上传不存在或已过期'}), 404
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM photo_upload WHERE id = %s AND operator_id = %s',
+                (upload_id, g.member_id)
+            )
+            deleted = cursor.rowcount
+            conn.commit()
+            cursor.close()
+    except Exception as e:
+        return jsonify({'code': 500, 'msg': f'取消失败：{str(e)}'}), 500
+    if not deleted:
+        return jsonify({'code': 404, 'msg': '上传不存在或已过期'}), 404
+
+    if os.path.exists(_partial_path(upload_id)):
+        os.remove(_partial_path(upload_id))
+    return jsonify({'code': 200, 'msg': '已取消'})
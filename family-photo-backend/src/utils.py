@@ -1,10 +1,94 @@
-import pymysql
+import atexit
+import base64
+import json
+from datetime import datetime
+
+from flask import g, has_app_context
+
+from config.config import (DB_CONFIG, DB_POOL_CONFIG, ALLOWED_EXTENSIONS)
+from .db_pool import ConnectionPool
+
+# 每个进程一个连接池（gunicorn 的每个 worker 各自持有）
+_pool = ConnectionPool(DB_CONFIG, **DB_POOL_CONFIG)
+atexit.register(_pool.close_all)
 
-from config.config import (DB_CONFIG, ALLOWED_EXTENSIONS)
 
 def get_db_connection():
-    conn = pymysql.connect(**DB_CONFIG)
+    """
+    从连接池借出连接，用法与 pymysql 连接一致：
+      - conn.close() 归还到池中
+      - 也可写成 with get_db_connection() as conn: ...
+    在请求上下文中借出的连接，请求结束时（teardown）会自动归还，
+    即使接口提前 return 或抛异常忘记 close 也不会泄漏。
+    """
+    conn = _pool.connection()
+    if has_app_context():
+        g.setdefault('_db_connections', []).append(conn)
     return conn
 
+
+def release_db_connections(exc=None):
+    """teardown_appcontext 钩子：归还本次请求中未关闭的连接"""
+    for conn in g.pop('_db_connections', []):
+        conn.close()
+
+
+def detach_db_connection(conn):
+    """
+    从本次请求的自动归还列表中移除连接，之后由调用方负责 close()
+    用于流式响应：应用上下文在生成器结束 / 客户端断开时就会弹出，此时无缓冲游标可能还有未读完的结果，
+    不能先于游标关闭被归还到池中（可能已借给其他线程）
+    """
+    if has_app_context():
+        connections = g.get('_db_connections', [])
+        if conn in connections:
+            connections.remove(conn)
+
+
+def prefill_db_pool():
+    """进程启动时预建 min_size 个连接"""
+    _pool.prefill()
+
+
+def get_db_pool_stats():
+    return _pool.stats()
+
+
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
\ No newline at end of file
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+# ─────────────────────────────────────────────────────────
+# 游标分页（keyset）：按 (时间, id) 倒序，直接定位到上一页最后一行之后
+# ─────────────────────────────────────────────────────────
+def encode_cursor(sort_value, row_id):
+    """把上一页最后一行的 (时间, id) 编码为不透明的游标字符串"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.strftime('%Y-%m-%d %H:%M:%S')
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (时间字符串, id)；格式不合法时抛 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        datetime.strptime(sort_value, '%Y-%m-%d %H:%M:%S')
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError('分页游标无效')
+
+
+def keyset_condition(time_column, id_column, cursor):
+    """
+    生成 "排在游标之后" 的 WHERE 片段及参数（倒序），cursor 为空表示第一页
+    :return: (sql 片段, 参数列表)，第一页返回 ('', [])
+    """
+    if not cursor:
+        return '', []
+    sort_value, row_id = decode_cursor(cursor)
+    return (
+        f' AND ({time_column} < %s OR ({time_column} = %s AND {id_column} < %s))',
+        [sort_value, sort_value, row_id]
+    )
@@ -4,8 +4,8 @@
  * 功能：
  *  - 悬浮在页面右下角，可拖拽移动
  *  - 点击气泡展开对话框，点击最小化按钮收起
- *  - 自动加载最近三个月聊天记录（按账号隔离）
- *  - 发送消息后自动调用 AI 接口获取回复
+ *  - 自动加载最近的聊天记录（按账号隔离），顶部「加载更早」按页往前翻
+ *  - 发送消息后自动调用 AI 接口获取回复（SSE 流式返回，边生成边显示）
  *
  * 定位策略（修复收起后位置偏移的问题）：
  *  - position 表示「当前可见内容」的左上角坐标
@@ -38,12 +38,56 @@ const CHAT_TIMEOUT = 60000;
 // 安全 clamp：保证内容完全在屏幕内
 const clamp = (v, min, max) => Math.max(min, Math.min(max, v));
 
+// 流式发送消息：POST /api/chat/send/stream，按 SSE 事件回调 onEvent(event, data)
+// （EventSource 只支持 GET，这里用 fetch + ReadableStream 自行解析）
+const streamChat = async (content, onEvent) => {
+    const resp = await fetch('/api/chat/send/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            Authorization: localStorage.getItem('family_photo_token') || '',
+        },
+        body: JSON.stringify({ content }),
+    });
+    if (!resp.ok || !resp.body) {
+        const res = await resp.json().catch(() => ({}));
+        throw new Error(res.msg || `HTTP ${resp.status}`);
+    }
+
+    const reader  = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // 事件之间以空行分隔
+        let idx;
+        while ((idx = buffer.indexOf('\n\n')) >= 0) {
+            const raw = buffer.slice(0, idx);
+            buffer = buffer.slice(idx + 2);
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+};
+
 const AiChat = () => {
     // ── 状态 ──────────────────────────────────────
     const [isOpen, setIsOpen]       = useState(false);
     const [messages, setMessages]   = useState([]);
     const [inputText, setInputText] = useState('');
     const [loading, setLoading]     = useState(false);
+    // 正在流式输出的 AI 消息 ID（收到第一段内容后不再显示加载动画）
+    const [streamingId, setStreamingId] = useState(null);
+    // 更早一页的游标（null 表示没有更早的消息）
+    const [olderCursor, setOlderCursor] = useState(null);
+    const [loadingOlder, setLoadingOlder] = useState(false);
     // position = 当前可见内容（气泡 or 对话框）的左上角坐标
     const [position, setPosition]   = useState(null);
 
@@ -52,13 +96,14 @@ const AiChat = () => {
     const messagesRef   = useRef(null);
     const draggedRef    = useRef(false);    // 本次是否发生过拖拽（区分 click）
     const dragStartRef  = useRef({ mx: 0, my: 0, px: 0, py: 0 });
+    const prependRef    = useRef(null);     // 加载更早消息前的滚动高度（用于保持位置）
 
     // ── 初始化气泡位置 ────────────────────────────
     useEffect(() => {
         setPosition(getDefaultBubblePos());
     }, []);
 
-    // ── 加载最近三个月聊天记录 ────────────────────
+    // ── 加载最近一页聊天记录 ──────────────────────
     const loadHistory = useCallback(async () => {
         try {
             const res = await request.get('/api/chat/history', {
@@ -67,23 +112,47 @@ const AiChat = () => {
             });
             if (res.code === 200) {
                 setMessages(res.data || []);
+                setOlderCursor(res.has_more ? res.next_cursor : null);
             }
         } catch (err) {
             console.error('加载聊天记录失败：', err);
         }
     }, []);
 
+    // ── 加载更早的聊天记录（插入到列表顶部）──────
+    const loadOlder = async () => {
+        if (!olderCursor || loadingOlder) return;
+        setLoadingOlder(true);
+        try {
+            const res = await request.get('/api/chat/history', {
+                params: { months: 3, cursor: olderCursor },
+                timeout: CHAT_TIMEOUT,
+            });
+            if (res.code === 200) {
+                prependRef.current = messagesRef.current?.scrollHeight ?? null;
+                setMessages(prev => [...(res.data || []), ...prev]);
+                setOlderCursor(res.has_more ? res.next_cursor : null);
+            }
+        } catch (err) {
+            console.error('加载更早的聊天记录失败：', err);
+        } finally {
+            setLoadingOlder(false);
+        }
+    };
+
     // ── 对话框展开时自动加载历史 ──────────────────
     useEffect(() => {
         if (isOpen) loadHistory();
     }, [isOpen, loadHistory]);
 
-    // ── 消息列表变化时自动滚动到底部 ──────────────
+    // ── 消息列表变化时自动滚动到底部（加载更早消息时保持当前位置）──
     useEffect(() => {
         const el = messagesRef.current;
         if (el) {
+            const prevHeight = prependRef.current;
+            prependRef.current = null;
             requestAnimationFrame(() => {
-                el.scrollTop = el.scrollHeight;
+                el.scrollTop = prevHeight === null ? el.scrollHeight : el.scrollHeight - prevHeight;
             });
         }
     }, [messages, loading]);
@@ -104,41 +173,45 @@ const AiChat = () => {
         setInputText('');
         setLoading(true);
 
-        try {
-            const res = await request.post('/api/chat/send', { content: text }, {
-                timeout: CHAT_TIMEOUT,
-            });
-            if (res.code === 200) {
-                setMessages(prev => {
-                    const withoutTemp = prev.filter(m => m.id !== tempUserMsg.id);
-                    return [...withoutTemp, res.data.user_message, res.data.ai_message];
-                });
-            } else {
-                setMessages(prev => [
-                    ...prev.filter(m => m.id !== tempUserMsg.id),
-                    tempUserMsg,
-                    {
-                        id: `err_${Date.now()}`,
-                        role: 'assistant',
-                        content: `😅 ${res.msg || '发送失败，请稍后重试～'}`,
-                        create_time: formatNow(),
-                    },
-                ]);
-            }
-        } catch (err) {
-            console.error('发送消息失败：', err);
+        const aiMsgId = `stream_${Date.now()}`;
+        const showError = (msg) => {
             setMessages(prev => [
-                ...prev.filter(m => m.id !== tempUserMsg.id),
-                tempUserMsg,
+                ...prev.filter(m => m.id !== aiMsgId),
                 {
                     id: `err_${Date.now()}`,
                     role: 'assistant',
-                    content: '😅 网络好像开小差了，请稍后再试试～',
+                    content: `😅 ${msg}`,
                     create_time: formatNow(),
                 },
             ]);
+        };
+
+        try {
+            await streamChat(text, (event, data) => {
+                if (event === 'start') {
+                    // 用户消息已保存：替换乐观更新的临时消息
+                    setMessages(prev => prev.map(m => (m.id === tempUserMsg.id ? data.user_message : m)));
+                } else if (event === 'delta') {
+                    setStreamingId(aiMsgId);
+                    setMessages(prev => (
+                        prev.some(m => m.id === aiMsgId)
+                            ? prev.map(m => (m.id === aiMsgId ? { ...m, content: m.content + data.content } : m))
+                            : [...prev, { id: aiMsgId, role: 'assistant', content: data.content, create_time: formatNow() }]
+                    ));
+                } else if (event === 'done') {
+                    setMessages(prev => [...prev.filter(m => m.id !== aiMsgId), data.ai_message]);
+                } else if (event === 'error') {
+                    showError(data.msg || '发送失败，请稍后重试～');
+                }
+            });
+        } catch (err) {
+            console.error('发送消息失败：', err);
+            showError(err.message && !err.message.startsWith('HTTP') && err.name !== 'TypeError'
+                ? err.message
+                : '网络好像开小差了，请稍后再试试～');
         } finally {
             setLoading(false);
+            setStreamingId(null);
         }
     };
 
@@ -337,6 +410,12 @@ const AiChat = () => {
 
                     {/* ── 消息列表区 ─── */}
                     <div className={styles.chatMessages} ref={messagesRef}>
+                        {olderCursor && (
+                            <button className={styles.loadOlder} onClick={loadOlder} disabled={loadingOlder}>
+                                {loadingOlder ? '加载中…' : '加载更早的消息'}
+                            </button>
+                        )}
+
                         {messages.length === 0 && !loading && (
                             <div className={styles.emptyHint}>
                                 <span className={styles.emptyIcon}>👋</span>
@@ -380,7 +459,7 @@ const AiChat = () => {
                         ))}
 
                         {/* AI 正在思考的加载动画 */}
-                        {loading && (
+                        {loading && !streamingId && (
                             <div className={styles.loadingRow}>
                                 <div className={`${styles.msgAvatar} ${styles.aiAvatar}`}>🤖</div>
                                 <div className={styles.loadingBubble}>
@@ -88,7 +88,7 @@ const AlbumPhotoList = ({ ref, isSearch }) => {
         url = "/api/photos/search";
         params = {
           ...params,
-          name_like: searchParams.name || "",
+          keyword: searchParams.name || "",
           member_id: searchParams.ownerMember || "",
           operator_id: searchParams.uploaderMember || "",
           start_date: searchParams.dateRange?.[0]
@@ -108,7 +108,10 @@ const AlbumPhotoList = ({ ref, isSearch }) => {
         } else {
           setFilteredPhotos(res.data);
         }
-        setTotal(res.total);
+        // 搜索翻页时后端不重复统计总数（total 为 null），沿用第一页的结果
+        if (res.total !== null && res.total !== undefined) {
+          setTotal(res.total);
+        }
       } else {
         message.error(res.msg);
       }
@@ -285,10 +288,11 @@ const AlbumPhotoList = ({ ref, isSearch }) => {
                         <Image
                           width="100%"
                           height="100%"
-                          src={`/uploads/photos/${photo.file_path}`}
+                          src={`/uploads/photos/${photo.file_path}?size=thumb`}
                           className={styles.photoImg}
                           fallback="https://via.placeholder.com/200x150?text=暂无图片✨"
                           preview={{
+                            src: `/uploads/photos/${photo.file_path}?size=preview`,
                             mask: true,
                             maskIcon: (
                               <HeartOutlined style={{ color: "#d49999" }} />
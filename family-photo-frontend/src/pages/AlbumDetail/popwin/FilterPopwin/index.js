@@ -69,7 +69,7 @@ const FilterPopwin = (props) => {
         initialValues={{}} // 初始化表单值
       >
         <Form.Item
-          label="照片名称（模糊匹配）✍️"
+          label="名称 / 备注关键词 ✍️"
           name="name"
           className={styles.formItem}
         >
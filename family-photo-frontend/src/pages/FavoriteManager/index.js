@@ -337,9 +337,10 @@ const FavoriteManager = () => {
                             <Image
                               width="100%"
                               height="150px"
-                              src={`/uploads/photos/${photo.file_path}`}
+                              src={`/uploads/photos/${photo.file_path}?size=thumb`}
                               fallback="https://via.placeholder.com/200x150?text=暂无图片"
                               preview={{
+                                src: `/uploads/photos/${photo.file_path}?size=preview`,
                                 mask: (
                                   <div style={{ color: "#fff", fontSize: 16 }}>
                                     💖 收藏照片
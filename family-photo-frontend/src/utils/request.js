@@ -50,7 +50,7 @@ request.interceptors.response.use(
             return Promise.reject(err);
         }
         console.error('请求失败：', err);
-        message.error('请求失败，请稍后重试');
+        message.error(err.response?.data?.msg || '请求失败，请稍后重试');
         return Promise.reject(err);
     }
 );